@@ -0,0 +1,316 @@
+"""Measure how many cameras one `SpotGazer` process sustains.
+
+Every camera is a live MJPEG stream served by a local stand-in HTTP server, which loops over shifted copies
+of the images, so the scene changes from sample to sample. SpotGazer detects the occupancy of one parking lot
+per camera for the given duration, saving it to a throwaway test database, and the report covers the inferred
+frames per second, the jitter of the sample intervals of the parking lots, the inference and batch latency
+percentiles, the database write latency and the peak RSS. Change detection is off unless `--change-detection`
+is passed. The cameras and the rate should load the detector fully, otherwise they cap the inferred frames.
+
+Usage:
+    python -m benchmarks.detection_load [--cameras 8] [--duration 60] [--rate 1] [--fps 25] [--json]
+        [--change-detection] [--output report.json] [--baseline report.json [--max-regression 0.1]] [image ...]
+
+With `--baseline`, the exit code is 1 if the inferred frames per second or the 95th percentile of the batch
+latency are worse than those of the baseline report by more than `--max-regression`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from statistics import mean, pstdev, quantiles
+from typing import Any, Callable
+
+import cv2
+import numpy as np
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_core.settings")
+
+from spot_gazer_core import SpotGazer  # noqa: E402
+
+from django.db import connection  # noqa: E402
+
+from livemap.models import Address, City, Country, ParkingLot, VideoStreamSource  # noqa: E402
+
+TEST_IMAGES = ("tests/test_media/small_parking.jpg", "tests/test_media/big_parking.jpg")
+
+
+class MJPEGServer(ThreadingHTTPServer):
+    """Serve the images in a loop as live MJPEG streams at `/camera/<number>.mjpg`, `fps` frames per second each.
+
+    Every image is served as `variants` copies shifted horizontally by different offsets, which are encoded once.
+    The loop is long enough that frames sampled at usual rates differ from each other.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, images: list[str], fps: float, variants: int = 29) -> None:
+        super().__init__(("127.0.0.1", 0), _MJPEGHandler)
+        self.frames = []
+        for variant in range(variants):
+            for image in map(cv2.imread, images):
+                shifted = np.roll(image, variant * image.shape[1] // variants, axis=1)
+                self.frames.append(cv2.imencode(".jpg", shifted)[1].tobytes())
+        self.fps = fps
+        self._thread = threading.Thread(target=self.serve_forever, name="mjpeg-server", daemon=True)
+
+    def url(self, camera: int) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/camera/{camera}.mjpg"
+
+    def __enter__(self) -> "MJPEGServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _MJPEGHandler(BaseHTTPRequestHandler):
+    server: MJPEGServer
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.end_headers()
+        frame_number = 0
+        next_frame_at = time.monotonic()
+        try:
+            while True:
+                frame = self.server.frames[frame_number % len(self.server.frames)]
+                self.wfile.write(
+                    b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n%b\r\n" % (len(frame), frame)
+                )
+                frame_number += 1
+                next_frame_at += 1 / self.server.fps
+                time.sleep(max(next_frame_at - time.monotonic(), 0))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The camera has been closed
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    if len(values) < 2:
+        value = values[0] if values else None
+        return {"p50": value, "p95": value, "p99": value, "max": value}
+    cuts = quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": max(values)}
+
+
+def _timed(function: Callable, latencies: list[float]) -> Callable:
+    if asyncio.iscoroutinefunction(function):
+
+        @wraps(function)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            result = await function(*args, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            return result
+
+        return async_wrapper
+
+    @wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    return wrapper
+
+
+class InstrumentedSpotGazer(SpotGazer):
+    """Record the latencies of the inference and the database writes and the times of the samples."""
+
+    def __init__(self, parking_lots: list[list[dict[str, Any]]], model: str | None, storage_mode: str) -> None:
+        super().__init__(parking_lots, model)
+        # The writer of SpotGazer is kept, since it reports the flushes to the pipeline metrics
+        self._occupancy_writer.storage_mode = storage_mode
+        # The latency of a frame includes the time it waits for its batch
+        self.inference_latencies: list[float] = []
+        self.batch_latencies: list[float] = []
+        self.write_latencies: list[float] = []
+        self.samples: dict[int, list[float]] = defaultdict(list)
+        self._batcher.detect = _timed(self._batcher.detect, self.inference_latencies)  # type: ignore[method-assign]
+        self._batcher._predict_batch = _timed(self._batcher._predict_batch, self.batch_latencies)
+        self._occupancy_writer._save = _timed(  # type: ignore[method-assign]
+            self._occupancy_writer._save, self.write_latencies
+        )
+
+    async def _save_occupancy(self, parking_lot_id: int, occupied_spots: int) -> None:
+        self.samples[parking_lot_id].append(time.monotonic())
+        await super()._save_occupancy(parking_lot_id, occupied_spots)
+
+
+def create_parking_lots(urls: list[str], rate: float) -> list[list[dict[str, Any]]]:
+    address = Address.objects.create(
+        city=City.objects.create(country=Country.objects.create(country_name="Benchmark"), city_name="Benchmark"),
+        parking_lot_address="Benchmark",
+    )
+    parking_lots = []
+    for url in urls:
+        parking_lot = ParkingLot.objects.create(address=address, total_spots=100, geolocation=[0.0, 0.0])
+        stream = VideoStreamSource.objects.create(
+            parking_lot=parking_lot, stream_source=url, processing_rate=max(round(rate), 1)
+        )
+        parking_lots.append(
+            [
+                {
+                    "id": stream.id,
+                    "parking_lot_id": parking_lot.id,
+                    "stream_source": url,
+                    "processing_rate": rate,  # May be shorter than a second
+                    "parking_zone": None,
+                    "inference_mode": stream.inference_mode,
+                }
+            ]
+        )
+    return parking_lots
+
+
+async def run_load(spot_gazer: InstrumentedSpotGazer, duration: float) -> tuple[float, dict[int, dict[str, Any]]]:
+    """Run the detection for the duration and return the elapsed time and the health of the streams at the end."""
+    start = time.perf_counter()
+    detection = asyncio.create_task(spot_gazer.start_detection())
+    try:
+        await asyncio.wait_for(asyncio.shield(detection), duration)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        stream_health = spot_gazer.stream_health()
+        detection.cancel()
+        await asyncio.gather(detection, return_exceptions=True)
+        await spot_gazer.stop_detection()
+    return time.perf_counter() - start, stream_health
+
+
+def build_report(
+    spot_gazer: InstrumentedSpotGazer,
+    args: argparse.Namespace,
+    elapsed: float,
+    stream_health: dict[int, dict[str, Any]],
+) -> dict[str, Any]:
+    intervals = [
+        later - earlier for samples in spot_gazer.samples.values() for earlier, later in zip(samples, samples[1:])
+    ]
+    jitters = [abs(interval - args.rate) for interval in intervals]
+    return {
+        "cameras": args.cameras,
+        "duration": round(elapsed, 2),
+        "processing_rate": args.rate,
+        "source_fps": args.fps,
+        # Every parking lot has a single camera, so a sample is a frame. Samples are capped by the rate and cameras
+        "samples": (sampled := sum(len(samples) for samples in spot_gazer.samples.values())),
+        "samples_per_second": round(sampled / elapsed, 2),
+        # Frames passed to the model, unlike unchanged scenes with change detection
+        "inferred_frames": (inferred_frames := len(spot_gazer.inference_latencies)),
+        "inferred_frames_per_second": round(inferred_frames / elapsed, 2),
+        "change_detection": spot_gazer.change_detection,
+        "sampled_lots": len(spot_gazer.samples),
+        "sample_interval": {
+            "mean": mean(intervals) if intervals else None,
+            "stdev": pstdev(intervals) if intervals else None,
+        },
+        "sample_jitter": percentiles(jitters),
+        "inference_latency": percentiles(spot_gazer.inference_latencies),
+        "batch_latency": percentiles(spot_gazer.batch_latencies),
+        "batches": len(spot_gazer.batch_latencies),
+        "db_write_latency": percentiles(spot_gazer.write_latencies),
+        "scheduler": spot_gazer.scheduler_metrics(),
+        "occupancy_writer": spot_gazer._occupancy_writer.metrics(),
+        "streams": {
+            status: sum(health["status"] == status for health in stream_health.values())
+            for status in ("healthy", "reconnecting", "deactivated")
+        },
+        # Kilobytes on Linux, bytes on macOS
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def find_regressions(report: dict[str, Any], baseline: dict[str, Any], max_regression: float) -> list[str]:
+    """Compare the throughput and the batch latency of the model with the baseline report."""
+    regressions = []
+    fps, baseline_fps = report["inferred_frames_per_second"], baseline["inferred_frames_per_second"]
+    if fps < baseline_fps * (1 - max_regression):
+        regressions.append(f"inferred frames per second: {fps} < {baseline_fps}")
+    latency, baseline_latency = report["batch_latency"]["p95"], baseline["batch_latency"]["p95"]
+    if latency is not None and baseline_latency is not None and latency > baseline_latency * (1 + max_regression):
+        regressions.append(f"p95 batch latency: {latency:.3f} s > {baseline_latency:.3f} s")
+    return regressions
+
+
+def _print_report(report: dict[str, Any]) -> None:
+    def milliseconds(value: float | None) -> str:
+        return "-" if value is None else f"{value * 1e3:.1f}"
+
+    print(f"Cameras: {report['cameras']}, duration: {report['duration']} s, rate: {report['processing_rate']} s")
+    print(f"Samples: {report['samples']} ({report['samples_per_second']} per second)")
+    print(
+        f"Inferred frames: {report['inferred_frames']} ({report['inferred_frames_per_second']} per second) "
+        f"in {report['batches']} batches"
+    )
+    print(f"Missed deadlines: {report['scheduler']['missed_deadlines']}, streams: {report['streams']}")
+    print(f"Max RSS: {report['max_rss']}")
+    print(f"{'Latency, ms':<20}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name in ("sample_jitter", "inference_latency", "batch_latency", "db_write_latency"):
+        values = report[name]
+        print(f"{name:<20}" + "".join(f"{milliseconds(values[key]):>10}" for key in ("p50", "p95", "p99", "max")))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", default=TEST_IMAGES)
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="In seconds.")
+    parser.add_argument("--rate", type=float, default=1, help="The processing rate of every parking lot in seconds.")
+    parser.add_argument("--fps", type=float, default=25, help="The frame rate of every camera.")
+    parser.add_argument("--model", help="Defaults to the model of the configured inference backend.")
+    parser.add_argument("--storage-mode", choices=("all", "changes"), default="all")
+    parser.add_argument(
+        "--change-detection",
+        action="store_true",
+        help="Reuse the cars of unchanged scenes, which leaves less work for the model.",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the report in JSON.")
+    parser.add_argument("--output", type=Path, help="Save the report in JSON to the file.")
+    parser.add_argument("--baseline", type=Path, help="The report of a previous run to compare with.")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    args = parser.parse_args()
+
+    # The occupancies are saved to a throwaway database
+    database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with MJPEGServer(args.images, args.fps) as server:
+            parking_lots = create_parking_lots([server.url(camera) for camera in range(args.cameras)], args.rate)
+            spot_gazer = InstrumentedSpotGazer(parking_lots, args.model, args.storage_mode)
+            spot_gazer.change_detection = args.change_detection
+            elapsed, stream_health = asyncio.run(run_load(spot_gazer, args.duration))
+    finally:
+        connection.creation.destroy_test_db(database_name, verbosity=0)
+    report = build_report(spot_gazer, args, elapsed, stream_health)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    if args.baseline and (
+        regressions := find_regressions(report, json.loads(args.baseline.read_text()), args.max_regression)
+    ):
+        print("Regressions: " + "; ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
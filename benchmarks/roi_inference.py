@@ -0,0 +1,82 @@
+"""Compare the detected cars and the latency of the parking zone inference modes of `VideoStreamSource`.
+
+Usage:
+    python -m benchmarks.roi_inference [--repeat 10] [--zone '[[[[x, y]], ...], ...]'] [--json] [image ...]
+
+Without `--zone`, the parking zone consists of the top left and the bottom right quarters of every image.
+"""
+import argparse
+import json
+import os
+import time
+from statistics import mean, median
+from typing import Any
+
+import cv2
+import numpy as np
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_core.settings")
+
+from spot_gazer_core.configs.settings import YOLOv8_PREDICTION_PARAMETERS  # noqa: E402
+from spot_gazer_core.predictor import FrameContext, Interceptor, create_predictor, detect_cars  # noqa: E402
+
+INFERENCE_MODES = ("mask", "crop", "tiles")
+TEST_IMAGES = ("tests/test_media/small_parking.jpg", "tests/test_media/big_parking.jpg")
+
+
+def quarters_zone(frame_shape: tuple[int, ...]) -> list[list[list[list[int]]]]:
+    height, width = frame_shape[:2]
+    return [
+        [[[0, 0]], [[width // 2, 0]], [[width // 2, height // 2]], [[0, height // 2]]],
+        [[[width // 2, height // 2]], [[width, height // 2]], [[width, height]], [[width // 2, height]]],
+    ]
+
+
+def benchmark_mode(
+    predictor: Interceptor, frame: np.ndarray, parking_zone: Any, inference_mode: str, repeat: int
+) -> dict[str, Any]:
+    context = FrameContext("benchmark", parking_zone, inference_mode)
+    detect_cars(predictor, [frame.copy()], [context])  # Warm up and cache the zone mask
+    latencies = []
+    for _ in range(repeat):
+        image = frame.copy()  # Frames are masked in place
+        start = time.perf_counter()
+        detected_cars = detect_cars(predictor, [image], [context])[0]
+        latencies.append((time.perf_counter() - start) * 1e3)
+    return {
+        "mode": inference_mode,
+        "detected_cars": detected_cars,
+        "mean_ms": round(mean(latencies), 2),
+        "median_ms": round(median(latencies), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", default=TEST_IMAGES)
+    parser.add_argument("--model", default=YOLOv8_PREDICTION_PARAMETERS["model"])
+    parser.add_argument("--zone", type=json.loads, help="The parking zone of all images.")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print the report in JSON.")
+    args = parser.parse_args()
+
+    predictor = create_predictor(args.model)
+    report = []
+    for image in args.images:
+        frame = cv2.imread(image)
+        parking_zone = args.zone or quarters_zone(frame.shape)
+        for inference_mode in INFERENCE_MODES:
+            report.append(
+                {"image": image} | benchmark_mode(predictor, frame, parking_zone, inference_mode, args.repeat)
+            )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'Image':<40}{'Mode':<8}{'Cars':>6}{'Mean, ms':>12}{'Median, ms':>12}")
+    for row in report:
+        print(f"{row['image']:<40}{row['mode']:<8}{row['detected_cars']:>6}{row['mean_ms']:>12}{row['median_ms']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -129,6 +129,39 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = (BASE_DIR / "static",)
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Retention of the occupancy history compacted by the `rollup_occupancy` command.
+RAW_OCCUPANCY_RETENTION_DAYS = 7  # Older occupancies are compacted into minute aggregates.
+MINUTE_OCCUPANCY_RETENTION_DAYS = 30  # Older minute aggregates are compacted into hour aggregates.
+# An occupancy holds until the next one of its parking lot, but no longer than this time (in seconds), so a stopped
+# detection isn't carried forward. It should exceed the heartbeat of the detector (`OCCUPANCY_HEARTBEAT`)
+# and the processing rates of the parking lots.
+OCCUPANCY_MAX_GAP = 30 * 60
+
+# Lifetime (in seconds) of the cached map of parking lots. Changes of parking lots and stream sources
+# invalidate the map at once, but stream sources deactivated by the detector are only updated on expiry.
+MAP_CACHE_TIMEOUT = 5 * 60
+# Lifetime (in seconds) of the cached free spots of parking lots, which are shared by the map and the API.
+# Occupancies saved by the detector in another process become visible on expiry.
+OCCUPANCY_SNAPSHOT_TIMEOUT = 5
+
+# Server-Sent Events of changed free spots. Changes are polled from the database once per process (in seconds).
+OCCUPANCY_EVENTS_POLL_INTERVAL = 2
+OCCUPANCY_EVENTS_KEEPALIVE = 15  # Seconds between comments sent to idle connections.
+OCCUPANCY_EVENTS_RETRY = 5  # Seconds a client waits before reconnecting.
+
+# Proxies (addresses or networks) whose `X-Forwarded-For` headers are trusted to find out a client IP address.
+TRUSTED_PROXIES = os.environ.get("TRUSTED_PROXIES", "127.0.0.1__::1").split("__")
+CLIENT_IP_CACHE_SIZE = 4096  # The maximum number of addresses whose trust is cached.
+
+# Approximate location of a client, which the map is centered on. Addresses are looked up in a local CSV database
+# of IP ranges (e.g. "IP to City Lite" of DB-IP), then in the background by the remote service, if it's set.
+GEOLOCATION_DATABASE = os.environ.get("GEOLOCATION_DATABASE", BASE_DIR / "geolocation.csv")
+GEOLOCATION_REMOTE_URL = os.environ.get("GEOLOCATION_REMOTE_URL", "https://ipinfo.io/{}/json")
+GEOLOCATION_REMOTE_TIMEOUT = 1  # In seconds.
+GEOLOCATION_CACHE_SIZE = 10_000  # The maximum number of cached addresses.
+GEOLOCATION_CACHE_TTL = 24 * 60 * 60  # In seconds.
+GEOLOCATION_MAX_PENDING = 100  # The maximum number of remote lookups queued or running at once.
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
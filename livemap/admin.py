@@ -1,6 +1,16 @@
 from django.contrib import admin
 
-from livemap.models import Address, City, Country, Occupancy, ParkingLot, VideoStreamSource
+from livemap.models import (
+    Address,
+    City,
+    Country,
+    DetectionWorker,
+    LatestOccupancy,
+    Occupancy,
+    OccupancyAggregate,
+    ParkingLot,
+    VideoStreamSource,
+)
 
 admin.site.register(Country)
 
@@ -22,7 +32,7 @@ class ParkingLotAdmin(admin.ModelAdmin):
 
 @admin.register(VideoStreamSource)
 class VideoStreamSourceAdmin(admin.ModelAdmin):
-    list_display = ("id", "stream_source", "is_active", "processing_rate", "parking_lot")
+    list_display = ("id", "stream_source", "is_active", "processing_rate", "inference_mode", "parking_lot")
 
 
 @admin.register(Occupancy)
@@ -34,3 +44,26 @@ class OccupancyAdmin(admin.ModelAdmin):
     time_seconds.short_description = "Timestamp"  # type: ignore[attr-defined]
 
     list_display = ("occupied_spots", "time_seconds", "parking_lot")
+
+
+@admin.register(LatestOccupancy)
+class LatestOccupancyAdmin(admin.ModelAdmin):
+    list_display = ("parking_lot", "occupied_spots", "timestamp")
+
+
+@admin.register(OccupancyAggregate)
+class OccupancyAggregateAdmin(admin.ModelAdmin):
+    list_display = (
+        "period_start",
+        "period",
+        "avg_occupied_spots",
+        "min_occupied_spots",
+        "max_occupied_spots",
+        "parking_lot",
+    )
+    list_filter = ("period",)
+
+
+@admin.register(DetectionWorker)
+class DetectionWorkerAdmin(admin.ModelAdmin):
+    list_display = ("name", "host", "pid", "parking_lots", "started_at", "heartbeat_at")
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from typing import Any, AsyncIterator, NamedTuple
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition, require_GET
+
+from livemap.events import broadcaster
+from livemap.models import ParkingLot
+
+OCCUPANCY_SNAPSHOT_CACHE_KEY = "livemap:occupancy_snapshot"
+GEOJSON_CONTENT_TYPE = "application/geo+json"
+
+
+class OccupancySnapshot(NamedTuple):
+    """GeoJSON features of all parking lots with their current free spots, shared by all clients."""
+
+    features: list[dict[str, Any]]
+    changed_at: list[datetime | None]  # The time the free spots of every feature changed at
+    body: bytes  # The serialized feature collection of all parking lots
+    etag: str
+
+
+def _compose_feature(parking: ParkingLot) -> dict[str, Any]:
+    latest_occupancy = getattr(parking, "latest_occupancy", None)
+    return {
+        "type": "Feature",
+        "id": parking.id,
+        # GeoJSON positions are longitude first
+        "geometry": {"type": "Point", "coordinates": [parking.geolocation[1], parking.geolocation[0]]},
+        "properties": {
+            "address": str(parking.address),
+            "is_private": bool(parking.is_private),
+            "is_free": bool(parking.is_free),
+            "total_spots": parking.total_spots,
+            "spots_for_disabled": parking.spots_for_disabled,
+            "free_spots": parking.total_spots - latest_occupancy.occupied_spots if latest_occupancy else None,
+            "changed_at": latest_occupancy.changed_at.isoformat() if latest_occupancy else None,
+        },
+    }
+
+
+def _dump_feature_collection(features: list[dict[str, Any]], changed_at: datetime | None) -> bytes:
+    feature_collection = {
+        "type": "FeatureCollection",
+        # The `since` value for the next request of changes
+        "changed_at": changed_at.isoformat() if changed_at else None,
+        "features": features,
+    }
+    return json.dumps(feature_collection, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def get_occupancy_snapshot() -> OccupancySnapshot:
+    """Return the cached snapshot of parking lots, rebuilding it in a single query once it has expired."""
+    if (snapshot := cache.get(OCCUPANCY_SNAPSHOT_CACHE_KEY)) is None:
+        parkings = ParkingLot.objects.select_related(
+            "address", "address__city", "address__city__country", "latest_occupancy"
+        ).order_by("id")
+        features, changed_at = [], []
+        for parking in parkings:
+            features.append(_compose_feature(parking))
+            changed_at.append(parking.latest_occupancy.changed_at if hasattr(parking, "latest_occupancy") else None)
+        timestamps = [timestamp for timestamp in changed_at if timestamp is not None]
+        body = _dump_feature_collection(features, max(timestamps, default=None))
+        snapshot = OccupancySnapshot(features, changed_at, body, hashlib.md5(body).hexdigest())
+        cache.set(OCCUPANCY_SNAPSHOT_CACHE_KEY, snapshot, settings.OCCUPANCY_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _parse_timestamp(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    # A "+" of an unencoded UTC offset is decoded as a space
+    if (timestamp := parse_datetime(value.replace(" ", "+"))) is None:
+        raise ValueError(f"Invalid timestamp: {value}")
+    return timestamp if timezone.is_aware(timestamp) else timestamp.replace(tzinfo=dt_timezone.utc)
+
+
+def _changes_since(snapshot: OccupancySnapshot, since: datetime) -> tuple[list[dict[str, Any]], datetime]:
+    features, latest_change = [], since
+    for feature, changed_at in zip(snapshot.features, snapshot.changed_at):
+        if changed_at is not None and changed_at > since:
+            features.append(feature)
+            latest_change = max(latest_change, changed_at)
+    return features, latest_change
+
+
+def _parking_lots_etag(request: WSGIRequest) -> str:
+    snapshot = get_occupancy_snapshot()
+    if since := request.GET.get("since"):
+        return hashlib.md5(f"{snapshot.etag}{since}".encode()).hexdigest()
+    return snapshot.etag
+
+
+@require_GET
+@condition(etag_func=_parking_lots_etag)
+def parking_lots(request: WSGIRequest) -> HttpResponse:
+    """Return parking lots with their free spots as a GeoJSON feature collection.
+
+    With a `since` timestamp, only parking lots whose free spots have changed after it are returned.
+    The `changed_at` member of the response is the `since` value for the next request.
+    """
+    try:
+        since = _parse_timestamp(request.GET.get("since"))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    snapshot = get_occupancy_snapshot()
+    if since is None:
+        return HttpResponse(snapshot.body, content_type=GEOJSON_CONTENT_TYPE)
+
+    features, latest_change = _changes_since(snapshot, since)
+    return HttpResponse(_dump_feature_collection(features, latest_change), content_type=GEOJSON_CONTENT_TYPE)
+
+
+def _format_event(change: dict[str, Any]) -> str:
+    # The event id lets a reconnecting client resume from the last received change
+    return f"id: {change['changed_at']}\nevent: occupancy\ndata: {json.dumps(change, separators=(',', ':'))}\n\n"
+
+
+async def occupancy_events(request: ASGIRequest) -> HttpResponse:
+    """Stream changes of free spots of parking lots as Server-Sent Events (served by an ASGI server).
+
+    Every event holds the id, free spots and the change time of a parking lot. A client reconnecting with
+    the `Last-Event-ID` header gets the changes it has missed first.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server consumes the whole endless stream before responding
+        return JsonResponse({"error": "Server-Sent Events are served only by an ASGI server."}, status=501)
+    try:
+        last_event_time = _parse_timestamp(request.headers.get("Last-Event-ID"))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    async def stream_events() -> AsyncIterator[str]:
+        # Not a context manager, since the generator of a closed connection may be finalized outside the event loop
+        changes = broadcaster.subscribe()
+        try:
+            yield f"retry: {settings.OCCUPANCY_EVENTS_RETRY * 1000}\n\n"
+            if last_event_time is not None:
+                missed_features, _ = _changes_since(await sync_to_async(get_occupancy_snapshot)(), last_event_time)
+                for feature in missed_features:
+                    properties = feature["properties"]
+                    yield _format_event(
+                        {
+                            "id": feature["id"],
+                            "free_spots": properties["free_spots"],
+                            "changed_at": properties["changed_at"],
+                        }
+                    )
+            while True:
+                try:
+                    change = await asyncio.wait_for(changes.get(), settings.OCCUPANCY_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"  # Prevent proxies from closing an idle connection
+                    continue
+                yield _format_event(change)
+        finally:
+            broadcaster.unsubscribe(changes)
+
+    response = StreamingHttpResponse(stream_events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Disable buffering of nginx
+    return response
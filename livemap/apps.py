@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LivemapConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "livemap"
+
+    def ready(self) -> None:
+        from livemap import signals  # noqa: F401
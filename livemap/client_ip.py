@@ -0,0 +1,49 @@
+import ipaddress
+from functools import lru_cache
+from typing import Iterable
+
+from django.conf import settings
+from django.http import HttpRequest
+
+
+class ClientIPResolver:
+    """Resolve the IP address of a client, taking `X-Forwarded-For` into account only behind trusted proxies.
+
+    The header is read from the right: every address appended by a trusted proxy is skipped, and the first
+    untrusted address is the client. Anything to the left of it may be forged by the client.
+    Whether an address belongs to a trusted network is cached for the last `cache_size` addresses.
+    """
+
+    def __init__(self, trusted_proxies: Iterable[str], cache_size: int = 4096) -> None:
+        self.trusted_networks = [ipaddress.ip_network(proxy, strict=False) for proxy in trusted_proxies]
+        self.is_trusted = lru_cache(maxsize=cache_size)(self._is_trusted)
+
+    def _is_trusted(self, address: str) -> bool:
+        try:
+            ip_address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip_address in network for network in self.trusted_networks)
+
+    def resolve(self, request: HttpRequest) -> str | None:
+        address = request.META.get("REMOTE_ADDR")
+        if not address or not self.is_trusted(address):
+            return address
+        forwarded_addresses = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+        for forwarded_address in reversed([address.strip() for address in forwarded_addresses if address.strip()]):
+            if not self.is_trusted(forwarded_address):
+                return forwarded_address
+            address = forwarded_address
+        return address  # The leftmost address, if all addresses are trusted
+
+
+@lru_cache(maxsize=None)
+def get_client_ip_resolver() -> ClientIPResolver:
+    return ClientIPResolver(settings.TRUSTED_PROXIES, settings.CLIENT_IP_CACHE_SIZE)
+
+
+def get_client_ip(request: HttpRequest) -> str | None:
+    """Return the IP address of the client of the request, resolving it once per request."""
+    if not hasattr(request, "client_ip"):
+        request.client_ip = get_client_ip_resolver().resolve(request)  # type: ignore[attr-defined]
+    return request.client_ip  # type: ignore[attr-defined]
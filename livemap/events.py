@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from livemap.models import LatestOccupancy
+
+# Occupancies saved in a transaction that was committed later than the previous poll can have `changed_at`
+# before it, so every poll looks back for this long
+_COMMIT_DELAY = timedelta(seconds=5)
+
+
+class OccupancyBroadcaster:
+    """Fan out changes of free spots to the clients subscribed in this process.
+
+    The detector saves occupancies in another process, so the database serves as the broker: while there are
+    subscribers, a single task polls the latest occupancies every `poll_interval` seconds and publishes the
+    changes to all of them, and the database load doesn't depend on the number of clients.
+    A subscriber that falls more than `max_queue_size` changes behind loses the oldest of them.
+    """
+
+    def __init__(
+        self, poll_interval: float = settings.OCCUPANCY_EVENTS_POLL_INTERVAL, max_queue_size: int = 1000
+    ) -> None:
+        self.poll_interval = poll_interval
+        self.max_queue_size = max_queue_size
+        self._subscribers: set[asyncio.Queue[dict[str, Any]]] = set()
+        self._relay: asyncio.Task | None = None
+        # The `changed_at` of the last published change of every parking lot
+        self._published: dict[int, datetime] = {}
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, changes: list[dict[str, Any]]) -> None:
+        for queue in self._subscribers:
+            for change in changes:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(change)
+
+    def subscribe(self) -> asyncio.Queue[dict[str, Any]]:
+        """Return a queue of the next changes, starting the relay of changes if needed (in a running event loop)."""
+        queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(self.max_queue_size)
+        self._subscribers.add(queue)
+        if self._relay is None or self._relay.done():
+            self._relay = asyncio.create_task(self._relay_changes())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue[dict[str, Any]]) -> None:
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._relay is not None:
+            self._relay.cancel()
+            self._relay = None
+
+    async def _relay_changes(self) -> None:
+        watermark = timezone.now()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                changes = await self._fetch_changes(watermark - _COMMIT_DELAY)
+            except DatabaseError:
+                continue  # The database is busy, the changes are fetched by the next poll
+            if changes:
+                watermark = max(watermark, *(change["changed_at"] for change in changes))
+                self.publish([change | {"changed_at": change["changed_at"].isoformat()} for change in changes])
+
+    async def _fetch_changes(self, since: datetime) -> list[dict[str, Any]]:
+        changes = []
+        async for parking_lot_id, occupied_spots, total_spots, changed_at in LatestOccupancy.objects.filter(
+            changed_at__gt=since
+        ).values_list("parking_lot_id", "occupied_spots", "parking_lot__total_spots", "changed_at"):
+            if self._published.get(parking_lot_id) != changed_at:
+                self._published[parking_lot_id] = changed_at
+                changes.append(
+                    {"id": parking_lot_id, "free_spots": total_spots - occupied_spots, "changed_at": changed_at}
+                )
+        return changes
+
+
+broadcaster = OccupancyBroadcaster()
@@ -0,0 +1,190 @@
+import csv
+import ipaddress
+import logging
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import Hashable
+
+import requests  # type: ignore[import]
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+Geolocation = tuple[float, float]
+IPAddress = ipaddress.IPv4Address | ipaddress.IPv6Address
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> tuple[bool, object]:
+        """Return whether the key is cached and its value."""
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: object) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class IPRangeDatabase:
+    """Offline geolocation by IP ranges loaded from a CSV file.
+
+    Every row starts with the first and the last addresses of a range and ends with its latitude and longitude,
+    e.g. "1.0.0.0,1.0.0.255,OC,AU,Queensland,South Brisbane,-27.4767,153.017" of the "IP to City Lite" database
+    of DB-IP. The ranges of every IP version are kept sorted, so an address is looked up by a binary search.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        ranges: dict[int, list[tuple[int, int, Geolocation]]] = {4: [], 6: []}
+        with open(path, newline="", encoding="utf-8") as file:
+            for row in csv.reader(file):
+                try:
+                    first, last = ipaddress.ip_address(row[0]), ipaddress.ip_address(row[1])
+                    location = float(row[-2]), float(row[-1])
+                except (IndexError, ValueError):
+                    continue  # Skip headers and malformed rows
+                ranges[first.version].append((int(first), int(last), location))
+        self._starts, self._ends, self._locations = {}, {}, {}
+        for version, version_ranges in ranges.items():
+            version_ranges.sort()
+            self._starts[version] = [first for first, _, _ in version_ranges]
+            self._ends[version] = [last for _, last, _ in version_ranges]
+            self._locations[version] = [location for _, _, location in version_ranges]
+        logger.info(f"Loaded {sum(len(starts) for starts in self._starts.values())} IP ranges from {path}.")
+
+    def lookup(self, ip_address: IPAddress) -> Geolocation | None:
+        starts, address = self._starts[ip_address.version], int(ip_address)
+        index = bisect_right(starts, address) - 1
+        if index >= 0 and address <= self._ends[ip_address.version][index]:
+            return self._locations[ip_address.version][index]
+        return None
+
+
+class RemoteGeolocation:
+    """Geolocation by a web service returning JSON with a "loc" field, such as ipinfo.io."""
+
+    def __init__(self, url: str, timeout: float) -> None:
+        self.url = url
+        self.timeout = timeout
+
+    def lookup(self, ip_address: IPAddress) -> Geolocation | None:
+        """Return the location of the address, or `None` if the service doesn't know it.
+
+        `requests.RequestException` is raised if the service is unavailable or responds with an error,
+        so the address can be looked up again later.
+        """
+        response = requests.get(self.url.format(ip_address), timeout=self.timeout)
+        response.raise_for_status()
+        try:
+            location = response.json().get("loc", "").split(",")
+            if len(location) == 2:
+                latitude, longitude = location
+                return float(latitude), float(longitude)
+        except (AttributeError, ValueError) as error:
+            logger.warning(f"Failed to parse the geolocation of {ip_address}: {error}")
+        return None
+
+
+class GeolocationResolver:
+    """Resolve IP addresses to geolocations by the local database, falling back to the remote service.
+
+    Remote lookups run in a background thread, so a request never waits for the remote service: the location
+    of an address missing in the local database is unknown until the lookup has completed and cached it.
+    At most `max_pending` lookups are queued or running, so a slow remote service doesn't pile up addresses:
+    the rest are left unknown, and looked up by later requests. Both found and unknown locations are cached,
+    but the addresses whose remote lookups have failed are looked up again by later requests.
+    """
+
+    def __init__(
+        self,
+        database: IPRangeDatabase | None = None,
+        remote: RemoteGeolocation | None = None,
+        cache_size: int = 10_000,
+        cache_ttl: float = 24 * 60 * 60,
+        max_pending: int = 100,
+    ) -> None:
+        self.database = database
+        self.remote = remote
+        self._cache = TTLCache(cache_size, cache_ttl)
+        self.max_pending = max_pending
+        self._pending: set[IPAddress] = set()
+        self._pending_lock = Lock()
+        self._remote_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="geolocation")
+
+    def resolve(self, ip_address: str) -> Geolocation | None:
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return None
+        is_cached, location = self._cache.get(address)
+        if is_cached:
+            return location  # type: ignore[return-value]
+
+        if self.database is not None and (location := self.database.lookup(address)) is not None:
+            self._cache.set(address, location)
+        elif self.remote is not None and address.is_global:
+            with self._pending_lock:
+                if address not in self._pending and len(self._pending) < self.max_pending:
+                    self._pending.add(address)
+                    self._remote_executor.submit(self._resolve_remotely, address)
+        else:
+            self._cache.set(address, None)
+        return location
+
+    def _resolve_remotely(self, address: IPAddress) -> None:
+        try:
+            self._cache.set(address, self.remote.lookup(address))  # type: ignore[union-attr]
+        except requests.RequestException as error:
+            # Failures of the remote service are not cached, so they don't outlive an outage
+            logger.warning(f"Failed to fetch the geolocation of {address}: {error}")
+        finally:
+            with self._pending_lock:
+                self._pending.discard(address)
+
+
+@lru_cache(maxsize=None)
+def get_geolocation_resolver() -> GeolocationResolver:
+    """Create the resolver configured by the `GEOLOCATION_*` settings once per process."""
+    database = None
+    if settings.GEOLOCATION_DATABASE:
+        if Path(settings.GEOLOCATION_DATABASE).is_file():
+            database = IPRangeDatabase(settings.GEOLOCATION_DATABASE)
+        else:
+            logger.warning(f"The geolocation database {settings.GEOLOCATION_DATABASE} doesn't exist.")
+    remote = (
+        RemoteGeolocation(settings.GEOLOCATION_REMOTE_URL, settings.GEOLOCATION_REMOTE_TIMEOUT)
+        if settings.GEOLOCATION_REMOTE_URL
+        else None
+    )
+    return GeolocationResolver(
+        database,
+        remote,
+        settings.GEOLOCATION_CACHE_SIZE,
+        settings.GEOLOCATION_CACHE_TTL,
+        settings.GEOLOCATION_MAX_PENDING,
+    )
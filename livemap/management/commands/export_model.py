@@ -0,0 +1,57 @@
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from spot_gazer_core.configs.settings import MODEL_ACCURACY_TOLERANCE, YOLOv8_PREDICTION_PARAMETERS
+from spot_gazer_core.model_backends import MODEL_BACKENDS, check_accuracy, export_model
+
+TEST_IMAGES = ("tests/test_media/small_parking.jpg", "tests/test_media/big_parking.jpg")
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the PyTorch weights of SpotGazer to an inference backend "
+        "and check that the exported model detects as many cars on the test images."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("backend", choices=MODEL_BACKENDS)
+        parser.add_argument("--weights", default=YOLOv8_PREDICTION_PARAMETERS["model"])
+        parser.add_argument("--imgsz", type=int, default=YOLOv8_PREDICTION_PARAMETERS["imgsz"])
+        parser.add_argument(
+            "--calibration-images",
+            nargs="+",
+            default=(),
+            help="Frames of the cameras the INT8 quantization is calibrated on, other than the test images.",
+        )
+        parser.add_argument("--test-images", nargs="+", default=TEST_IMAGES)
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=MODEL_ACCURACY_TOLERANCE,
+            help="The maximum difference of the numbers of cars as a share of those detected by the PyTorch model.",
+        )
+        parser.add_argument("--skip-check", action="store_true", help="Don't check the accuracy of the model.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options["backend"] == "onnx-int8":
+            if not options["calibration_images"]:
+                raise CommandError("INT8 quantization needs --calibration-images.")
+            # A model calibrated on the test images would pass the accuracy check regardless of its accuracy
+            test_images = {Path(image).resolve() for image in options["test_images"]}
+            if overlap := [image for image in options["calibration_images"] if Path(image).resolve() in test_images]:
+                raise CommandError(f"The calibration images must not be test images: {', '.join(overlap)}.")
+        model_path = export_model(
+            options["backend"], options["weights"], options["calibration_images"], options["imgsz"]
+        )
+        self.stdout.write(f"The model has been exported to {model_path}.")
+        if options["skip_check"]:
+            return
+
+        report = check_accuracy(model_path, options["test_images"], options["weights"], options["tolerance"])
+        for row in report:
+            self.stdout.write(f"{row['image']}: {row['detected']} cars, {row['reference']} by the PyTorch model.")
+        if failed_images := [row["image"] for row in report if not row["passed"]]:
+            raise CommandError(f"The counts of cars are out of tolerance on {', '.join(failed_images)}.")
+        self.stdout.write(self.style.SUCCESS("The counts of cars are within tolerance on all test images."))
@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+from operator import itemgetter
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.db.models import Avg, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from livemap.models import Occupancy, OccupancyAggregate
+
+
+MINUTE, HOUR = timedelta(minutes=1), timedelta(hours=1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact occupancies older than the raw retention into minute aggregates "
+        "and minute aggregates older than the minute retention into hour aggregates."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--raw-retention",
+            type=int,
+            default=settings.RAW_OCCUPANCY_RETENTION_DAYS,
+            help="The number of days occupancies are stored as they are.",
+        )
+        parser.add_argument(
+            "--minute-retention",
+            type=int,
+            default=settings.MINUTE_OCCUPANCY_RETENTION_DAYS,
+            help="The number of days minute aggregates are stored.",
+        )
+        parser.add_argument(
+            "--max-gap",
+            type=int,
+            default=settings.OCCUPANCY_MAX_GAP,
+            help="The maximum time (in seconds) an occupancy holds until the next one of its parking lot.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        now = timezone.now()
+        # Cutoffs are aligned to the periods, so every period is compacted at once
+        raw_cutoff = (now - timedelta(days=options["raw_retention"])).replace(second=0, microsecond=0)
+        minute_cutoff = (now - timedelta(days=options["minute_retention"])).replace(minute=0, second=0, microsecond=0)
+
+        occupancies, minutes = self._compact_occupancies(raw_cutoff, timedelta(seconds=options["max_gap"]))
+        compacted_minutes, hours = self._compact_minutes(minute_cutoff)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{occupancies} occupancies were compacted into {minutes} minute aggregates, "
+                f"{compacted_minutes} minute aggregates were compacted into {hours} hour aggregates."
+            )
+        )
+
+    @classmethod
+    @transaction.atomic
+    def _compact_occupancies(cls, cutoff: datetime, max_gap: timedelta) -> tuple[int, int]:
+        """Compact the occupancies before the cutoff into minute aggregates weighted by time.
+
+        An occupancy holds until the next one of its parking lot (at most `max_gap`), so minutes without
+        occupancies, which are only saved on changes and heartbeats in the "changes" storage mode, get the carried
+        value, and an occupancy counts in proportion to the time it held. The last occupancy of every parking lot
+        is kept to carry its value into the next compaction.
+        """
+        # Ends of the already compacted periods of the parking lots
+        compacted_until: dict[int, datetime] = {}
+        for period, length in ((OccupancyAggregate.Period.MINUTE, MINUTE), (OccupancyAggregate.Period.HOUR, HOUR)):
+            for parking_lot_id, last_start in (
+                OccupancyAggregate.objects.filter(period=period)
+                .values("parking_lot_id")
+                .annotate(last_start=Max("period_start"))
+                .values_list("parking_lot_id", "last_start")
+            ):
+                compacted_until[parking_lot_id] = max(
+                    compacted_until.get(parking_lot_id, last_start), last_start + length
+                )
+
+        occupancies = Occupancy.objects.filter(timestamp__lt=cutoff)
+        aggregates, kept_occupancies = [], []
+        rows = occupancies.order_by("parking_lot_id", "timestamp").values_list(
+            "id", "parking_lot_id", "timestamp", "occupied_spots"
+        )
+        for parking_lot_id, lot_rows in groupby(rows.iterator(), key=itemgetter(1)):
+            lot_rows = list(lot_rows)
+            aggregates += cls._aggregate_minutes(
+                parking_lot_id, lot_rows, compacted_until.get(parking_lot_id), cutoff, max_gap
+            )
+            kept_occupancies.append(lot_rows[-1][0])
+        OccupancyAggregate.objects.bulk_create(aggregates, batch_size=1000)
+        compacted, _ = occupancies.exclude(id__in=kept_occupancies).delete()
+        return compacted, len(aggregates)
+
+    @staticmethod
+    def _aggregate_minutes(
+        parking_lot_id: int,
+        rows: list[tuple[int, int, datetime, int]],
+        compacted_until: datetime | None,
+        cutoff: datetime,
+        max_gap: timedelta,
+    ) -> list[OccupancyAggregate]:
+        # Samples, minimum, maximum, the sum of occupied spots multiplied by seconds and the seconds by minute starts
+        minutes: dict[datetime, list[float]] = {}
+        for (_, _, timestamp, occupied_spots), next_row in zip(rows, [*rows[1:], None]):
+            start = timestamp if compacted_until is None else max(timestamp, compacted_until)
+            end = min(next_row[2] if next_row else cutoff, timestamp + max_gap, cutoff)
+            if timestamp == start:  # Occupancies of the compacted periods only carry their values forward
+                stats = minutes.setdefault(start.replace(second=0, microsecond=0), [0, occupied_spots, 0, 0, 0])
+                stats[:3] = stats[0] + 1, min(stats[1], occupied_spots), max(stats[2], occupied_spots)
+            while start < end:
+                minute_start = start.replace(second=0, microsecond=0)
+                minute_end = min(minute_start + MINUTE, end)
+                stats = minutes.setdefault(minute_start, [0, occupied_spots, 0, 0, 0])
+                seconds = (minute_end - start).total_seconds()
+                stats[1:] = (
+                    min(stats[1], occupied_spots),
+                    max(stats[2], occupied_spots),
+                    stats[3] + occupied_spots * seconds,
+                    stats[4] + seconds,
+                )
+                start = minute_end
+        return [
+            OccupancyAggregate(
+                parking_lot_id=parking_lot_id,
+                period=OccupancyAggregate.Period.MINUTE,
+                period_start=minute_start,
+                samples=samples,
+                min_occupied_spots=minimum,
+                max_occupied_spots=maximum,
+                # Occupancies replaced at once are averaged
+                avg_occupied_spots=spot_seconds / seconds if seconds else (minimum + maximum) / 2,
+            )
+            for minute_start, (samples, minimum, maximum, spot_seconds, seconds) in minutes.items()
+        ]
+
+    @staticmethod
+    @transaction.atomic
+    def _compact_minutes(cutoff: datetime) -> tuple[int, int]:
+        minutes = OccupancyAggregate.objects.filter(period=OccupancyAggregate.Period.MINUTE, period_start__lt=cutoff)
+        aggregates = [
+            OccupancyAggregate(
+                parking_lot_id=hour["parking_lot_id"],
+                period=OccupancyAggregate.Period.HOUR,
+                period_start=hour["hour_start"],
+                samples=hour["hour_samples"],
+                min_occupied_spots=hour["hour_min"],
+                max_occupied_spots=hour["hour_max"],
+                # Minute aggregates are weighted by time, and every one of them stands for a minute
+                avg_occupied_spots=hour["hour_avg"],
+            )
+            for hour in minutes.annotate(hour_start=Trunc("period_start", "hour", tzinfo=dt_timezone.utc))
+            .values("parking_lot_id", "hour_start")
+            .annotate(
+                hour_samples=Sum("samples"),
+                hour_min=Min("min_occupied_spots"),
+                hour_max=Max("max_occupied_spots"),
+                hour_avg=Avg("avg_occupied_spots"),
+            )
+            .order_by()
+        ]
+        OccupancyAggregate.objects.bulk_create(aggregates, batch_size=1000)
+        compacted, _ = minutes.delete()
+        return compacted, len(aggregates)
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("livemap", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videostreamsource",
+            name="inference_mode",
+            field=models.CharField(
+                choices=[
+                    ("mask", "Mask the parking zone"),
+                    ("crop", "Crop to the parking zone"),
+                    ("tiles", "Crop to each part of the parking zone"),
+                ],
+                default="mask",
+                help_text="Cropping speeds up the detection and increases the resolution of small parking zones.",
+                max_length=5,
+            ),
+        ),
+    ]
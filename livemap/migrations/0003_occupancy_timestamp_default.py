@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("livemap", "0002_videostreamsource_inference_mode"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="occupancy",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("livemap", "0003_occupancy_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OccupancyAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(choices=[("minute", "Minute"), ("hour", "Hour")], max_length=6),
+                ),
+                ("period_start", models.DateTimeField()),
+                (
+                    "samples",
+                    models.PositiveIntegerField(help_text="The number of compacted occupancies."),
+                ),
+                ("min_occupied_spots", models.PositiveIntegerField()),
+                ("max_occupied_spots", models.PositiveIntegerField()),
+                ("avg_occupied_spots", models.FloatField()),
+                (
+                    "parking_lot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy_aggregates",
+                        to="livemap.parkinglot",
+                    ),
+                ),
+            ],
+            options={
+                "get_latest_by": "period_start",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="occupancyaggregate",
+            constraint=models.UniqueConstraint(
+                fields=("parking_lot", "period", "period_start"),
+                name="unique_occupancy_period",
+            ),
+        ),
+    ]
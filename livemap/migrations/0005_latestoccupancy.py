@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_latest_occupancies(apps, schema_editor):
+    Occupancy = apps.get_model("livemap", "Occupancy")
+    LatestOccupancy = apps.get_model("livemap", "LatestOccupancy")
+    latest_occupancies = Occupancy.objects.order_by("parking_lot_id", "-timestamp", "-id").values(
+        "parking_lot_id", "occupied_spots", "timestamp"
+    )
+    seen_parking_lots = set()
+    for occupancy in latest_occupancies.iterator():
+        if occupancy["parking_lot_id"] not in seen_parking_lots:
+            seen_parking_lots.add(occupancy["parking_lot_id"])
+            LatestOccupancy.objects.create(**occupancy)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("livemap", "0004_occupancyaggregate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LatestOccupancy",
+            fields=[
+                (
+                    "parking_lot",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="latest_occupancy",
+                        serialize=False,
+                        to="livemap.parkinglot",
+                    ),
+                ),
+                ("occupied_spots", models.PositiveIntegerField(default=0)),
+                ("timestamp", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name_plural": "Latest occupancy",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="occupancy",
+            index=models.Index(fields=["parking_lot", "timestamp"], name="occupancy_lot_timestamp_idx"),
+        ),
+        migrations.RunPython(fill_latest_occupancies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:13
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("livemap", "0005_latestoccupancy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="latestoccupancy",
+            name="changed_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("livemap", "0006_latestoccupancy_changed_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DetectionWorker",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("host", models.CharField(max_length=100)),
+                ("pid", models.PositiveIntegerField()),
+                (
+                    "parking_lots",
+                    models.PositiveIntegerField(default=0, help_text="The number of processed parking lots."),
+                ),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "heartbeat_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
@@ -1,7 +1,8 @@
-from typing import Any
+from typing import Any, Iterable
 
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 
 
 class Country(models.Model):
@@ -78,6 +79,11 @@ class ParkingLot(models.Model):
 
 
 class VideoStreamSource(models.Model):
+    class InferenceMode(models.TextChoices):
+        MASK = "mask", "Mask the parking zone"
+        CROP = "crop", "Crop to the parking zone"
+        TILES = "tiles", "Crop to each part of the parking zone"
+
     parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name="stream_sources")
     stream_source = models.URLField()
     processing_rate = models.PositiveIntegerField(help_text="In seconds.")
@@ -85,6 +91,12 @@ class VideoStreamSource(models.Model):
         blank=True, null=True, help_text="An array in a format [[[[int, int]], [[int, int]], ...]]."
     )
     is_active = models.BooleanField(default=True)
+    inference_mode = models.CharField(
+        max_length=5,
+        choices=InferenceMode.choices,
+        default=InferenceMode.MASK,
+        help_text="Cropping speeds up the detection and increases the resolution of small parking zones.",
+    )
 
     def __str__(self) -> str:
         return f"{self.stream_source}, {self.parking_lot}"
@@ -107,11 +119,114 @@ class VideoStreamSource(models.Model):
 class Occupancy(models.Model):
     parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name="occupancies")
     occupied_spots = models.PositiveIntegerField(default=0)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not `auto_now_add`, so the time of detection is kept when occupancies are saved in bulk later
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         get_latest_by = "timestamp"
         verbose_name_plural = "Occupancy"
+        indexes = [models.Index(fields=["parking_lot", "timestamp"], name="occupancy_lot_timestamp_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.occupied_spots} occupied spots, {self.parking_lot}"
+
+
+class LatestOccupancyManager(models.Manager):
+    def _from_occupancies(self, occupancies: Iterable[Occupancy]) -> list["LatestOccupancy"]:
+        newest_occupancies: dict[int, Occupancy] = {}
+        for occupancy in occupancies:
+            newest = newest_occupancies.get(occupancy.parking_lot_id)
+            if newest is None or occupancy.timestamp >= newest.timestamp:
+                newest_occupancies[occupancy.parking_lot_id] = occupancy
+        previous_occupancies = {
+            latest.parking_lot_id: latest for latest in self.filter(parking_lot_id__in=newest_occupancies.keys())
+        }
+        now = timezone.now()
+        latest_occupancies = []
+        for parking_lot_id, occupancy in newest_occupancies.items():
+            previous = previous_occupancies.get(parking_lot_id)
+            # Occupancies saved out of order must not replace newer ones
+            if previous is not None and occupancy.timestamp <= previous.timestamp:
+                continue
+            is_changed = previous is None or previous.occupied_spots != occupancy.occupied_spots
+            latest_occupancies.append(
+                self.model(
+                    parking_lot_id=parking_lot_id,
+                    occupied_spots=occupancy.occupied_spots,
+                    timestamp=occupancy.timestamp,
+                    changed_at=now if is_changed else previous.changed_at,  # type: ignore[union-attr]
+                )
+            )
+        return latest_occupancies
+
+    def update_from(self, occupancies: Iterable[Occupancy]) -> list["LatestOccupancy"]:
+        """Insert or update the latest occupancies of the parking lots with the newest of `occupancies`.
+
+        Occupancies that aren't newer than the latest occupancies of their parking lots are ignored.
+        """
+        return self.bulk_create(
+            self._from_occupancies(occupancies),
+            update_conflicts=True,
+            unique_fields=["parking_lot"],
+            update_fields=["occupied_spots", "timestamp", "changed_at"],
+        )
+
+
+class LatestOccupancy(models.Model):
+    """The newest occupancy of a parking lot, so current free spots are read without scanning the history."""
+
+    parking_lot = models.OneToOneField(
+        ParkingLot, on_delete=models.CASCADE, primary_key=True, related_name="latest_occupancy"
+    )
+    occupied_spots = models.PositiveIntegerField(default=0)
+    timestamp = models.DateTimeField()
+    # The time the occupied spots were saved with a new value. Unlike `timestamp`, it is the time of saving
+    # rather than detection, so clients polling for changes don't miss occupancies saved with a delay
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    objects = LatestOccupancyManager()
+
+    class Meta:
+        verbose_name_plural = "Latest occupancy"
 
     def __str__(self) -> str:
         return f"{self.occupied_spots} occupied spots, {self.parking_lot}"
+
+
+class OccupancyAggregate(models.Model):
+    """Occupancy of a parking lot compacted into a minute or an hour by the `rollup_occupancy` command."""
+
+    class Period(models.TextChoices):
+        MINUTE = "minute", "Minute"
+        HOUR = "hour", "Hour"
+
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name="occupancy_aggregates")
+    period = models.CharField(max_length=6, choices=Period.choices)
+    period_start = models.DateTimeField()
+    samples = models.PositiveIntegerField(help_text="The number of compacted occupancies.")
+    min_occupied_spots = models.PositiveIntegerField()
+    max_occupied_spots = models.PositiveIntegerField()
+    avg_occupied_spots = models.FloatField()
+
+    class Meta:
+        get_latest_by = "period_start"
+        constraints = [
+            models.UniqueConstraint(fields=["parking_lot", "period", "period_start"], name="unique_occupancy_period")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.avg_occupied_spots:.1f} occupied spots per {self.period}, {self.parking_lot}"
+
+
+class DetectionWorker(models.Model):
+    """A process detecting occupancy of a shard of parking lots, alive while it renews its lease by heartbeats."""
+
+    name = models.CharField(max_length=100, unique=True)
+    host = models.CharField(max_length=100)
+    pid = models.PositiveIntegerField()
+    parking_lots = models.PositiveIntegerField(default=0, help_text="The number of processed parking lots.")
+    started_at = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return str(self.name)
@@ -0,0 +1,27 @@
+from typing import Any
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from livemap.api import OCCUPANCY_SNAPSHOT_CACHE_KEY
+from livemap.models import Address, City, Country, LatestOccupancy, Occupancy, ParkingLot, VideoStreamSource
+from livemap.views import MAP_CACHE_KEY
+
+
+@receiver(post_save, sender=Occupancy)
+def update_latest_occupancy(sender: type[Occupancy], instance: Occupancy, created: bool, **kwargs: Any) -> None:
+    # Occupancies saved in bulk don't send signals, so their writers update the latest occupancies themselves
+    if created:
+        LatestOccupancy.objects.update_from([instance])
+        cache.delete(OCCUPANCY_SNAPSHOT_CACHE_KEY)
+
+
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=Address)
+@receiver([post_save, post_delete], sender=ParkingLot)
+@receiver([post_save, post_delete], sender=VideoStreamSource)
+def invalidate_map_cache(sender: type, **kwargs: Any) -> None:
+    # The map and the snapshot of parking lots are composed from these models
+    cache.delete_many([MAP_CACHE_KEY, OCCUPANCY_SNAPSHOT_CACHE_KEY])
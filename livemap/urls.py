@@ -1,9 +1,12 @@
 from django.urls import path
 
+from livemap.api import occupancy_events, parking_lots
 from livemap.views import index
 
 urlpatterns = [
     path("", index, name="index"),
+    path("api/parking-lots/", parking_lots, name="parking_lots"),
+    path("api/parking-lots/events/", occupancy_events, name="occupancy_events"),
 ]
 
 app_name = "livemap"
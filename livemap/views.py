@@ -1,38 +1,41 @@
-from functools import lru_cache
+import re
 
 import folium
-import requests  # type: ignore[import]
+from branca.element import Element
+from django.conf import settings
+from django.core.cache import cache
 from django.core.handlers.wsgi import WSGIRequest
+from django.db.models import Prefetch
 from django.http import HttpResponse
 from django.shortcuts import render
 
-from livemap.models import ParkingLot
+from livemap.api import get_occupancy_snapshot
+from livemap.client_ip import get_client_ip
+from livemap.geolocation import get_geolocation_resolver
+from livemap.models import ParkingLot, VideoStreamSource
+
+MAP_CACHE_KEY = "livemap:map_skeleton"
+# Placeholders of the cached map, which are filled in on every request
+FREE_SPOTS_PLACEHOLDER = "__FREE_SPOTS_{}__"
+FREE_SPOTS_PATTERN = re.compile(r"__FREE_SPOTS_(\d+)__")
+MAP_VIEW_PLACEHOLDER = "__MAP_VIEW__"
 
 
-@lru_cache()
 def _extract_client_ip_address(request: WSGIRequest) -> str | None:
-    req_headers = request.META
-    if x_forwarded_for_value := req_headers.get("HTTP_X_FORWARDED_FOR"):
-        ip_addr = x_forwarded_for_value.split(",")[0].strip()
-    else:
-        ip_addr = req_headers.get("REMOTE_ADDR")
-    return ip_addr
+    return get_client_ip(request)
 
 
-@lru_cache()
 def _fetch_geolocation(ip_address: str) -> tuple[float, float] | None:
-    response = requests.get(f"https://ipinfo.io/{ip_address}/json")
-
-    if response.status_code == 200:
-        data = response.json()
-        location = data.get("loc", "").split(",")
-        if len(location) == 2:
-            latitude, longitude = location
-            return float(latitude), float(longitude)
-    return None
+    return get_geolocation_resolver().resolve(ip_address)
 
 
-def _compose_html_table(parking: ParkingLot) -> str:
+def _compose_html_table(parking: ParkingLot, free_spots: str | None = None) -> str:
+    if free_spots is None:
+        free_spots = (
+            str(parking.total_spots - parking.latest_occupancy.occupied_spots)
+            if hasattr(parking, "latest_occupancy")
+            else ""
+        )
     parking_popup = {
         "Address": "<a href='https://www.google.com/maps/search/?api=1&query="
         f"{parking.geolocation[0]},{parking.geolocation[1]}'>{parking.address}</a>",
@@ -40,12 +43,14 @@ def _compose_html_table(parking: ParkingLot) -> str:
         "Free": parking.get_is_free,
         "Total spots": parking.total_spots,
         "Spots for disables": spots_for_disabled if (spots_for_disabled := parking.spots_for_disabled) else "",
-        "Free spots": parking.total_spots - parking.occupancies.latest().occupied_spots
-        if parking.occupancies.exists()
-        else "",
+        "Free spots": free_spots,
     }
     lives = "- Live "
-    for stream_source in parking.stream_sources.filter(parking_lot_id=parking.id):
+    # Active stream sources are prefetched by `index`
+    stream_sources = getattr(parking, "active_stream_sources", None)
+    if stream_sources is None:
+        stream_sources = parking.stream_sources.filter(is_active=True)
+    for stream_source in stream_sources:
         lives += f"<a href='{stream_source.stream_source}'> 🔴 </a>"
 
     html_table = f"""
@@ -71,16 +76,45 @@ def _compose_html_table(parking: ParkingLot) -> str:
     return html_table
 
 
-def index(request: WSGIRequest) -> HttpResponse:
+def _render_map_skeleton() -> str:
+    """Render the map with markers of all parking lots, leaving placeholders for the live data."""
     parkings = ParkingLot.objects.select_related("address", "address__city", "address__city__country").prefetch_related(
-        "occupancies", "stream_sources"
+        Prefetch(
+            "stream_sources",
+            queryset=VideoStreamSource.objects.filter(is_active=True).only("parking_lot_id", "stream_source"),
+            to_attr="active_stream_sources",
+        )
     )
-    client_ip_address = _extract_client_ip_address(request)
-    geolocation = _fetch_geolocation(client_ip_address) if client_ip_address else None
-    folium_map = folium.Map(geolocation)
+    folium_map = folium.Map()
 
     for parking in parkings:
-        popup = _compose_html_table(parking)
+        popup = _compose_html_table(parking, free_spots=FREE_SPOTS_PLACEHOLDER.format(parking.id))
         folium.Marker(parking.geolocation, folium.Popup(popup)).add_to(folium_map)
 
-    return render(request, "index.html", {"map": folium_map.get_root().render()})
+    # Center the map on the client, whose location is only known per request
+    folium_map.get_root().script.add_child(
+        Element(f"if ({MAP_VIEW_PLACEHOLDER}) {{ {folium_map.get_name()}.setView({MAP_VIEW_PLACEHOLDER}, 10); }}")
+    )
+    return folium_map.get_root().render()
+
+
+def _get_map_skeleton() -> str:
+    if (map_skeleton := cache.get(MAP_CACHE_KEY)) is None:
+        map_skeleton = _render_map_skeleton()
+        cache.set(MAP_CACHE_KEY, map_skeleton, settings.MAP_CACHE_TIMEOUT)
+    return map_skeleton
+
+
+def index(request: WSGIRequest) -> HttpResponse:
+    free_spots = {
+        str(feature["id"]): str(spots) if (spots := feature["properties"]["free_spots"]) is not None else ""
+        for feature in get_occupancy_snapshot().features
+    }
+    client_ip_address = _extract_client_ip_address(request)
+    geolocation = _fetch_geolocation(client_ip_address) if client_ip_address else None
+    map_view = f"[{geolocation[0]}, {geolocation[1]}]" if geolocation else "null"
+
+    rendered_map = FREE_SPOTS_PATTERN.sub(
+        lambda match: free_spots.get(match[1], ""), _get_map_skeleton().replace(MAP_VIEW_PLACEHOLDER, map_view)
+    )
+    return render(request, "index.html", {"map": rendered_map})
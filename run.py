@@ -1,3 +1,5 @@
+import argparse
+import multiprocessing
 import os
 from asyncio import run
 from typing import Any
@@ -5,10 +7,14 @@ from spot_gazer_core import SpotGazer
 
 import django
 from django.core.wsgi import get_wsgi_application
+from django.db.models import F
 
 django.setup()
 
 from livemap.models import VideoStreamSource  # noqa: E402
+from spot_gazer_core.configs.settings import METRICS_PORT  # noqa: E402
+from spot_gazer_core.metrics import start_metrics_server  # noqa: E402
+from spot_gazer_core.sharding import ShardedRunner  # noqa: E402
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_core.settings")
 application = get_wsgi_application()
@@ -17,7 +23,13 @@ application = get_wsgi_application()
 def select_grouped_stream_sources() -> list[list[dict[str, Any]]]:
     stream_sources_list = list(
         VideoStreamSource.objects.filter(is_active=True).values(
-            "parking_lot_id", "stream_source", "processing_rate", "parking_zone"
+            "id",
+            "parking_lot_id",
+            "stream_source",
+            "processing_rate",
+            "parking_zone",
+            "inference_mode",
+            total_spots=F("parking_lot__total_spots"),
         )
     )
     # Group video streams sources of the same parking lot.
@@ -32,20 +44,67 @@ def select_grouped_stream_sources() -> list[list[dict[str, Any]]]:
 
 async def run_spot_gazer(stream_sources_list: list[list[dict[str, Any]]]) -> None:
     spot_gazer = SpotGazer(stream_sources_list)
+    metrics_server = start_metrics_server(spot_gazer.metrics)
     try:
-        await spot_gazer.start_detection()
+        await spot_gazer.start_detection(select_grouped_stream_sources)
     finally:
-        spot_gazer.stop_detection()
+        if metrics_server is not None:
+            metrics_server.cancel()
+        await spot_gazer.stop_detection()
+
+
+async def run_sharded_worker(number: int = 0) -> None:
+    spot_gazer = SpotGazer([])
+    # Every worker on the host serves its metrics at its own port
+    metrics_server = start_metrics_server(spot_gazer.metrics, None if METRICS_PORT is None else METRICS_PORT + number)
+    try:
+        await ShardedRunner(spot_gazer, select_grouped_stream_sources).run()
+    finally:
+        if metrics_server is not None:
+            metrics_server.cancel()
+
+
+def _run_sharded_worker_process(number: int) -> None:
+    try:
+        run(run_sharded_worker(number))
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run SpotGazer and the Django server.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Split the parking lots between this number of detection worker processes. "
+        "Workers started on several hosts with the same database split the parking lots between all of them.",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    arguments = parse_arguments()
     try:
         # Run Django server in the background
         os.system("screen -dmSL django_session python3 ./manage.py runserver")
 
-        # Select all stream sources from the database and run Stop Gazer
-        stream_sources_list = select_grouped_stream_sources()
-        run(run_spot_gazer(stream_sources_list))
+        if arguments.workers:
+            # Every worker process loads its own model and claims its shard of parking lots
+            workers = [
+                multiprocessing.get_context("spawn").Process(
+                    target=_run_sharded_worker_process, args=(number,), name=f"worker-{number}"
+                )
+                for number in range(arguments.workers)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        else:
+            # Select all stream sources from the database and run Stop Gazer
+            stream_sources_list = select_grouped_stream_sources()
+            run(run_spot_gazer(stream_sources_list))
     except KeyboardInterrupt:
         pass
     finally:
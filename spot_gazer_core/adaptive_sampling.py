@@ -0,0 +1,81 @@
+import time
+
+from django.utils import timezone
+
+from .configs.settings import (
+    ADAPTIVE_BACKOFF,
+    ADAPTIVE_BUSY_CHANGE_RATE,
+    ADAPTIVE_MAX_RATE_FACTOR,
+    ADAPTIVE_MIN_RATE_FACTOR,
+    ADAPTIVE_NEARLY_FULL_SHARE,
+    ADAPTIVE_QUIET_HOURS,
+    ADAPTIVE_SMOOTHING,
+    ADAPTIVE_STABLE_CHANGE_RATE,
+)
+
+
+class AdaptiveSampler:
+    """Adapt the interval between the samples of a parking lot to the dynamics of its occupancy.
+
+    The interval is a factor of the processing rate of the parking lot, kept between `min_factor` and `max_factor`.
+    A parking lot is busy while its occupancy changes by at least `busy_change_rate` cars per minute (smoothed
+    over the recent samples) or at least `nearly_full_share` of its spots are occupied, and the factor is halved
+    after every sample. At quiet hours, a parking lot that isn't busy is sampled at the longest interval.
+    Otherwise the factor of a stable parking lot (changing by at most `stable_change_rate` cars per minute) grows
+    by `backoff`, and the factor of the rest returns to the processing rate by the same steps.
+    """
+
+    def __init__(
+        self,
+        min_factor: float = ADAPTIVE_MIN_RATE_FACTOR,
+        max_factor: float = ADAPTIVE_MAX_RATE_FACTOR,
+        backoff: float = ADAPTIVE_BACKOFF,
+        stable_change_rate: float = ADAPTIVE_STABLE_CHANGE_RATE,
+        busy_change_rate: float = ADAPTIVE_BUSY_CHANGE_RATE,
+        smoothing: float = ADAPTIVE_SMOOTHING,
+        nearly_full_share: float = ADAPTIVE_NEARLY_FULL_SHARE,
+        quiet_hours: tuple[int, int] | None = ADAPTIVE_QUIET_HOURS,
+    ) -> None:
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.backoff = backoff
+        self.stable_change_rate = stable_change_rate
+        self.busy_change_rate = busy_change_rate
+        self.smoothing = smoothing
+        self.nearly_full_share = nearly_full_share
+        self.quiet_hours = quiet_hours
+        self.factor = 1.0
+        self.change_rate = 0.0  # Cars per minute
+        self._last_sample: tuple[float, int] | None = None  # The time and the occupied spots of the last sample
+
+    def interval(self, processing_rate: float) -> float:
+        return processing_rate * self.factor
+
+    def record(self, occupied_spots: int, total_spots: int | None = None, now: float | None = None) -> None:
+        """Update the interval with the occupancy of the last sample of the parking lot."""
+        now = time.monotonic() if now is None else now
+        if self._last_sample is not None and (elapsed := now - self._last_sample[0]) > 0:
+            change_rate = abs(occupied_spots - self._last_sample[1]) / elapsed * 60
+            self.change_rate += self.smoothing * (change_rate - self.change_rate)
+        self._last_sample = (now, occupied_spots)
+
+        if self.change_rate >= self.busy_change_rate or (
+            total_spots and occupied_spots >= self.nearly_full_share * total_spots
+        ):
+            self.factor = max(self.factor / 2, self.min_factor)
+        elif self.is_quiet_hour():
+            self.factor = self.max_factor
+        elif self.change_rate <= self.stable_change_rate:
+            self.factor = min(self.factor * self.backoff, self.max_factor)
+        elif self.factor > 1:
+            self.factor = max(self.factor / self.backoff, 1.0)
+        else:
+            self.factor = min(self.factor * self.backoff, 1.0)
+
+    def is_quiet_hour(self) -> bool:
+        if self.quiet_hours is None:
+            return False
+        start, end = self.quiet_hours
+        hour = timezone.localtime().hour
+        # The quiet hours may span midnight, e.g. (22, 6)
+        return start <= hour < end if start <= end else hour >= start or hour < end
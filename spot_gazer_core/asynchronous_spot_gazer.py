@@ -1,137 +1,532 @@
 import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Any, Generator
+from typing import Any, Callable
 
 import django
 import numpy as np
-from torch import Tensor
+from asgiref.sync import sync_to_async
 from ultralytics import YOLO
-from ultralytics.yolo.engine.results import Results
-from ultralytics.yolo.utils import SETTINGS, callbacks
-from ultralytics.yolo.v8.detect import DetectionPredictor
 
 from .configs.logging_config import logging
-from .configs.settings import YOLOv8_PREDICTION_PARAMETERS
-from .image_processing import create_mask
+from .adaptive_sampling import AdaptiveSampler
+from .cascade import CascadeHistory
+from .change_detector import ChangeDetector
+from .configs.settings import (
+    ADAPTIVE_SAMPLING,
+    CASCADE_MODEL,
+    CHANGE_DETECTION,
+    DECODING_WORKERS,
+    INFERENCE_EXECUTOR,
+    INFERENCE_WORKERS,
+    METRICS_PORT,
+    STREAM_FAILURE_BUDGET,
+    STREAM_RECONNECT_DELAY,
+    STREAM_RECONNECT_MAX_DELAY,
+    STREAM_SOURCES_RELOAD_INTERVAL,
+    YOLOv8_PREDICTION_PARAMETERS,
+)
+from .frame_grabber import FrameGrabber
+from .inference_batcher import InferenceBatcher
+from .metrics import PipelineMetrics
+from .model_backends import get_model_path
+from .predictor import (
+    FrameContext,
+    Interceptor,
+    create_predictor,
+    detect_cars,
+    detect_cars_in_worker,
+    detect_uncertain_cars,
+    initialize_worker,
+)
+from .scheduler import DeadlineScheduler
+from .stream_health import StreamHealth
 
 django.setup()
 
-from livemap.models import Occupancy, VideoStreamSource  # noqa: E402
+from django.db import DatabaseError  # noqa: E402
 
-SETTINGS.update({"sync": False})  # Prevent sync analytics and crashes with Ultralytics HUB (Google Analytics)
-logger = logging.getLogger(__name__)
+from livemap.models import VideoStreamSource  # noqa: E402
 
+from .occupancy_writer import OccupancyWriter  # noqa: E402
 
-class Interceptor(DetectionPredictor):
-    def __init__(self, **kwargs) -> None:
-        super().__init__(**kwargs)
-        self.parking_zone: Any | None = None
+logger = logging.getLogger(__name__)
 
-    def preprocess(self, image: Tensor | list[np.ndarray]) -> Tensor:
-        if not isinstance(image, Tensor) and self.parking_zone:
-            image[0] = create_mask(image[0], self.parking_zone, False)
-        self.parking_zone = None
-        return super().preprocess(image)
+# Fields of a stream source that a running stream picks up without reconnecting
+RECONFIGURABLE_STREAM_FIELDS = ("processing_rate", "parking_zone", "inference_mode", "total_spots")
 
 
 class SpotGazer(YOLO):
     """Detect parking spot occupancy in concurrent mode.
 
+    The latest frames of all streams are collected by the inference batcher and processed in a single forward pass,
+    after which the number of detected cars is returned to the parking lot each frame belongs to.
+    Every parking lot is sampled once per its processing rate by the deadline scheduler, and its frames are batched
+    ahead of the frames of parking lots with later deadlines.
+    Frames whose parking zone hasn't changed since the last detection reuse its number of cars.
+    In the adaptive sampling mode, the interval between the samples of a parking lot follows the dynamics of its
+    occupancy within bounds around its processing rate.
+    In the cascade mode (`CASCADE_MODEL`), the cars are detected by a small model first, and the frame is passed on
+    to the main model only when the small one is uncertain or deviates from the recent history of the stream.
+
     Args:
         - parking_lots: dictionary list of all video sources. Dictionary fields:
+            - id: int
             - parking_lot_id: int
             - stream_source: str
             - processing_rate: int
+            - total_spots: int (optional, the total spots of the parking lot for adaptive sampling)
             - parking_zone: Optional[list[list[list[list[int]]]]]
+            - inference_mode: str
     """
 
     def __init__(
         self,
         parking_lots: list[list[dict[str, Any]]],
-        model: str | Path = YOLOv8_PREDICTION_PARAMETERS["model"],  # type: ignore[assignment]
+        model: str | Path | None = None,
         task=YOLOv8_PREDICTION_PARAMETERS["task"],
     ) -> None:
+        # The model of the configured inference backend by default
+        model = model or get_model_path()
         super().__init__(model, task)
         # Manual predictor initialization
         self.overrides = YOLOv8_PREDICTION_PARAMETERS
-        self.predictor = Interceptor(overrides=self.overrides, _callbacks=callbacks.get_default_callbacks())
-        self.predictor.setup_model(model=model, verbose=False)
+        self.predictor: Interceptor = create_predictor(model)
+        # Metrics cost nothing but a call per stage unless they are served
+        self.metrics = PipelineMetrics(enabled=METRICS_PORT is not None)
+        # Blocking frame decoding and inference are executed in the worker pools
+        self._decoding_executor = ThreadPoolExecutor(DECODING_WORKERS, thread_name_prefix="decoding")
+        self._inference_executor: Executor
+        if INFERENCE_EXECUTOR == "process":
+            self._inference_executor = ProcessPoolExecutor(
+                INFERENCE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initialize_worker,
+                initargs=(model,),
+            )
+            # The stages of the predictor are timed in the worker processes, so only whole batches are measured
+            self._batcher = InferenceBatcher(
+                detect_cars_in_worker, self._inference_executor, INFERENCE_WORKERS, metrics=self.metrics
+            )
+        else:
+            # The model is not thread-safe, so batches are processed by a single thread
+            self._inference_executor = ThreadPoolExecutor(1, thread_name_prefix="inference")
+            self._batcher = InferenceBatcher(
+                partial(detect_cars, self.predictor, metrics=self.metrics),
+                self._inference_executor,
+                metrics=self.metrics,
+            )
+        # In the cascade mode, frames are passed to the small model first
+        self._cascade_batcher: InferenceBatcher | None = None
+        if CASCADE_MODEL is not None:
+            self._cascade_executor = ThreadPoolExecutor(1, thread_name_prefix="cascade")
+            self._cascade_batcher = InferenceBatcher(
+                partial(detect_uncertain_cars, create_predictor(CASCADE_MODEL)), self._cascade_executor
+            )
+        self._occupancy_writer = OccupancyWriter(pipeline_metrics=self.metrics)
+        # Parking lots are sampled at fixed-rate deadlines of their processing rates
+        self._scheduler = DeadlineScheduler()
+        # Intervals of parking lots follow their occupancy, the samplers are kept by parking lot ids (if enabled)
+        self.adaptive_sampling = ADAPTIVE_SAMPLING
+        self._samplers: dict[int, AdaptiveSampler] = {}
         # Initializing parking lots and gathering detection coroutines
         self.parking_lots = parking_lots
-        self._gathered_tasks = []
+        # Frames of unchanged parking zones are not passed to the model
+        self.change_detection = CHANGE_DETECTION
+        # Reconnection policy of the streams
+        self.stream_failure_budget = STREAM_FAILURE_BUDGET
+        self.stream_reconnect_delay = STREAM_RECONNECT_DELAY
+        self.stream_reconnect_max_delay = STREAM_RECONNECT_MAX_DELAY
+        # Detection tasks and stream sources of the running parking lots by parking lot ids
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._running_parking_lots: dict[int, list[dict[str, Any]]] = {}
+        self._register_metrics()
+
+    @property
+    def running_parking_lots(self) -> set[int]:
+        return set(self._tasks)
+
+    async def start_detection(
+        self,
+        select_parking_lots: Callable[[], list[list[dict[str, Any]]]] | None = None,
+        reload_interval: float = STREAM_SOURCES_RELOAD_INTERVAL,
+    ) -> None:
+        """Start separate asynchronous tasks for each parking lot. One parking lot can have several camera streams
 
-    async def start_detection(self) -> None:
-        """Start separate asynchronous tasks for each parking lot. One parking lot can have several camera streams"""
+        If `select_parking_lots` is passed, the stream sources it returns are reconciled with the running ones
+        every `reload_interval` seconds until the detection is stopped.
+        """
         logger.info(f"Occupancy detection of {len(self.parking_lots)} parking lots has been started!")
-        self._gathered_tasks = await asyncio.gather(
-            *(self._detect_the_parking_lot_occupancy(parking_lot) for parking_lot in self.parking_lots),
-        )
+        for parking_lot in self.parking_lots:
+            self.add_parking_lot(parking_lot)
+        if select_parking_lots is None:
+            await asyncio.gather(*self._tasks.values())
+            return
+        while True:
+            await asyncio.sleep(reload_interval)
+            try:
+                parking_lots = await sync_to_async(select_parking_lots)()
+            except DatabaseError as error:
+                logger.error(f"Failed to reload the stream sources: {error}")
+                continue
+            await self.reconcile(parking_lots)
+
+    def add_parking_lot(self, parking_lot: list[dict[str, Any]]) -> None:
+        """Start the detection of a parking lot while the detection of others is running."""
+        parking_lot_id = parking_lot[0]["parking_lot_id"]
+        if (task := self._tasks.get(parking_lot_id)) is None or task.done():
+            self._running_parking_lots[parking_lot_id] = parking_lot
+            self._tasks[parking_lot_id] = asyncio.create_task(
+                self._detect_the_parking_lot_occupancy(parking_lot), name=f"parking-lot-{parking_lot_id}"
+            )
+
+    async def remove_parking_lot(self, parking_lot_id: int) -> None:
+        """Stop the detection of a parking lot and wait until its streams are closed."""
+        self._running_parking_lots.pop(parking_lot_id, None)
+        if task := self._tasks.pop(parking_lot_id, None):
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self._scheduler.remove(parking_lot_id)
+            self._samplers.pop(parking_lot_id, None)
+            logger.info(f"Detection of parking lot №{parking_lot_id} stopped.")
+
+    async def reconcile(self, parking_lots: list[list[dict[str, Any]]]) -> None:
+        """Make the running parking lots match the passed ones, keeping the model and unchanged streams running.
+
+        Parking lots that are missing are stopped and new ones are started. A parking lot with a new stream
+        (or a stream whose URL has changed) is restarted, while a missing stream is just stopped, and new
+        parking zones, inference modes and processing rates are applied to the running streams in place.
+        Streams deactivated by the detection are kept as they are. Parking lots whose detection has ended are
+        restarted.
+        """
+        desired_parking_lots = {parking_lot[0]["parking_lot_id"]: parking_lot for parking_lot in parking_lots}
+        for parking_lot_id in self.running_parking_lots - desired_parking_lots.keys():
+            await self.remove_parking_lot(parking_lot_id)
+        for parking_lot_id, parking_lot in desired_parking_lots.items():
+            running_parking_lot = self._running_parking_lots.get(parking_lot_id, [])
+            running_streams = {stream["id"]: stream for stream in running_parking_lot if self._is_active(stream)}
+            streams = {stream["id"]: stream for stream in parking_lot}
+            if streams.keys() - running_streams.keys() or any(
+                running_streams[stream_id]["stream_source"] != stream["stream_source"]
+                for stream_id, stream in streams.items()
+            ):
+                if running_parking_lot:
+                    logger.info(f"The streams of parking lot №{parking_lot_id} have changed.")
+                    await self.remove_parking_lot(parking_lot_id)
+                self.add_parking_lot(parking_lot)
+                continue
+            for stream_id in running_streams.keys() - streams.keys():
+                self._remove_stream(running_parking_lot, running_streams[stream_id])
+            for stream_id, stream in streams.items():
+                running_streams[stream_id].update(
+                    {field: stream[field] for field in RECONFIGURABLE_STREAM_FIELDS if field in stream}
+                )
+            if (task := self._tasks[parking_lot_id]).done():
+                if not task.cancelled() and (error := task.exception()) is not None:
+                    logger.error(f"Detection of parking lot №{parking_lot_id} has failed: {error!r}")
+                # Only the passed streams are restarted, not the ones deactivated by the ended detection
+                self.add_parking_lot(parking_lot)
+
+    @staticmethod
+    def _is_active(stream: dict[str, Any]) -> bool:
+        return "health" not in stream or not stream["health"].is_deactivated
 
-    def stop_detection(self) -> None:
-        (task.cancel() for task in self._gathered_tasks)
+    @staticmethod
+    def _remove_stream(parking_lot: list[dict[str, Any]], stream: dict[str, Any]) -> None:
+        """Stop reading a stream of a running parking lot, the detection of the parking lot closes it."""
+        if "health" in stream:
+            stream["health"].is_deactivated = True
+        else:
+            # The detection of the parking lot hasn't started yet
+            parking_lot.remove(stream)
+        logger.info(f"The stream {stream['stream_source']} of parking lot №{stream['parking_lot_id']} was removed.")
+
+    async def stop_detection(self) -> None:
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        self._running_parking_lots.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._scheduler.close()
+        # Save the buffered occupancies before the inference is stopped
+        await self._occupancy_writer.close()
+        await self._batcher.close()
+        if self._cascade_batcher is not None:
+            await self._cascade_batcher.close()
+            self._cascade_executor.shutdown(wait=False, cancel_futures=True)
+        self._decoding_executor.shutdown(wait=False, cancel_futures=True)
+        self._inference_executor.shutdown(wait=False, cancel_futures=True)
         logger.info("Detection stopped!")
 
     @staticmethod
-    async def _deactivate_stream(parking_lot_id: int) -> None:
-        await VideoStreamSource.objects.filter(parking_lot_id=parking_lot_id).aupdate(is_active=False)
-        logger.warning(f"Parking lot {parking_lot_id} is not active anymore.")
+    async def _deactivate_stream(stream: dict[str, Any]) -> None:
+        await VideoStreamSource.objects.filter(id=stream["id"]).aupdate(is_active=False)
+        stream["health"].is_deactivated = True
+        logger.warning(
+            f"The stream {stream['stream_source']} of parking lot №{stream['parking_lot_id']} is not active anymore."
+        )
+
+    @staticmethod
+    def _load_stream(stream: dict[str, Any]) -> None:
+        stream["grabber"] = FrameGrabber(stream["stream_source"], YOLOv8_PREDICTION_PARAMETERS["vid_stride"])
+        stream["grabber"].start()
+
+    @staticmethod
+    def _decode_frame(stream: dict[str, Any]) -> np.ndarray | None:
+        return stream["grabber"].read()
+
+    @staticmethod
+    def _close_stream(stream: dict[str, Any]) -> None:
+        if grabber := stream.pop("grabber", None):
+            # The event loop doesn't wait for a grabber stuck in a hung stream, it ends as soon as the stream does
+            grabber.stop(timeout=0)
+
+    def _register_metrics(self) -> None:
+        self.metrics.describe("frames_processed", "Frames passed to the model by streams.")
+        self.metrics.describe("frames_skipped", "Frames of unchanged parking zones that reused the previous detection.")
+        self.metrics.describe("frames_dropped", "Decoded frames of live streams replaced by newer ones before reading.")
+        self.metrics.describe("stream_failures", "Failures of streams.")
+        self.metrics.describe("stream_reconnections", "Reconnections of streams after failures.")
+        self.metrics.describe("stream_deactivations", "Streams deactivated after they had ended or failed too often.")
+        self.metrics.describe("cascade_frames", "Frames passed to the small model of the cascade by parking lots.")
+        self.metrics.describe(
+            "cascade_escalations", "Frames passed on to the main model by the cascade by parking lots."
+        )
+        self.metrics.describe("batches", "Processed batches of frames.")
+        self.metrics.describe("batched_frames", "Frames in the processed batches.")
+        self.metrics.describe("occupancy_flushes", "Saved buffers of occupancies.")
+        self.metrics.describe("flushed_occupancies", "Occupancies in the saved buffers.")
+        self.metrics.gauge("running_parking_lots", lambda: len(self._tasks), "Parking lots being detected.")
+        self.metrics.gauge(
+            "streams",
+            lambda: {
+                (("status", status),): sum(health["status"] == status for health in self.stream_health().values())
+                for status in ("healthy", "reconnecting", "deactivated")
+            },
+            "Streams of the running parking lots by status.",
+        )
+        self.metrics.gauge("inference_queue_depth", lambda: self._batcher.queue_depth, "Frames waiting for a batch.")
+        self.metrics.gauge(
+            "occupancy_queue_depth", lambda: self._occupancy_writer.queue_depth, "Occupancies waiting to be saved."
+        )
+        if self.adaptive_sampling:
+            self.metrics.gauge(
+                "sample_interval_seconds",
+                lambda: {(("lot", str(lot_id)),): interval for lot_id, interval in self.sample_intervals().items()},
+                "The adaptive intervals between the samples of the parking lots.",
+            )
+        if self._cascade_batcher is not None:
+            self.metrics.gauge(
+                "cascade_escalation_rate",
+                lambda: {
+                    (("lot", str(lot_id)),): statistics["escalation_rate"]
+                    for lot_id, statistics in self.cascade_statistics().items()
+                },
+                "The share of the frames of the parking lots passed on to the main model by the cascade.",
+            )
+        self.metrics.gauge(
+            "missed_deadlines", lambda: self._scheduler.missed_deadlines, "Sample slots missed by the parking lots."
+        )
+        self.metrics.gauge(
+            "max_dispatch_lag_seconds", lambda: self._scheduler.max_dispatch_lag, "The maximum delay of a sample slot."
+        )
+
+    def cascade_statistics(self) -> dict[int, dict[str, int | float]]:
+        """Return the numbers of samples and escalations of the cascade of the running parking lots by their ids."""
+        statistics = {}
+        for parking_lot_id, parking_lot in self._running_parking_lots.items():
+            if histories := [stream["cascade"] for stream in parking_lot if "cascade" in stream]:
+                samples = sum(history.samples for history in histories)
+                escalations = sum(history.escalations for history in histories)
+                statistics[parking_lot_id] = {
+                    "samples": samples,
+                    "escalations": escalations,
+                    "escalation_rate": escalations / samples if samples else 0.0,
+                }
+        return statistics
+
+    def sample_intervals(self) -> dict[int, float]:
+        """Return the adaptive intervals (in seconds) between the samples of the running parking lots by their ids."""
+        intervals = {}
+        for parking_lot_id, sampler in self._samplers.items():
+            if parking_lot := self._running_parking_lots.get(parking_lot_id):
+                # The first active stream leads the parking lot, as in the detection
+                lead_stream = next(filter(self._is_active, parking_lot), parking_lot[0])
+                intervals[parking_lot_id] = sampler.interval(lead_stream["processing_rate"])
+        return intervals
+
+    def scheduler_metrics(self) -> dict[str, int | float]:
+        return self._scheduler.metrics()
+
+    def stream_health(self) -> dict[int, dict[str, Any]]:
+        """Return the health of the streams of the running parking lots by stream ids."""
+        return {
+            stream["id"]: stream["health"].as_dict()
+            for parking_lot in self._running_parking_lots.values()
+            for stream in parking_lot
+            if "health" in stream
+        }
+
+    async def _open_stream(self, stream: dict[str, Any]) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._decoding_executor, self._load_stream, stream)
+        stream["health"].record_connection()
+        if stream["health"].total_failures:
+            self.metrics.increment("stream_reconnections", stream=stream["id"])
+
+    async def _read_frame(self, stream: dict[str, Any]) -> np.ndarray:
+        dropped_frames = stream["grabber"].dropped_frames
+        # Includes the wait for a new frame of the stream
+        with self.metrics.timer("decode", stream=stream["id"]):
+            frame = await asyncio.get_running_loop().run_in_executor(
+                self._decoding_executor, self._decode_frame, stream
+            )
+        self.metrics.increment("frames_dropped", stream["grabber"].dropped_frames - dropped_frames, stream=stream["id"])
+        if frame is None:
+            if stream["grabber"].is_live:
+                raise ConnectionError(f"The stream {stream['stream_source']} has been interrupted.")
+            # A video file or an image has no more frames, which is not worth reconnecting
+            raise EOFError(f"The stream {stream['stream_source']} has ended.")
+        return frame
+
+    async def _handle_stream_failure(self, stream: dict[str, Any], error: BaseException) -> None:
+        self._close_stream(stream)
+        health: StreamHealth = stream["health"]
+        health.record_failure(error)
+        self.metrics.increment("stream_failures", stream=stream["id"])
+        if isinstance(error, EOFError) or health.is_exhausted:
+            logger.error(f"{error} The stream has failed {health.failures} times in a row.")
+            await self._deactivate_stream(stream)
+            self.metrics.increment("stream_deactivations")
+        else:
+            logger.warning(f"{error} Reconnecting in {health.retry_in:.1f} s (failure {health.failures}).")
+
+    async def _connect_streams(self, streams: list[dict[str, Any]]) -> None:
+        """Open the closed streams whose reconnection delay has passed."""
+        due_streams = [stream for stream in streams if "grabber" not in stream and not stream["health"].retry_in]
+        for stream, error in zip(
+            due_streams,
+            await asyncio.gather(*(self._open_stream(stream) for stream in due_streams), return_exceptions=True),
+        ):
+            if isinstance(error, (ConnectionError, OSError)):
+                await self._handle_stream_failure(stream, error)
+            elif isinstance(error, BaseException):
+                raise error
 
     async def _detect_the_parking_lot_occupancy(self, parking_lot: list[dict[str, Any]]) -> None:
-        logger.info(f"Determining the occupancy of parking lot №{(stream := parking_lot[0])['parking_lot_id']}")
+        """Detect the occupancy of a parking lot until all its streams are deactivated.
 
-        if len(parking_lot) == 1:
-            # Set parking zone as a predictor class instance attribute which will be converted to a mask
-            parking_zone = stream["parking_zone"]
-            self.predictor.parking_zone = parking_zone
-            try:
-                results: Generator[None, None, Results] = self.predict(
-                    source=stream["stream_source"], stream=True, **YOLOv8_PREDICTION_PARAMETERS
+        A failed stream is reconnected with a backoff. The occupancy isn't saved while any stream of the parking lot
+        is reconnecting, since the cars of the missing stream would not be counted. A stream that has exhausted
+        its failure budget is deactivated, and the parking lot continues with the rest of streams.
+        """
+        parking_lot_id = parking_lot[0]["parking_lot_id"]
+        logger.info(f"Determining the occupancy of parking lot №{parking_lot_id}")
+        for stream in parking_lot:
+            stream["health"] = StreamHealth(
+                self.stream_failure_budget, self.stream_reconnect_delay, self.stream_reconnect_max_delay
+            )
+            stream["change_detector"] = ChangeDetector()
+            if self._cascade_batcher is not None:
+                stream["cascade"] = CascadeHistory()
+        streams = list(parking_lot)
+        sampler = self._samplers.setdefault(parking_lot_id, AdaptiveSampler()) if self.adaptive_sampling else None
+
+        try:
+            # Continuously process frames from the video streams
+            while streams := [stream for stream in streams if not stream["health"].is_deactivated]:
+                # Streams deactivated by the reconciliation are still open
+                for stream in parking_lot:
+                    if stream["health"].is_deactivated:
+                        self._close_stream(stream)
+                # The processing rate and the total spots of the parking lot are read from its first active stream,
+                # since deactivated streams aren't reconfigured anymore
+                lead_stream = streams[0]
+                await self._connect_streams(streams)
+                if closed_streams := [stream for stream in streams if "grabber" not in stream]:
+                    if not any(stream["health"].is_deactivated for stream in closed_streams):
+                        await asyncio.sleep(min(stream["health"].retry_in for stream in closed_streams))
+                    continue
+
+                # Wait for the next slot of the parking lot, its frames must be processed before the following one
+                processing_rate = lead_stream["processing_rate"]
+                interval = processing_rate if sampler is None else sampler.interval(processing_rate)
+                with self.metrics.timer("wait", lot=parking_lot_id):
+                    deadline = await self._scheduler.wait(parking_lot_id, interval)
+                # Frames of all streams of the parking lot are decoded concurrently
+                frames = await asyncio.gather(*(self._read_frame(stream) for stream in streams), return_exceptions=True)
+                if broken_streams := [
+                    (stream, frame)
+                    for stream, frame in zip(streams, frames)
+                    if isinstance(frame, (ConnectionError, OSError, EOFError))
+                ]:
+                    for stream, error in broken_streams:
+                        await self._handle_stream_failure(stream, error)
+                    continue
+                if errors := [frame for frame in frames if isinstance(frame, BaseException)]:
+                    raise errors[0]
+                for stream in streams:
+                    stream["health"].record_success()
+                # The changed frames of all streams of the parking lot get into the same batch
+                detected_cars = await asyncio.gather(
+                    *(self._detect_cars(frame, stream, deadline) for frame, stream in zip(frames, streams))
                 )
-                for result in results:
-                    self.predictor.parking_zone = parking_zone
-                    await self._save_occupancy(stream["parking_lot_id"], len(result))  # type: ignore[arg-type]
-
-                    # Sleep for the specified processing rate before processing the next frame
-                    await asyncio.sleep(stream["processing_rate"])
-            except (ConnectionError, OSError) as error:
-                logger.error(error)
-            await self._deactivate_stream(stream["parking_lot_id"])
-        else:
-            active_streams = []
+                with self.metrics.timer("save", lot=parking_lot_id):
+                    await self._save_occupancy(parking_lot_id, sum(detected_cars))
+                if sampler is not None:
+                    sampler.record(sum(detected_cars), lead_stream.get("total_spots"))
+        finally:
             for stream in parking_lot:
-                try:
-                    # Initialize predictor
-                    stream["prediction"] = self.predict(
-                        source=stream["stream_source"], stream=True, **YOLOv8_PREDICTION_PARAMETERS
-                    )
-                except OSError:
-                    await self._deactivate_stream(stream["parking_lot_id"])
-                    continue
-                active_streams.append(stream)
+                self._close_stream(stream)
+            await self._occupancy_writer.flush()
 
-            # Continuously process frames from the video streams
-            while True:
-                detected_cars = count = 0
-                stream_count = len(active_streams)
-                for stream in active_streams:
-                    self.predictor.parking_zone = stream["parking_zone"]
-                    try:
-                        detected_cars += len(next(stream["prediction"]))
-                    except (StopIteration, ConnectionError):
-                        await self._deactivate_stream(stream["parking_lot_id"])
-                        active_streams.remove(stream)
-                        break
-                    count += 1
-                    if stream_count == count:
-                        await self._save_occupancy(stream["parking_lot_id"], detected_cars)
-                        detected_cars = count = 0
-
-                        # Sleep for the specified processing rate before processing the next frame
-                        await asyncio.sleep(stream["processing_rate"])
-                if not stream_count:
-                    break
+    async def _detect_cars(self, frame: np.ndarray, stream: dict[str, Any], deadline: float) -> int:
+        """Detect the cars on the frame, unless its parking zone hasn't changed since the last detection."""
+        context = FrameContext(stream["id"], stream["parking_zone"], stream["inference_mode"])
+        change_detector: ChangeDetector = stream["change_detector"]
+        if self.change_detection:
+            with self.metrics.timer("change_detection", stream=stream["id"]):
+                detected_cars = await asyncio.get_running_loop().run_in_executor(
+                    self._decoding_executor, self._check_change, change_detector, frame, context
+                )
+            if detected_cars is not None:
+                self.metrics.increment("frames_skipped", stream=stream["id"])
+                return detected_cars
+        self.metrics.increment("frames_processed", stream=stream["id"])
+        if self._cascade_batcher is not None:
+            detected_cars = await self._detect_cars_by_cascade(frame, stream, context, deadline)
+        else:
+            detected_cars = await self._batcher.detect(frame, context, deadline)
+        change_detector.record(detected_cars)
+        return detected_cars
 
-    @staticmethod
-    async def _save_occupancy(parking_lot_id: int, occupied_spots: int) -> None:
-        await Occupancy.objects.acreate(parking_lot_id=parking_lot_id, occupied_spots=occupied_spots)
+    async def _detect_cars_by_cascade(
+        self, frame: np.ndarray, stream: dict[str, Any], context: FrameContext, deadline: float
+    ) -> int:
+        """Detect the cars by the small model, passing the frame on to the main model if the small one is unsure."""
+        history: CascadeHistory = stream["cascade"]
+        with self.metrics.timer("cascade", lot=stream["parking_lot_id"]):
+            cars, uncertain_cars = await self._cascade_batcher.detect(  # type: ignore[union-attr]
+                frame, context, deadline
+            )
+        self.metrics.increment("cascade_frames", lot=stream["parking_lot_id"])
+        if not history.should_escalate(cars, uncertain_cars):
+            history.record(cars)
+            return history.estimate(cars)
+        self.metrics.increment("cascade_escalations", lot=stream["parking_lot_id"])
+        # The frame is masked in place by the small model, which doesn't change the result of the main one
+        detected_cars = await self._batcher.detect(frame, context, deadline)
+        history.record(cars, detected_cars)
+        return detected_cars
+
+    def _check_change(self, change_detector: ChangeDetector, frame: np.ndarray, context: FrameContext) -> int | None:
+        zone_mask = None
+        if context.parking_zone:
+            zone_mask = self.predictor.mask_cache.get(context.stream_id, frame.shape, context.parking_zone).mask
+        return change_detector.check(frame, zone_mask, context)
+
+    async def _save_occupancy(self, parking_lot_id: int, occupied_spots: int) -> None:
+        await self._occupancy_writer.add(parking_lot_id, occupied_spots)
         logger.debug(f"Parking lot: {parking_lot_id}; occupied spots: {occupied_spots}.")
@@ -0,0 +1,63 @@
+from collections import deque
+from statistics import median
+
+from .configs.settings import (
+    CASCADE_COUNT_TOLERANCE,
+    CASCADE_HISTORY_SIZE,
+    CASCADE_MAX_UNCERTAIN_SHARE,
+    CASCADE_REFRESH_SAMPLES,
+)
+
+
+class CascadeHistory:
+    """Decide whether the number of cars detected on a frame of a stream by the small model can be trusted.
+
+    The main model is run (the detection is escalated) if the small model is uncertain about more than
+    `max_uncertain_share` of the cars, or if its number of cars deviates from the median of its recent
+    `history_size` numbers by more than `count_tolerance` of the median (but at least one car). The history
+    is of the small model, so a constant bias of the small model doesn't cause escalations; instead, the
+    difference between the models at the last escalation is added to the numbers of the small model.
+    The main model is also run while the history is short and at least every `refresh_samples` samples.
+    """
+
+    def __init__(
+        self,
+        history_size: int = CASCADE_HISTORY_SIZE,
+        count_tolerance: float = CASCADE_COUNT_TOLERANCE,
+        max_uncertain_share: float = CASCADE_MAX_UNCERTAIN_SHARE,
+        refresh_samples: int = CASCADE_REFRESH_SAMPLES,
+    ) -> None:
+        self.count_tolerance = count_tolerance
+        self.max_uncertain_share = max_uncertain_share
+        self.refresh_samples = refresh_samples
+        self._counts: deque[int] = deque(maxlen=history_size)
+        self._bias = 0  # The difference between the main and the small model at the last escalation
+        self._since_escalation = 0
+        self.samples = self.escalations = 0
+
+    @property
+    def escalation_rate(self) -> float:
+        return self.escalations / self.samples if self.samples else 0.0
+
+    def should_escalate(self, cars: int, uncertain_cars: int) -> bool:
+        if not self.escalations or len(self._counts) < 3 or self._since_escalation >= self.refresh_samples:
+            return True
+        if uncertain_cars > self.max_uncertain_share * max(cars, 1):
+            return True
+        recent_cars = median(self._counts)
+        return abs(cars - recent_cars) > max(1.0, self.count_tolerance * recent_cars)
+
+    def estimate(self, cars: int) -> int:
+        """Return the number of cars the main model would detect, given the number detected by the small model."""
+        return max(cars + self._bias, 0)
+
+    def record(self, cars: int, escalated_cars: int | None = None) -> None:
+        """Add the number of cars detected by the small model and, if escalated, by the main model."""
+        self.samples += 1
+        self._counts.append(cars)
+        if escalated_cars is None:
+            self._since_escalation += 1
+            return
+        self.escalations += 1
+        self._since_escalation = 0
+        self._bias = escalated_cars - cars
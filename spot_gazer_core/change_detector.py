@@ -0,0 +1,78 @@
+import time
+from typing import Any
+
+import cv2
+import numpy as np
+
+from .configs.settings import (
+    CHANGE_DETECTION_WIDTH,
+    CHANGE_PIXEL_THRESHOLD,
+    CHANGE_REFRESH_INTERVAL,
+    CHANGE_THRESHOLD,
+)
+
+
+class ChangeDetector:
+    """Tell whether the parking zone of a stream has changed since the frame its cars were last detected on.
+
+    Frames are compared downscaled to `width` pixels and in grayscale, blurred against the noise of the camera.
+    A pixel has changed if its brightness differs by more than `pixel_threshold`, and the scene has changed if
+    more than `threshold` of the pixels of the parking zone have. Frames are compared with the frame of the last
+    detection rather than the previous one, so slow changes add up. The cars are detected again at least every
+    `refresh_interval` seconds and whenever the context of the stream (e.g. its parking zone) changes.
+    """
+
+    def __init__(
+        self,
+        threshold: float = CHANGE_THRESHOLD,
+        pixel_threshold: int = CHANGE_PIXEL_THRESHOLD,
+        refresh_interval: float = CHANGE_REFRESH_INTERVAL,
+        width: int = CHANGE_DETECTION_WIDTH,
+    ) -> None:
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.refresh_interval = refresh_interval
+        self.width = width
+        self.detected_cars: int | None = None
+        self._reference: np.ndarray | None = None  # The scene of the last detection
+        self._detected_at = 0.0
+        self._context: Any = None
+        self._scene: np.ndarray | None = None  # The scene of the last checked frame
+        self._mask: np.ndarray | None = None  # The downscaled mask of the parking zone
+        self._zone_mask: np.ndarray | None = None  # The mask `_mask` is downscaled from
+
+    def check(self, frame: np.ndarray, zone_mask: np.ndarray | None = None, context: Any = None) -> int | None:
+        """Return the number of cars of the last detection if the scene hasn't changed since then, otherwise None.
+
+        The zone mask is the mask of the parking zone of the frame (see `ZoneMaskCache`), None for the whole frame.
+        """
+        self._scene = self._downscale(frame)
+        if zone_mask is not self._zone_mask:
+            self._zone_mask = zone_mask
+            self._mask = None if zone_mask is None else self._downscale(zone_mask, cv2.INTER_NEAREST) > 0
+        has_reference = self._reference is not None and self._reference.shape == self._scene.shape
+        is_expired = time.monotonic() - self._detected_at >= self.refresh_interval
+        if self.detected_cars is None or not has_reference or context != self._context or is_expired:
+            self._context = context
+            return None
+        changed_pixels = cv2.absdiff(self._scene, self._reference) > self.pixel_threshold
+        if self._mask is not None:
+            changed_share = np.count_nonzero(changed_pixels & self._mask) / max(np.count_nonzero(self._mask), 1)
+        else:
+            changed_share = np.count_nonzero(changed_pixels) / changed_pixels.size
+        return None if changed_share > self.threshold else self.detected_cars
+
+    def record(self, detected_cars: int) -> None:
+        """Remember the number of cars detected on the last checked frame."""
+        self.detected_cars = detected_cars
+        self._reference = self._scene
+        self._detected_at = time.monotonic()
+
+    def _downscale(self, image: np.ndarray, interpolation: int = cv2.INTER_AREA) -> np.ndarray:
+        height, width = image.shape[:2]
+        size = (self.width, max(round(height * self.width / width), 1))
+        small = cv2.resize(image, size, interpolation=interpolation)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            small = cv2.GaussianBlur(small, (5, 5), 0)
+        return small
@@ -10,7 +10,7 @@ YOLOv8_PREDICTION_PARAMETERS = {
     "model": "spot_gazer_core/yolov8m_spot_gazer.pt",
     "data": "/content/datasets/parking_dataset/data.yaml",
     "task": "detect",
-    "half": True,
+    "half": True,  # Used only on GPU, CPU inference is sped up by the exported backends instead.
     "conf": CONFIDENCE,
     "iou": IOU,
     "imgsz": 640,
@@ -21,6 +21,93 @@ YOLOv8_PREDICTION_PARAMETERS = {
     "vid_stride": 10,
 }
 
+# The format of the model used for inference. The exported formats are several times faster on CPU, export them
+# from the PyTorch weights by `python manage.py export_model <backend>`.
+# Supported values: "pytorch", "torchscript", "onnx", "onnx-int8" (ONNX quantized to INT8), "openvino".
+INFERENCE_BACKEND = "pytorch"
+# The maximum difference between the numbers of cars detected by an exported and the PyTorch model,
+# as a share of the latter (but at least one car).
+MODEL_ACCURACY_TOLERANCE = 0.1
+
+# Cascade mode: a small model trained on the same classes detects the cars first, and the main model is run only
+# if the small one is uncertain or its number of cars deviates from the recent history of the stream.
+# The weights of the small model, e.g. "spot_gazer_core/yolov8n_spot_gazer.pt". None disables the cascade.
+CASCADE_MODEL: str | None = None
+CASCADE_UNCERTAIN_CONFIDENCE = 0.4  # Cars detected by the small model with a lower confidence are uncertain.
+CASCADE_MAX_UNCERTAIN_SHARE = 0.2  # The maximum share of uncertain cars the small model is trusted with.
+CASCADE_HISTORY_SIZE = 20  # The number of the recent numbers of cars of a stream the small model is compared with.
+# The maximum deviation from the median of the history, as a share of it (but at least one car).
+CASCADE_COUNT_TOLERANCE = 0.1
+CASCADE_REFRESH_SAMPLES = 30  # The main model is run at least once in this number of samples.
+
+# Frames of all active streams are collected into batches and processed in a single forward pass.
+INFERENCE_BATCH_SIZE = 16  # The maximum number of frames in one batch.
+INFERENCE_BATCH_TIMEOUT = 0.05  # The maximum time (in seconds) a frame waits for the batch to fill up.
+
+# Frame decoding and model inference are executed in worker pools to keep the event loop responsive.
+DECODING_WORKERS = 8  # The number of threads that open the video streams and decode their frames.
+# Supported values: "thread" (the model of SpotGazer is used by a single thread),
+# "process" (each worker process loads its own copy of the model).
+INFERENCE_EXECUTOR = "thread"
+INFERENCE_WORKERS = 1  # The number of inference worker processes. Used only by the "process" executor.
+
+# Every stream is drained by its own frame grabber thread, which keeps only the newest frame.
+FRAME_BUFFER_SIZE = 3  # The number of preallocated frame buffers per stream (at least 3).
+FRAME_READ_TIMEOUT = 30  # The time (in seconds) to wait for a new frame before the stream is considered lost.
+
+# A failed stream is reconnected with an exponential backoff: the delay doubles after every failure in a row.
+STREAM_RECONNECT_DELAY = 1  # The delay (in seconds) after the first failure.
+STREAM_RECONNECT_MAX_DELAY = 5 * 60  # The maximum delay (in seconds).
+# The number of failures in a row (about an hour of reconnections) after which the stream is deactivated.
+STREAM_FAILURE_BUDGET = 20
+
+MASK_CACHE_SIZE = 1024  # The maximum number of parking zone masks kept in memory.
+
+# Frames whose parking zone hasn't changed since the last detection reuse its number of cars
+# instead of running the model, so the inference load follows the activity on the parking lots.
+CHANGE_DETECTION = False
+CHANGE_DETECTION_WIDTH = 160  # The width (in pixels) of the downscaled grayscale frames that are compared.
+CHANGE_PIXEL_THRESHOLD = 25  # The minimum difference of the brightness (0-255) of a changed pixel.
+CHANGE_THRESHOLD = 0.01  # The share of changed pixels of the parking zone above which the cars are detected again.
+CHANGE_REFRESH_INTERVAL = 10 * 60  # The maximum time (in seconds) a number of cars is reused for.
+
+# Adaptive sampling: the processing rate of a parking lot is the nominal interval between its samples, which is
+# shortened while its occupancy changes quickly or it is nearly full, and lengthened while it is stable.
+ADAPTIVE_SAMPLING = False
+ADAPTIVE_MIN_RATE_FACTOR = 0.25  # The shortest interval as a share of the processing rate.
+ADAPTIVE_MAX_RATE_FACTOR = 4.0  # The longest interval as a multiple of the processing rate.
+ADAPTIVE_BACKOFF = 1.5  # The factor the interval of a stable parking lot grows by after every sample.
+# The thresholds of the smoothed change of the occupancy (in cars per minute) of stable and busy parking lots.
+ADAPTIVE_STABLE_CHANGE_RATE = 0.2
+ADAPTIVE_BUSY_CHANGE_RATE = 2.0
+ADAPTIVE_SMOOTHING = 0.3  # The weight of the last sample in the smoothed change of the occupancy.
+ADAPTIVE_NEARLY_FULL_SHARE = 0.9  # A parking lot with this share of its spots occupied is sampled as a busy one.
+# Hours [start, end) of the local time (`TIME_ZONE` of Django) when parking lots that aren't busy are sampled
+# at the longest interval. None disables quiet hours.
+ADAPTIVE_QUIET_HOURS: tuple[int, int] | None = (1, 5)
+
+# Detected occupancies are buffered and saved to the database in bulk.
+OCCUPANCY_BUFFER_SIZE = 500  # The number of buffered occupancies that triggers saving.
+OCCUPANCY_FLUSH_INTERVAL = 5  # The maximum time (in seconds) an occupancy stays in the buffer.
+# Supported values: "all" (every detected occupancy is saved),
+# "changes" (an occupancy is saved only if it differs from the previous one or the heartbeat interval has passed).
+OCCUPANCY_STORAGE_MODE = "all"
+OCCUPANCY_HEARTBEAT = 15 * 60  # The maximum time (in seconds) between saved occupancies of a parking lot.
+
+# Changes of the stream sources in the database are applied to the running detection without restarting it.
+STREAM_SOURCES_RELOAD_INTERVAL = 30  # In seconds.
+
+# Sharded runner mode: every worker detects the parking lots assigned to it by consistent hashing over live workers.
+DETECTION_WORKER_HEARTBEAT = 10  # The interval (in seconds) between heartbeats and rebalancing of a worker.
+DETECTION_WORKER_LEASE = 30  # A worker without heartbeats for this time (in seconds) is dead and loses its shard.
+HASH_RING_REPLICAS = 100  # The number of points of every worker on the hash ring.
+
+# Timings of the pipeline stages, counters and gauges of the detector are served in the Prometheus text format
+# at http://<METRICS_HOST>:<METRICS_PORT>/metrics. Sharded workers serve them at the following ports, one per worker.
+METRICS_PORT: int | None = None  # None disables the metrics.
+METRICS_HOST = "127.0.0.1"
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Histogram buckets in seconds.
+
 # Set separate global logging level for console and file.
 # Supported values: DEBUG, INFO, WARNING, ERROR, CRITICAL.
 CONSOLE_LOG_LEVEL = "DEBUG"
@@ -0,0 +1,139 @@
+from pathlib import Path
+from threading import Condition, Event, Thread
+
+import cv2
+import numpy as np
+from ultralytics.yolo.data.utils import IMG_FORMATS
+
+from .configs.logging_config import logging
+from .configs.settings import FRAME_BUFFER_SIZE, FRAME_READ_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class FrameGrabber(Thread):
+    """Continuously drain a video stream in a background thread, keeping only the newest frame.
+
+    Every `vid_stride`-th frame is decoded into one of the preallocated buffers of a ring, so the memory used by
+    a camera doesn't depend on how long it waits between reads. Live streams (URLs and webcams) are read as fast as
+    the camera sends frames, and older unread frames are overwritten. Local files are not live, so their frames
+    are decoded one by one, as soon as the previous frame has been read. Images are streams of a single frame.
+
+    The frame returned by `read` is a view on its buffer. The grabber doesn't write to the buffer until the next
+    `read` call, and the buffer is never handed out again, so the reader may modify the frame in place
+    (the predictor masks it).
+    """
+
+    def __init__(
+        self,
+        source: str | int,
+        vid_stride: int = 1,
+        buffer_size: int = FRAME_BUFFER_SIZE,
+        read_timeout: float = FRAME_READ_TIMEOUT,
+    ) -> None:
+        super().__init__(name=f"grabber-{source}", daemon=True)
+        self.source = source
+        self.vid_stride = max(vid_stride, 1)
+        self.read_timeout = read_timeout
+        self.is_live = not (path := Path(str(source))).is_file()
+        self._capture: cv2.VideoCapture | None = None
+        if not self.is_live and path.suffix[1:].lower() in IMG_FORMATS:
+            frame = cv2.imread(str(path))
+        else:
+            self._capture = cv2.VideoCapture(int(source) if str(source).isnumeric() else source)
+            if not self._capture.isOpened():
+                raise ConnectionError(f"Failed to open {source}")
+            _, frame = self._capture.read()  # Guarantee the first frame and find out the frame shape
+        if frame is None:
+            if self._capture is not None:
+                self._capture.release()
+            raise ConnectionError(f"Failed to read images from {source}")
+
+        # One buffer is being read, one holds the newest frame and at least one is being decoded into
+        self._buffers = np.empty((max(buffer_size, 3), *frame.shape), dtype=frame.dtype)
+        self._buffers[0] = frame
+        self._latest: int | None = 0  # Buffer index of the newest frame
+        self._leased: int | None = None  # Buffer index of the frame handed out by the last `read`
+        self._frame_number, self._read_frame_number = 1, 0
+        self.dropped_frames = 0  # Decoded frames overwritten before they were read
+        self._is_ended = False
+        self._stop_event = Event()
+        self._new_frame = Condition()
+
+    def read(self) -> np.ndarray | None:
+        """Wait for a frame newer than the previously read one and return a view on it.
+
+        `None` is returned if the stream has ended or the grabber has been stopped.
+        """
+        with self._new_frame:
+            if not self._new_frame.wait_for(
+                lambda: self._frame_number > self._read_frame_number or self._is_ended or self._stop_event.is_set(),
+                self.read_timeout,
+            ):
+                raise ConnectionError(f"No frames have been received from {self.source} in {self.read_timeout} s.")
+            if self._frame_number == self._read_frame_number:
+                return None
+            self.dropped_frames += self._frame_number - self._read_frame_number - 1
+            self._leased, self._read_frame_number = self._latest, self._frame_number
+            # Not live streams decode the next frame only after the previous one has been read
+            self._new_frame.notify_all()
+            return self._buffers[self._leased]
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop the grabber and wait up to `timeout` seconds for its thread to end.
+
+        A started thread releases the capture itself, since it may be stuck in grabbing a frame of a hung stream.
+        """
+        self._stop_event.set()
+        with self._new_frame:
+            self._new_frame.notify_all()
+        if self.ident is None:
+            # The thread has never been started
+            if self._capture is not None:
+                self._capture.release()
+        elif self.is_alive():
+            self.join(timeout)
+
+    def run(self) -> None:
+        try:
+            self._grab_frames()
+        finally:
+            if self._capture is not None:
+                self._capture.release()
+
+    def _grab_frames(self) -> None:
+        grabbed_frames = 0
+        while self._capture is not None and not self._stop_event.is_set():
+            if not self.is_live:
+                with self._new_frame:
+                    self._new_frame.wait_for(
+                        lambda: self._read_frame_number == self._frame_number or self._stop_event.is_set()
+                    )
+            if not self._capture.grab():
+                break
+            if (grabbed_frames := grabbed_frames + 1) % self.vid_stride:
+                continue  # Skip the frame without decoding it
+
+            with self._new_frame:
+                index = next(i for i in range(len(self._buffers)) if i not in {self._latest, self._leased})
+            success, frame = self._capture.retrieve(self._buffers[index])
+            if not success:
+                break
+            buffers = self._buffers
+            if frame.shape != buffers.shape[1:]:
+                # The stream resolution has changed. The leased frame remains valid as a view on the old buffers
+                buffers = np.empty((len(buffers), *frame.shape), dtype=frame.dtype)
+                buffers[index] = frame
+            with self._new_frame:
+                # The new buffers are published together with the frame in them
+                if buffers is not self._buffers:
+                    self._buffers, self._leased = buffers, None
+                self._latest = index
+                self._frame_number += 1
+                self._new_frame.notify_all()
+
+        with self._new_frame:
+            self._is_ended = True
+            self._new_frame.notify_all()
+        if self.is_live and not self._stop_event.is_set():
+            logger.warning(f"The stream {self.source} has ended.")
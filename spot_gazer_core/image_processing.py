@@ -1,6 +1,13 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple
+
 import cv2
 import numpy as np
 
+from .configs.settings import MASK_CACHE_SIZE
+
 
 def create_mask(frame: np.ndarray, figure_coords: list[list], mask_only: bool = True) -> np.ndarray:
     """
@@ -18,3 +25,85 @@ def create_mask(frame: np.ndarray, figure_coords: list[list], mask_only: bool =
     if mask_only:
         return mask
     return cv2.bitwise_and(frame, mask)  # Glue the mask and the original image
+
+
+def create_zone_mask(frame_shape: tuple[int, ...], figure_coords: list[list]) -> np.ndarray:
+    """Create a single-channel mask of the figure for frames of the passed shape."""
+    mask = np.zeros(frame_shape[:2], np.uint8)
+    cv2.fillPoly(mask, pts=[np.array(coord, np.int32) for coord in figure_coords], color=255)
+    return mask
+
+
+def find_zone_boxes(frame_shape: tuple[int, ...], figure_coords: list[list]) -> list[tuple[int, int, int, int]]:
+    """Find the bounding boxes (x1, y1, x2, y2) of every part of the figure. Overlapping boxes are merged."""
+    height, width = frame_shape[:2]
+    boxes = []
+    for coord in figure_coords:
+        x, y, box_width, box_height = cv2.boundingRect(np.array(coord, np.int32))
+        x1, y1, x2, y2 = max(x, 0), max(y, 0), min(x + box_width, width), min(y + box_height, height)
+        if x1 < x2 and y1 < y2:  # Skip the parts outside the frame
+            boxes.append((x1, y1, x2, y2))
+
+    merged_boxes: list[tuple[int, int, int, int]] = []
+    while boxes:
+        x1, y1, x2, y2 = boxes.pop()
+        for index, (other_x1, other_y1, other_x2, other_y2) in enumerate(merged_boxes):
+            if x1 < other_x2 and other_x1 < x2 and y1 < other_y2 and other_y1 < y2:
+                # The union of overlapping boxes can overlap other boxes, so it is checked once again
+                del merged_boxes[index]
+                boxes.append((min(x1, other_x1), min(y1, other_y1), max(x2, other_x2), max(y2, other_y2)))
+                break
+        else:
+            merged_boxes.append((x1, y1, x2, y2))
+    return merged_boxes
+
+
+def apply_mask(frame: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Black out the frame around the mask in place."""
+    return np.bitwise_and(frame, mask[..., np.newaxis] if frame.ndim == 3 else mask, out=frame)
+
+
+class ZoneMask(NamedTuple):
+    mask: np.ndarray
+    bounding_box: tuple[int, int, int, int]  # The box (x1, y1, x2, y2) around the whole zone
+    tiles: list[tuple[int, int, int, int]]  # Non-overlapping boxes around the parts of the zone
+
+
+class ZoneMaskCache:
+    """Build the mask of every parking zone only once.
+
+    Masks are keyed by the stream id, the frame shape and the hash of the zone coordinates,
+    so editing the parking zone of a stream replaces its mask with a new one.
+    The cache can be shared by threads processing different batches.
+    """
+
+    def __init__(self, max_size: int = MASK_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._masks: OrderedDict[tuple[Hashable, tuple[int, ...], int], ZoneMask] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, stream_id: Hashable, frame_shape: tuple[int, ...], parking_zone: Any) -> ZoneMask:
+        key = (stream_id, frame_shape[:2], hash(json.dumps(parking_zone)))
+        with self._lock:
+            if (zone_mask := self._masks.get(key)) is not None:
+                self._masks.move_to_end(key)
+                return zone_mask
+            # Masks of the previous frame shape or zone of the stream are not needed anymore
+            self.invalidate(stream_id)
+            tiles = find_zone_boxes(frame_shape, parking_zone)
+            x1, y1, x2, y2 = zip(*tiles) if tiles else ((0,), (0,), (0,), (0,))
+            bounding_box = (min(x1), min(y1), max(x2), max(y2))
+            zone_mask = self._masks[key] = ZoneMask(create_zone_mask(frame_shape, parking_zone), bounding_box, tiles)
+            if len(self._masks) > self.max_size:
+                self._masks.popitem(last=False)
+            return zone_mask
+
+    def invalidate(self, stream_id: Hashable) -> None:
+        """Drop the masks of the stream."""
+        with self._lock:
+            for key in [key for key in self._masks if key[0] == stream_id]:
+                del self._masks[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._masks.clear()
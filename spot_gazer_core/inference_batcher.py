@@ -0,0 +1,134 @@
+import asyncio
+import itertools
+import math
+from concurrent.futures import Executor
+from typing import Any, Callable, NamedTuple
+
+import numpy as np
+
+from .configs.logging_config import logging
+from .configs.settings import INFERENCE_BATCH_SIZE, INFERENCE_BATCH_TIMEOUT
+from .metrics import PipelineMetrics
+
+logger = logging.getLogger(__name__)
+
+BatchPredictor = Callable[[list[np.ndarray], list[Any]], list[int]]
+
+
+class QueuedFrame(NamedTuple):
+    deadline: float
+    order: int  # Unique, so frames are never compared
+    frame: np.ndarray
+    context: Any
+    future: asyncio.Future[int]
+
+
+class InferenceBatcher:
+    """Collect frames of different streams and detect cars on all of them in a single forward pass.
+
+    Frames are batched in the order of their deadlines (earliest first), then in the order of arrival,
+    so frames of parking lots that are due sooner don't wait behind the others when the model is overloaded.
+
+    Args:
+        - predict_batch: callable that takes a list of frames and a list of their contexts (e.g. parking zones)
+            and returns the number of detected cars on each frame.
+        - executor: pool the `predict_batch` is executed in. Defaults to the executor of the event loop.
+        - max_concurrency: the maximum number of batches processed simultaneously (the number of executor workers).
+        - max_batch_size: the maximum number of frames in one batch.
+        - max_wait: the maximum time (in seconds) the first frame of a batch waits for the rest of frames.
+        - metrics: pipeline metrics the durations of batches and their sizes are recorded to.
+    """
+
+    def __init__(
+        self,
+        predict_batch: BatchPredictor,
+        executor: Executor | None = None,
+        max_concurrency: int = 1,
+        max_batch_size: int = INFERENCE_BATCH_SIZE,
+        max_wait: float = INFERENCE_BATCH_TIMEOUT,
+        metrics: PipelineMetrics | None = None,
+    ) -> None:
+        self._predict_batch = predict_batch
+        self._executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: asyncio.PriorityQueue[QueuedFrame] = asyncio.PriorityQueue()
+        self._counter = itertools.count()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._worker: asyncio.Task | None = None
+        self._running_batches: set[asyncio.Task] = set()
+        self.metrics = metrics or PipelineMetrics(enabled=False)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def detect(self, frame: np.ndarray, context: Any, deadline: float = math.inf) -> int:
+        """Queue the frame for the next batch and wait for the number of detected cars on it."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._process_batches())
+        future: asyncio.Future[int] = asyncio.get_running_loop().create_future()
+        await self._queue.put(QueuedFrame(deadline, next(self._counter), frame, context, future))
+        return await future
+
+    async def close(self) -> None:
+        tasks = [*self._running_batches, *([self._worker] if self._worker else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+        # Release coroutines that still wait for their frames
+        while not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
+
+    async def _collect_batch(self) -> list[QueuedFrame]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            if (timeout := deadline - loop.time()) <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _process_batches(self) -> None:
+        while True:
+            # Frames keep gathering in the queue while all workers are busy
+            await self._slots.acquire()
+            batch = await self._collect_batch()
+            task = asyncio.create_task(self._process_batch(batch))
+            self._running_batches.add(task)
+            task.add_done_callback(self._running_batches.discard)
+
+    async def _process_batch(self, batch: list[QueuedFrame]) -> None:
+        try:
+            if not (batch := [item for item in batch if not item.future.done()]):
+                return
+            frames = [item.frame for item in batch]
+            contexts = [item.context for item in batch]
+            futures = [item.future for item in batch]
+            try:
+                with self.metrics.timer("batch"):
+                    detected_cars = await asyncio.get_running_loop().run_in_executor(
+                        self._executor, self._predict_batch, frames, contexts
+                    )
+            except Exception as error:
+                logger.error(f"Batch inference of {len(frames)} frames failed: {error}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+            logger.debug(f"Processed a batch of {len(frames)} frames.")
+            self.metrics.increment("batches")
+            self.metrics.increment("batched_frames", len(frames))
+            for future, cars in zip(futures, detected_cars):
+                if not future.done():
+                    future.set_result(cars)
+        finally:
+            self._slots.release()
@@ -0,0 +1,172 @@
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, ContextManager, Iterator
+
+from .configs.logging_config import logging
+from .configs.settings import METRICS_BUCKETS, METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+Labels = tuple[tuple[str, str], ...]
+# A gauge callback returns the value, or the values by labels
+GaugeCallback = Callable[[], float | dict[Labels, float]]
+
+
+def _labels(**labels: object) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = METRICS_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class PipelineMetrics:
+    """Timing histograms of the pipeline stages, counters and gauges of the detector in the Prometheus text format.
+
+    Stages and counters are recorded by the event loop and the inference thread. Gauges are callbacks computed
+    when the metrics are rendered, so they cost nothing between scrapes. When the metrics are disabled,
+    recording returns at once and `timer` returns a shared no-op context manager.
+    """
+
+    def __init__(self, enabled: bool = True, namespace: str = "spot_gazer") -> None:
+        self.enabled = enabled
+        self.namespace = namespace
+        self._stages: dict[Labels, Histogram] = {}
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._gauges: dict[str, GaugeCallback] = {}
+        self._descriptions: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._disabled_timer = nullcontext()
+
+    def observe(self, stage: str, seconds: float, **labels: object) -> None:
+        """Record the duration of a pipeline stage, e.g. of a stream (`stream=...`) or a parking lot (`lot=...`)."""
+        if not self.enabled:
+            return
+        key = _labels(stage=stage, **labels)
+        with self._lock:
+            if (histogram := self._stages.get(key)) is None:
+                histogram = self._stages[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, stage: str, **labels: object) -> ContextManager:
+        if not self.enabled:
+            return self._disabled_timer
+        return self._time(stage, **labels)
+
+    @contextmanager
+    def _time(self, stage: str, **labels: object) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def increment(self, name: str, amount: float = 1, **labels: object) -> None:
+        if not self.enabled or not amount:
+            return
+        key = _labels(**labels)
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + amount
+
+    def gauge(self, name: str, callback: GaugeCallback, description: str = "") -> None:
+        self._gauges[name] = callback
+        self._descriptions[name] = description
+
+    def describe(self, name: str, description: str) -> None:
+        self._descriptions[name] = description
+
+    def render(self) -> str:
+        prefix = self.namespace
+        lines = [
+            f"# HELP {prefix}_stage_seconds Duration of the pipeline stages.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = {
+                labels: (histogram.buckets, list(histogram.counts), histogram.sum)
+                for labels, histogram in self._stages.items()
+            }
+            counters = {name: dict(values) for name, values in self._counters.items()}
+        for labels, (buckets, counts, total) in sorted(stages.items()):
+            cumulative = 0
+            for bound, count in zip((*buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(
+                    f"{prefix}_stage_seconds_bucket{_format_labels((*labels, ('le', str(bound))))} {cumulative}"
+                )
+            lines.append(f"{prefix}_stage_seconds_sum{_format_labels(labels)} {total}")
+            lines.append(f"{prefix}_stage_seconds_count{_format_labels(labels)} {cumulative}")
+        for name, values in sorted(counters.items()):
+            lines += self._render_metric(f"{prefix}_{name}_total", "counter", self._descriptions.get(name, ""), values)
+        for name, callback in sorted(self._gauges.items()):
+            try:
+                value = callback()
+            except Exception as error:
+                logger.error(f"Failed to compute the metric {name}: {error}")
+                continue
+            values = value if isinstance(value, dict) else {(): value}
+            lines += self._render_metric(f"{prefix}_{name}", "gauge", self._descriptions.get(name, ""), values)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_metric(name: str, metric_type: str, description: str, values: dict[Labels, float]) -> list[str]:
+        lines = [f"# HELP {name} {description}"] if description else []
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in sorted(values.items())]
+        return lines
+
+
+async def serve_metrics(metrics: PipelineMetrics, host: str, port: int) -> None:
+    """Serve the metrics at `http://<host>:<port>/metrics` from the event loop of the detector until cancelled."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            while (await asyncio.wait_for(reader.readline(), 10)).strip():
+                pass  # Skip the headers
+            method, path, *_ = request_line.decode("latin-1").split() or ("", "")
+            if method == "GET" and path.split("?")[0] == "/metrics":
+                status, body = "200 OK", metrics.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Metrics are served at http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
+
+
+def start_metrics_server(
+    metrics: PipelineMetrics, port: int | None = METRICS_PORT, host: str = METRICS_HOST
+) -> asyncio.Task | None:
+    """Start serving the metrics in the running event loop, unless the port is None."""
+    if port is None:
+        return None
+    return asyncio.create_task(serve_metrics(metrics, host, port), name="metrics-server")
@@ -0,0 +1,138 @@
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from ultralytics.yolo.data.augment import LetterBox
+
+from .configs.logging_config import logging
+from .configs.settings import INFERENCE_BACKEND, MODEL_ACCURACY_TOLERANCE, YOLOv8_PREDICTION_PARAMETERS
+from .predictor import FrameContext, create_predictor, detect_cars
+
+logger = logging.getLogger(__name__)
+
+# Suffixes of the model files of the backends, added to the name of the PyTorch weights
+MODEL_BACKENDS = {
+    "pytorch": ".pt",
+    "torchscript": ".torchscript",
+    "onnx": ".onnx",
+    "onnx-int8": "_int8.onnx",
+    "openvino": "_openvino_model",  # A directory
+}
+
+
+def get_model_path(
+    backend: str = INFERENCE_BACKEND,
+    weights: str | Path = YOLOv8_PREDICTION_PARAMETERS["model"],  # type: ignore[assignment]
+) -> Path:
+    """Return the path of the model of the backend exported from the PyTorch weights."""
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, supported backends: {', '.join(MODEL_BACKENDS)}.")
+    weights = Path(weights)
+    return weights.with_name(weights.stem + MODEL_BACKENDS[backend])
+
+
+def export_model(
+    backend: str,
+    weights: str | Path = YOLOv8_PREDICTION_PARAMETERS["model"],  # type: ignore[assignment]
+    calibration_images: Iterable[str | Path] = (),
+    imgsz: int = YOLOv8_PREDICTION_PARAMETERS["imgsz"],  # type: ignore[assignment]
+) -> Path:
+    """Export the PyTorch weights to the backend and return the path of the exported model.
+
+    ONNX and OpenVINO models are exported with a dynamic batch size. TorchScript has no dynamic export,
+    it's traced with a batch of one, and the traced model accepts other batch sizes of frames letterboxed to `imgsz`,
+    so all of them accept the batches of the inference batcher.
+    The INT8 model is quantized from the ONNX model by ONNX Runtime, using the calibration images to find
+    the ranges of activations. The images should look like the frames of the cameras.
+    """
+    model_path = get_model_path(backend, weights)
+    if backend == "pytorch":
+        return model_path
+    if backend == "onnx-int8":
+        if not (calibration_images := list(calibration_images)):
+            raise ValueError("INT8 quantization needs calibration images.")
+        onnx_path = get_model_path("onnx", weights)
+        if not onnx_path.exists():
+            export_model("onnx", weights, imgsz=imgsz)
+        _quantize_onnx(onnx_path, model_path, calibration_images, imgsz)
+    else:
+        # FP16 is not supported by CPUs
+        exported_path = YOLO(weights).export(
+            format=backend, imgsz=imgsz, half=False, dynamic=backend != "torchscript", device="cpu"
+        )
+        if Path(exported_path) != model_path:
+            Path(exported_path).rename(model_path)
+    logger.info(f"The model has been exported to {model_path}.")
+    return model_path
+
+
+class _CalibrationImages:
+    """Feed the calibration images to ONNX Runtime (a `CalibrationDataReader`), preprocessed like the frames."""
+
+    def __init__(self, images: list[str | Path], input_name: str, imgsz: int) -> None:
+        self.input_name = input_name
+        self._letterbox = LetterBox((imgsz, imgsz), auto=False)
+        self._images: Iterator[str | Path] = iter(images)
+
+    def get_next(self) -> dict[str, np.ndarray] | None:
+        if (image := next(self._images, None)) is None:
+            return None
+        frame = self._letterbox(image=cv2.imread(str(image)))
+        # BGR to RGB, HWC to CHW, scaled to [0, 1]
+        tensor = np.ascontiguousarray(frame[..., ::-1].transpose(2, 0, 1), dtype=np.float32)[np.newaxis] / 255
+        return {self.input_name: tensor}
+
+
+def _quantize_onnx(onnx_path: Path, output_path: Path, calibration_images: list[str | Path], imgsz: int) -> None:
+    import onnx
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    input_name = InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    quantize_static(
+        str(onnx_path),
+        str(output_path),
+        _CalibrationImages(calibration_images, input_name, imgsz),  # type: ignore[arg-type]
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    # The predictor reads the stride, the image size and the class names from the metadata of the model
+    model, quantized_model = onnx.load(str(onnx_path)), onnx.load(str(output_path))
+    quantized_model.metadata_props.extend(model.metadata_props)
+    onnx.save(quantized_model, str(output_path))
+
+
+def count_cars(model: str | Path, images: Iterable[str | Path]) -> list[int]:
+    predictor = create_predictor(model)
+    return [detect_cars(predictor, [cv2.imread(str(image))], [FrameContext(str(image))])[0] for image in images]
+
+
+def is_within_tolerance(reference: int, detected: int, tolerance: float = MODEL_ACCURACY_TOLERANCE) -> bool:
+    """Whether the number of cars detected by an exported model is close enough to the reference one.
+
+    The difference may be a share of the reference number of cars, but at least one car.
+    """
+    return abs(detected - reference) <= max(1.0, tolerance * reference)
+
+
+def check_accuracy(
+    model: str | Path,
+    images: Iterable[str | Path],
+    reference_model: str | Path = YOLOv8_PREDICTION_PARAMETERS["model"],  # type: ignore[assignment]
+    tolerance: float = MODEL_ACCURACY_TOLERANCE,
+) -> list[dict[str, Any]]:
+    """Compare the numbers of cars detected on the images by the model and the reference model."""
+    images = list(images)
+    return [
+        {
+            "image": str(image),
+            "reference": reference,
+            "detected": detected,
+            "passed": is_within_tolerance(reference, detected, tolerance),
+        }
+        for image, reference, detected in zip(images, count_cars(reference_model, images), count_cars(model, images))
+    ]
@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from livemap.models import LatestOccupancy, Occupancy
+
+from .configs.logging_config import logging
+from .configs.settings import (
+    OCCUPANCY_BUFFER_SIZE,
+    OCCUPANCY_FLUSH_INTERVAL,
+    OCCUPANCY_HEARTBEAT,
+    OCCUPANCY_STORAGE_MODE,
+)
+from .metrics import PipelineMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class OccupancyWriter:
+    """Buffer the detected occupancies and save them to the database in bulk.
+
+    The buffer is flushed as soon as it holds `max_buffer_size` occupancies or every `flush_interval` seconds.
+    The latest occupancies of the parking lots are updated in the same transaction.
+    If a flush fails, the occupancies are kept for the next one, but no more than ten buffer sizes of them.
+    If it violates the constraints, the occupancies are saved by parking lots, and the violating ones are dropped.
+
+    In the "changes" storage mode, an occupancy equal to the previous one of the parking lot is skipped,
+    unless `heartbeat` seconds have passed since the previous occupancy was buffered.
+    If the previous occupancy is dropped after failed flushes, the next one is saved regardless.
+
+    The durations and the sizes of the flushes are also recorded to `pipeline_metrics`, if passed.
+    """
+
+    def __init__(
+        self,
+        max_buffer_size: int = OCCUPANCY_BUFFER_SIZE,
+        flush_interval: float = OCCUPANCY_FLUSH_INTERVAL,
+        storage_mode: str = OCCUPANCY_STORAGE_MODE,
+        heartbeat: float = OCCUPANCY_HEARTBEAT,
+        pipeline_metrics: PipelineMetrics | None = None,
+    ) -> None:
+        self.max_buffer_size = max_buffer_size
+        self.flush_interval = flush_interval
+        self.storage_mode = storage_mode
+        self.heartbeat = heartbeat
+        self._buffer: list[Occupancy] = []
+        # The last buffered occupied spots of every parking lot and the time they were buffered at
+        self._last_occupancies: dict[int, tuple[int, float]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        # Metrics
+        self.flushes = self.saved_occupancies = self.skipped_occupancies = self.dropped_occupancies = 0
+        self.last_flush_latency = self.max_flush_latency = 0.0
+        self.pipeline_metrics = pipeline_metrics or PipelineMetrics(enabled=False)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._buffer)
+
+    def metrics(self) -> dict[str, int | float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "flushes": self.flushes,
+            "saved_occupancies": self.saved_occupancies,
+            "skipped_occupancies": self.skipped_occupancies,
+            "dropped_occupancies": self.dropped_occupancies,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+        }
+
+    async def add(self, parking_lot_id: int, occupied_spots: int) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_periodically())
+        if self.storage_mode == "changes":
+            now = time.monotonic()
+            last_spots, last_time = self._last_occupancies.get(parking_lot_id, (None, 0.0))
+            if last_spots == occupied_spots and now - last_time < self.heartbeat:
+                self.skipped_occupancies += 1
+                return
+            self._last_occupancies[parking_lot_id] = (occupied_spots, now)
+        self._buffer.append(
+            Occupancy(parking_lot_id=parking_lot_id, occupied_spots=occupied_spots, timestamp=timezone.now())
+        )
+        if len(self._buffer) >= self.max_buffer_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            occupancies, self._buffer = self._buffer, []
+            start = time.perf_counter()
+            try:
+                await sync_to_async(self._save)(occupancies)
+                saved_occupancies, unsaved_occupancies = occupancies, []
+            except IntegrityError as error:
+                # A parking lot may have been deleted while its occupancies were buffered
+                logger.warning(f"Failed to save {len(occupancies)} occupancies, saving them by parking lots: {error}")
+                saved_occupancies, unsaved_occupancies = await sync_to_async(self._save_by_parking_lots)(occupancies)
+                self.dropped_occupancies += len(occupancies) - len(saved_occupancies) - len(unsaved_occupancies)
+            except Exception as error:
+                logger.error(f"Failed to save {len(occupancies)} occupancies: {error}")
+                saved_occupancies, unsaved_occupancies = [], occupancies
+            if unsaved_occupancies:
+                self._requeue(unsaved_occupancies)
+            if not saved_occupancies:
+                return
+            self.last_flush_latency = time.perf_counter() - start
+            self.max_flush_latency = max(self.max_flush_latency, self.last_flush_latency)
+            self.flushes += 1
+            self.saved_occupancies += len(saved_occupancies)
+            self.pipeline_metrics.observe("flush", self.last_flush_latency)
+            self.pipeline_metrics.increment("occupancy_flushes")
+            self.pipeline_metrics.increment("flushed_occupancies", len(saved_occupancies))
+            logger.debug(f"Saved {len(saved_occupancies)} occupancies in {self.last_flush_latency * 1e3:.1f} ms.")
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    def _requeue(self, occupancies: list[Occupancy]) -> None:
+        """Keep the unsaved occupancies for the next flush, dropping the oldest ones over the limit."""
+        self._buffer = occupancies + self._buffer
+        if (overflow := len(self._buffer) - self.max_buffer_size * 10) > 0:
+            dropped_occupancies = self._buffer[:overflow]
+            del self._buffer[:overflow]
+            self.dropped_occupancies += overflow
+            self._forget_dropped(dropped_occupancies)
+
+    def _forget_dropped(self, dropped_occupancies: list[Occupancy]) -> None:
+        """Make the next occupancies of the parking lots without buffered ones saved even if unchanged."""
+        buffered_lot_ids = {occupancy.parking_lot_id for occupancy in self._buffer}
+        for occupancy in dropped_occupancies:
+            if occupancy.parking_lot_id not in buffered_lot_ids:
+                self._last_occupancies.pop(occupancy.parking_lot_id, None)
+
+    @staticmethod
+    @transaction.atomic
+    def _save(occupancies: list[Occupancy]) -> None:
+        Occupancy.objects.bulk_create(occupancies)
+        LatestOccupancy.objects.update_from(occupancies)
+
+    @classmethod
+    def _save_by_parking_lots(cls, occupancies: list[Occupancy]) -> tuple[list[Occupancy], list[Occupancy]]:
+        """Save the occupancies of every parking lot separately and return the saved and the unsaved ones.
+
+        The occupancies of parking lots that violate the constraints (deleted ones) are dropped.
+        """
+        occupancies_by_parking_lots: dict[int, list[Occupancy]] = {}
+        for occupancy in occupancies:
+            occupancies_by_parking_lots.setdefault(occupancy.parking_lot_id, []).append(occupancy)
+        saved_occupancies: list[Occupancy] = []
+        unsaved_occupancies: list[Occupancy] = []
+        for parking_lot_id, parking_lot_occupancies in occupancies_by_parking_lots.items():
+            try:
+                cls._save(parking_lot_occupancies)
+            except IntegrityError as error:
+                logger.error(
+                    f"Dropped {len(parking_lot_occupancies)} occupancies of parking lot №{parking_lot_id}: {error}"
+                )
+            except Exception as error:
+                logger.error(f"Failed to save the occupancies of parking lot №{parking_lot_id}: {error}")
+                unsaved_occupancies += parking_lot_occupancies
+            else:
+                saved_occupancies += parking_lot_occupancies
+        return saved_occupancies, unsaved_occupancies
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,135 @@
+import time
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+from ultralytics.yolo.engine.results import Results
+from ultralytics.yolo.utils import SETTINGS, callbacks
+from ultralytics.yolo.v8.detect import DetectionPredictor
+
+from .configs.settings import CASCADE_UNCERTAIN_CONFIDENCE, YOLOv8_PREDICTION_PARAMETERS
+from .image_processing import ZoneMaskCache, apply_mask
+from .metrics import PipelineMetrics
+
+SETTINGS.update({"sync": False})  # Prevent sync analytics and crashes with Ultralytics HUB (Google Analytics)
+
+# Names of the stages of the predictor in the metrics
+_PREDICTOR_STAGES = {"inference": "forward", "postprocess": "nms"}
+
+
+class FrameContext(NamedTuple):
+    """What the predictor needs to know about the stream a frame comes from.
+
+    The context travels with its frame through the batcher, so the predictor keeps no per-stream state
+    and frames of any streams can be in flight at the same time.
+    """
+
+    stream_id: Any
+    parking_zone: Any | None = None
+    inference_mode: str = "mask"
+
+
+class Interceptor(DetectionPredictor):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.mask_cache = ZoneMaskCache()
+
+
+def create_predictor(model: str | Path) -> Interceptor:
+    predictor = Interceptor(overrides=YOLOv8_PREDICTION_PARAMETERS, _callbacks=callbacks.get_default_callbacks())
+    predictor.setup_model(model=model, verbose=False)
+    return predictor
+
+
+def _predict(
+    predictor: Interceptor,
+    frames: list[np.ndarray],
+    contexts: list[FrameContext],
+    metrics: PipelineMetrics | None = None,
+) -> list[tuple[int, Results]]:
+    """Run the predictor on the parking zones of the frames and return the results with the frame indexes."""
+    start = time.perf_counter()
+    images, frame_indexes = [], []
+    for index, (frame, context) in enumerate(zip(frames, contexts)):
+        if not context.parking_zone:
+            images.append(frame)
+            frame_indexes.append(index)
+            continue
+        zone_mask = predictor.mask_cache.get(context.stream_id, frame.shape, context.parking_zone)
+        if context.inference_mode == "mask":
+            images.append(apply_mask(frame, zone_mask.mask))
+            frame_indexes.append(index)
+            continue
+        boxes = (
+            zone_mask.tiles if context.inference_mode == "tiles" or not zone_mask.tiles else [zone_mask.bounding_box]
+        )
+        for x1, y1, x2, y2 in boxes:
+            # Boxes of tiles don't overlap, so no car is counted twice
+            images.append(apply_mask(frame[y1:y2, x1:x2].copy(), zone_mask.mask[y1:y2, x1:x2]))
+            frame_indexes.append(index)
+
+    if metrics is not None:
+        metrics.observe("mask", time.perf_counter() - start)
+    if not images:
+        return []
+    results: list[Results] = predictor(source=images)
+    if metrics is not None and results:
+        # The predictor reports the average milliseconds per image of every stage of the batch
+        for stage, milliseconds in results[0].speed.items():
+            if milliseconds is not None:
+                metrics.observe(_PREDICTOR_STAGES.get(stage, stage), milliseconds * len(images) / 1e3)
+    return list(zip(frame_indexes, results))
+
+
+def detect_cars(
+    predictor: Interceptor,
+    frames: list[np.ndarray],
+    contexts: list[FrameContext],
+    metrics: PipelineMetrics | None = None,
+) -> list[int]:
+    """Detect cars on the frames of different streams in one forward pass.
+
+    Every frame comes with the context of its stream: the stream id, the parking zone and the inference mode
+    of `VideoStreamSource`. In the "mask" mode the whole frame is blacked out around the parking zone.
+    In the "crop" and "tiles" modes only the boxes around the parking zone are passed to the model,
+    so fewer pixels are processed and small parking zones get a higher resolution.
+    The durations of masking and of the stages of the predictor are recorded to the metrics, if they are passed.
+    """
+    detected_cars = [0] * len(frames)
+    for index, result in _predict(predictor, frames, contexts, metrics):
+        detected_cars[index] += len(result)  # type: ignore[arg-type]
+    return detected_cars
+
+
+def detect_uncertain_cars(
+    predictor: Interceptor,
+    frames: list[np.ndarray],
+    contexts: list[FrameContext],
+    uncertain_confidence: float = CASCADE_UNCERTAIN_CONFIDENCE,
+) -> list[tuple[int, int]]:
+    """Detect cars like `detect_cars`, also counting the cars detected with a confidence below `uncertain_confidence`.
+
+    A list of pairs of the number of cars and the number of uncertain cars is returned.
+    """
+    detected_cars = [(0, 0)] * len(frames)
+    for index, result in _predict(predictor, frames, contexts):
+        confidences = result.boxes.conf  # type: ignore[union-attr]
+        cars, uncertain_cars = detected_cars[index]
+        detected_cars[index] = (
+            cars + len(confidences),
+            uncertain_cars + int((confidences < uncertain_confidence).sum()),
+        )
+    return detected_cars
+
+
+# The model copy of an inference worker process
+_worker_predictor: Interceptor | None = None
+
+
+def initialize_worker(model: str | Path) -> None:
+    global _worker_predictor
+    _worker_predictor = create_predictor(model)
+
+
+def detect_cars_in_worker(frames: list[np.ndarray], contexts: list[FrameContext]) -> list[int]:
+    return detect_cars(_worker_predictor, frames, contexts)  # type: ignore[arg-type]
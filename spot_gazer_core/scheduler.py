@@ -0,0 +1,91 @@
+import asyncio
+import heapq
+import itertools
+import math
+from typing import Hashable
+
+from .configs.logging_config import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Wake every parking lot at fixed-rate deadlines, so its sample interval doesn't drift with the inference time.
+
+    The due times of all parking lots are kept in a priority queue served by a single timer task.
+    A parking lot that comes back for its next slot after the slot has passed (its previous sample took longer
+    than its processing rate) is not queued for the slots it missed: they are coalesced into a single one that is
+    due at once, and the missed deadlines are counted.
+    """
+
+    def __init__(self) -> None:
+        # Due times (in the event loop time) of the last slots by keys
+        self._last_due: dict[Hashable, float] = {}
+        self._queue: list[tuple[float, int, Hashable, asyncio.Future[None]]] = []
+        self._counter = itertools.count()  # Order of keys with the same due time
+        self._queue_changed = asyncio.Event()
+        self._timer: asyncio.Task | None = None
+        # Metrics
+        self.dispatched_slots = self.missed_deadlines = 0
+        self.max_dispatch_lag = 0.0
+
+    def metrics(self) -> dict[str, int | float]:
+        return {
+            "scheduled_lots": len(self._last_due),
+            "dispatched_slots": self.dispatched_slots,
+            "missed_deadlines": self.missed_deadlines,
+            "max_dispatch_lag": self.max_dispatch_lag,
+        }
+
+    async def wait(self, key: Hashable, period: float) -> float:
+        """Wait for the next slot of the key and return the deadline of its work (the start of the following slot).
+
+        The first slot of a key is due at once, and every next one is due the period after the last one.
+        The period may change between calls, and the new one applies to the awaited slot.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        due = self._last_due[key] + period if key in self._last_due else now
+        if period > 0 and (missed_slots := math.floor((now - due) / period)) > 0:
+            self.missed_deadlines += missed_slots
+            due += missed_slots * period
+            logger.debug(f"{key} has missed {missed_slots} deadlines.")
+        self._last_due[key] = due
+
+        if due > now:
+            future: asyncio.Future[None] = loop.create_future()
+            heapq.heappush(self._queue, (due, next(self._counter), key, future))
+            self._queue_changed.set()
+            if self._timer is None or self._timer.done():
+                self._timer = asyncio.create_task(self._dispatch())
+            await future
+        self.dispatched_slots += 1
+        return due + period
+
+    def remove(self, key: Hashable) -> None:
+        self._last_due.pop(key, None)
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        for *_, future in self._queue:
+            future.cancel()
+        self._queue.clear()
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._queue_changed.clear()
+            while self._queue and self._queue[0][0] <= (now := loop.time()):
+                due, _, _, future = heapq.heappop(self._queue)
+                if not future.done():
+                    self.max_dispatch_lag = max(self.max_dispatch_lag, now - due)
+                    future.set_result(None)
+            timeout = self._queue[0][0] - loop.time() if self._queue else None
+            try:
+                # Wake up at the earliest due time or when an earlier slot is queued
+                await asyncio.wait_for(self._queue_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import os
+import socket
+from bisect import bisect
+from datetime import timedelta
+from typing import Any, Callable, Iterable, Protocol
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from livemap.models import DetectionWorker
+
+from .configs.logging_config import logging
+from .configs.settings import DETECTION_WORKER_HEARTBEAT, DETECTION_WORKER_LEASE, HASH_RING_REPLICAS
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    # Unlike `hash`, MD5 is the same in all processes and on all hosts
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of keys to nodes.
+
+    Every node is placed on the ring `replicas` times, so keys are spread evenly, and adding or removing a node
+    only moves the keys of its neighbours on the ring.
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = HASH_RING_REPLICAS) -> None:
+        points = sorted((_hash(f"{node}#{replica}"), node) for node in set(nodes) for replica in range(replicas))
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def __len__(self) -> int:
+        return len(set(self._nodes))
+
+    def get_node(self, key: object) -> str | None:
+        if not self._nodes:
+            return None
+        return self._nodes[bisect(self._hashes, _hash(str(key))) % len(self._nodes)]
+
+
+class ShardedDetector(Protocol):
+    running_parking_lots: set[int]
+
+    async def reconcile(self, parking_lots: list[list[dict[str, Any]]]) -> None:
+        ...
+
+    async def stop_detection(self) -> None:
+        ...
+
+
+class ShardedRunner:
+    """Detect the occupancy of the shard of parking lots that belongs to this worker.
+
+    Workers on any number of processes and hosts share the database. Every `heartbeat_interval` seconds a worker
+    renews its lease in the `DetectionWorker` table and assigns the parking lots to the workers whose leases
+    haven't expired by consistent hashing of parking lot ids. When a worker dies, its parking lots move to others
+    after `lease` seconds; a stopped worker deletes its lease at once. During a rebalance a parking lot can be
+    processed by two workers for up to one heartbeat interval.
+
+    Args:
+        - spot_gazer: detector of the parking lots (`SpotGazer`).
+        - select_parking_lots: callable returning active stream sources grouped by parking lots.
+        - name: unique name of the worker. Defaults to the host name and the process id.
+    """
+
+    def __init__(
+        self,
+        spot_gazer: ShardedDetector,
+        select_parking_lots: Callable[[], list[list[dict[str, Any]]]],
+        name: str | None = None,
+        heartbeat_interval: float = DETECTION_WORKER_HEARTBEAT,
+        lease: float = DETECTION_WORKER_LEASE,
+    ) -> None:
+        self.spot_gazer = spot_gazer
+        self.select_parking_lots = select_parking_lots
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.lease = lease
+
+    async def run(self) -> None:
+        logger.info(f"Detection worker {self.name} has been started!")
+        try:
+            while True:
+                try:
+                    await self.rebalance()
+                except Exception as error:
+                    # Keep processing the current shard until the database is reachable again
+                    logger.error(f"Rebalancing of worker {self.name} failed: {error}")
+                await asyncio.sleep(self.heartbeat_interval)
+        finally:
+            await self.spot_gazer.stop_detection()
+            await DetectionWorker.objects.filter(name=self.name).adelete()
+            logger.info(f"Detection worker {self.name} stopped!")
+
+    async def rebalance(self) -> None:
+        """Renew the lease of the worker and start or stop the detection of parking lots to match its shard."""
+        await self._heartbeat()
+        lease_start = timezone.now() - timedelta(seconds=self.lease)
+        # Forget the workers that have been dead for long
+        await DetectionWorker.objects.filter(
+            heartbeat_at__lt=lease_start - timedelta(seconds=self.lease * 10)
+        ).adelete()
+        workers = [
+            name
+            async for name in DetectionWorker.objects.filter(heartbeat_at__gte=lease_start).values_list(
+                "name", flat=True
+            )
+        ]
+        ring = HashRing(workers)
+        shard = {
+            parking_lot[0]["parking_lot_id"]: parking_lot
+            for parking_lot in await sync_to_async(self.select_parking_lots)()
+            if ring.get_node(parking_lot[0]["parking_lot_id"]) == self.name
+        }
+        if shard.keys() != self.spot_gazer.running_parking_lots:
+            logger.info(f"Worker {self.name} of {len(ring)} workers detects {len(shard)} parking lots.")
+        # Changes of the stream sources of the shard are applied as well
+        await self.spot_gazer.reconcile(list(shard.values()))
+
+    async def _heartbeat(self) -> None:
+        await DetectionWorker.objects.aupdate_or_create(
+            name=self.name,
+            defaults={
+                "host": socket.gethostname(),
+                "pid": os.getpid(),
+                "parking_lots": len(self.spot_gazer.running_parking_lots),
+                "heartbeat_at": timezone.now(),
+            },
+        )
@@ -0,0 +1,72 @@
+import random
+import time
+
+from .configs.settings import STREAM_FAILURE_BUDGET, STREAM_RECONNECT_DELAY, STREAM_RECONNECT_MAX_DELAY
+
+
+class StreamHealth:
+    """Health of a video stream: a circuit breaker with exponential backoff of reconnections.
+
+    Every consecutive failure doubles the delay before the next reconnection, up to `max_delay` seconds.
+    The delay is randomized between its half and its full value, so cameras that failed together don't
+    reconnect at the same moment. Once the stream has failed more than `failure_budget` times in a row,
+    the breaker opens and the stream should be deactivated. A successfully read frame resets the failures.
+    """
+
+    def __init__(
+        self,
+        failure_budget: int = STREAM_FAILURE_BUDGET,
+        base_delay: float = STREAM_RECONNECT_DELAY,
+        max_delay: float = STREAM_RECONNECT_MAX_DELAY,
+    ) -> None:
+        self.failure_budget = failure_budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = 0  # Consecutive failures
+        self.total_failures = 0
+        self.reconnections = 0
+        self.last_error: str | None = None
+        self.is_connected = False
+        self.is_deactivated = False
+        self._retry_at = 0.0
+
+    @property
+    def status(self) -> str:
+        if self.is_deactivated:
+            return "deactivated"
+        return "healthy" if self.is_connected and not self.failures else "reconnecting"
+
+    @property
+    def is_exhausted(self) -> bool:
+        return self.failures > self.failure_budget
+
+    @property
+    def retry_in(self) -> float:
+        """The time (in seconds) left before the next reconnection."""
+        return max(self._retry_at - time.monotonic(), 0.0)
+
+    def record_connection(self) -> None:
+        if self.total_failures:
+            self.reconnections += 1
+        self.is_connected = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self, error: BaseException) -> None:
+        self.failures += 1
+        self.total_failures += 1
+        self.last_error = str(error)
+        self.is_connected = False
+        delay = min(self.base_delay * 2 ** (self.failures - 1), self.max_delay)
+        self._retry_at = time.monotonic() + random.uniform(delay / 2, delay)
+
+    def as_dict(self) -> dict[str, str | int | float | None]:
+        return {
+            "status": self.status,
+            "failures": self.failures,
+            "total_failures": self.total_failures,
+            "reconnections": self.reconnections,
+            "retry_in": self.retry_in,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,64 @@
+import json
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from livemap.models import Occupancy
+
+from .. import TestCaseWithData, fake
+
+
+class ParkingLotsApiTest(TestCaseWithData):
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.occupancy = Occupancy.objects.create(
+            parking_lot=self.parking_lot, occupied_spots=fake.pyint(max_value=self.parking_lot.total_spots)
+        )
+
+    def test_parking_lots(self) -> None:
+        response = self.client.get(reverse("livemap:parking_lots"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+        feature_collection = json.loads(response.content)
+        self.assertEqual(feature_collection["type"], "FeatureCollection")
+        feature = feature_collection["features"][0]
+        self.assertEqual(feature["id"], self.parking_lot.pk)
+        self.assertEqual(feature["geometry"]["coordinates"], self.parking_lot.geolocation[::-1])
+        self.assertEqual(
+            feature["properties"]["free_spots"], self.parking_lot.total_spots - self.occupancy.occupied_spots
+        )
+
+        # The snapshot of parking lots is shared by all clients
+        with self.assertNumQueries(0):
+            self.client.get(reverse("livemap:parking_lots"))
+
+    def test_etag(self) -> None:
+        etag = self.client.get(reverse("livemap:parking_lots"))["ETag"]
+        response = self.client.get(reverse("livemap:parking_lots"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+        Occupancy.objects.create(parking_lot=self.parking_lot, occupied_spots=self.occupancy.occupied_spots + 1)
+        response = self.client.get(reverse("livemap:parking_lots"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_since(self) -> None:
+        since = json.loads(self.client.get(reverse("livemap:parking_lots")).content)["changed_at"]
+        changes = json.loads(self.client.get(reverse("livemap:parking_lots"), {"since": since}).content)
+        self.assertEqual((changes["features"], changes["changed_at"]), ([], since))
+
+        # Unchanged free spots don't make a parking lot changed
+        Occupancy.objects.create(parking_lot=self.parking_lot, occupied_spots=self.occupancy.occupied_spots)
+        changes = json.loads(self.client.get(reverse("livemap:parking_lots"), {"since": since}).content)
+        self.assertEqual(changes["features"], [])
+
+        Occupancy.objects.create(parking_lot=self.parking_lot, occupied_spots=self.occupancy.occupied_spots + 1)
+        changes = json.loads(self.client.get(reverse("livemap:parking_lots"), {"since": since}).content)
+        self.assertEqual([feature["id"] for feature in changes["features"]], [self.parking_lot.pk])
+        self.assertGreater(changes["changed_at"], since)
+
+    def test_invalid_since(self) -> None:
+        response = self.client.get(reverse("livemap:parking_lots"), {"since": fake.pystr()})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
@@ -0,0 +1,32 @@
+from django.test import RequestFactory, SimpleTestCase
+
+from livemap.client_ip import ClientIPResolver, get_client_ip
+
+from .. import fake
+
+
+class ClientIPResolverTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.resolver = ClientIPResolver(["10.0.0.0/8", "::1"])
+        self.client_ip = fake.ipv4_public()
+
+    def test_untrusted_remote_address(self) -> None:
+        request = RequestFactory().get("/", REMOTE_ADDR=self.client_ip, HTTP_X_FORWARDED_FOR=fake.ipv4_public())
+        self.assertEqual(self.resolver.resolve(request), self.client_ip)
+
+    def test_trusted_proxies(self) -> None:
+        # The leftmost address is forged by the client and the others are appended by trusted proxies
+        request = RequestFactory().get(
+            "/", REMOTE_ADDR="::1", HTTP_X_FORWARDED_FOR=f"{fake.ipv4_public()}, {self.client_ip}, 10.1.2.3"
+        )
+        self.assertEqual(self.resolver.resolve(request), self.client_ip)
+
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="10.1.2.3")
+        self.assertEqual(self.resolver.resolve(request), "10.1.2.3")
+
+    def test_get_client_ip(self) -> None:
+        request = RequestFactory().get("/", REMOTE_ADDR=self.client_ip)
+        self.assertEqual(get_client_ip(request), self.client_ip)
+        # The address is resolved once per request
+        request.META["REMOTE_ADDR"] = fake.ipv4_public()
+        self.assertEqual(get_client_ip(request), self.client_ip)
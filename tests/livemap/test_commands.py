@@ -0,0 +1,131 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from livemap.management.commands.rollup_occupancy import Command
+from livemap.models import Occupancy, OccupancyAggregate
+
+from .. import TestCaseWithData
+
+
+class RollupOccupancyTest(TestCaseWithData):
+    def setUp(self) -> None:
+        super().setUp()
+        self.now = timezone.now()
+        minute_start = (self.now - timedelta(days=10)).replace(second=0, microsecond=0)
+        hour_start = (self.now - timedelta(days=40)).replace(minute=0, second=0, microsecond=0)
+        for timestamp, occupied_spots in (
+            # Recent occupancies stay as they are
+            (self.now, 10),
+            # Occupancies of the same minute
+            (minute_start, 2),
+            (minute_start + timedelta(seconds=20), 4),
+            (minute_start + timedelta(seconds=40), 9),
+            # Occupancies of two minutes of the same hour
+            (hour_start, 1),
+            (hour_start + timedelta(minutes=1), 3),
+            (hour_start + timedelta(minutes=1, seconds=30), 5),
+        ):
+            Occupancy.objects.create(parking_lot=self.parking_lot, occupied_spots=occupied_spots, timestamp=timestamp)
+        self.minute_start, self.hour_start = minute_start, hour_start
+
+    def test_rollup_occupancy(self) -> None:
+        output = StringIO()
+        call_command("rollup_occupancy", raw_retention=7, minute_retention=30, max_gap=60, stdout=output)
+        self.assertIn(
+            "5 occupancies were compacted into 5 minute aggregates, "
+            "3 minute aggregates were compacted into 1 hour aggregates.",
+            output.getvalue(),
+        )
+
+        # The last compacted occupancy is kept to carry its value into the next compaction
+        self.assertEqual(sorted(Occupancy.objects.values_list("occupied_spots", flat=True)), [9, 10])
+        minutes = OccupancyAggregate.objects.filter(period=OccupancyAggregate.Period.MINUTE).order_by("period_start")
+        self.assertEqual(
+            [
+                (minute.period_start, minute.samples, minute.min_occupied_spots, minute.max_occupied_spots)
+                for minute in minutes
+            ],
+            [(self.minute_start, 3, 2, 9), (self.minute_start + timedelta(minutes=1), 0, 9, 9)],
+        )
+        # Every occupancy holds until the next one, and the last one for the maximum gap
+        self.assertEqual([minute.avg_occupied_spots for minute in minutes], [5, 9])
+        hour = OccupancyAggregate.objects.get(period=OccupancyAggregate.Period.HOUR)
+        self.assertEqual(hour.period_start, self.hour_start)
+        self.assertEqual((hour.samples, hour.min_occupied_spots, hour.max_occupied_spots), (3, 1, 5))
+        # Averages of the minutes: 1, 4 (3 and 5 for 30 s each) and 5 (carried for 30 s)
+        self.assertAlmostEqual(hour.avg_occupied_spots, 10 / 3)
+
+
+class SparseRollupOccupancyTest(TestCaseWithData):
+    """Occupancies saved in the "changes" storage mode: on changes and every 15 minutes."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.start = (timezone.now() - timedelta(days=40)).replace(minute=0, second=0, microsecond=0)
+
+    def create_occupancies(self, *occupancies: tuple[int, int]) -> None:
+        for minutes, occupied_spots in occupancies:
+            Occupancy.objects.create(
+                parking_lot=self.parking_lot,
+                occupied_spots=occupied_spots,
+                timestamp=self.start + timedelta(minutes=minutes),
+            )
+
+    def minute_averages(self) -> list[float]:
+        return list(
+            OccupancyAggregate.objects.filter(period=OccupancyAggregate.Period.MINUTE)
+            .order_by("period_start")
+            .values_list("avg_occupied_spots", flat=True)
+        )
+
+    def test_rollup_occupancy(self) -> None:
+        self.create_occupancies((0, 10), (30, 40), (45, 40))
+        call_command("rollup_occupancy", raw_retention=7, minute_retention=30, max_gap=30 * 60, stdout=StringIO())
+
+        hours = OccupancyAggregate.objects.filter(period=OccupancyAggregate.Period.HOUR).order_by("period_start")
+        self.assertEqual(
+            [(hour.period_start, hour.samples, hour.avg_occupied_spots) for hour in hours],
+            # Weighted by time rather than by the saved occupancies, which would average 30 spots
+            [(self.start, 3, 25), (self.start + timedelta(hours=1), 0, 40)],
+        )
+
+    def test_carry_over_compactions(self) -> None:
+        self.create_occupancies((0, 10), (10, 20))
+        max_gap = timedelta(minutes=30)
+        self.assertEqual(Command._compact_occupancies(self.start + timedelta(minutes=5), max_gap), (0, 5))
+        self.assertEqual(Command._compact_occupancies(self.start + timedelta(minutes=20), max_gap), (1, 15))
+
+        self.assertEqual(self.minute_averages(), [10] * 10 + [20] * 10)
+        self.assertEqual(list(Occupancy.objects.values_list("occupied_spots", flat=True)), [20])
+
+
+class ExportModelTest(SimpleTestCase):
+    @patch("livemap.management.commands.export_model.check_accuracy")
+    def test_export_model(self, check_accuracy: Mock) -> None:
+        check_accuracy.return_value = [{"image": "small_parking.jpg", "reference": 33, "detected": 32, "passed": True}]
+        output = StringIO()
+        call_command("export_model", "pytorch", stdout=output)
+        self.assertIn("within tolerance", output.getvalue())
+
+        check_accuracy.return_value = [{"image": "small_parking.jpg", "reference": 33, "detected": 20, "passed": False}]
+        with self.assertRaisesMessage(CommandError, "small_parking.jpg"):
+            call_command("export_model", "pytorch", stdout=StringIO())
+
+    @patch("livemap.management.commands.export_model.export_model")
+    def test_calibration_images(self, export_model: Mock) -> None:
+        with self.assertRaisesMessage(CommandError, "needs --calibration-images"):
+            call_command("export_model", "onnx-int8", stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, "must not be test images: ./tests/test_media/big_parking.jpg"):
+            call_command(
+                "export_model",
+                "onnx-int8",
+                calibration_images=["calibration.jpg", "./tests/test_media/big_parking.jpg"],
+                stdout=StringIO(),
+            )
+        export_model.assert_not_called()
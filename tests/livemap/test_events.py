@@ -0,0 +1,68 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from livemap.events import OccupancyBroadcaster
+from livemap.models import Occupancy
+
+from .. import TestCaseWithData, fake
+
+
+class OccupancyBroadcasterTest(TestCaseWithData):
+    async def test_publish(self) -> None:
+        broadcaster = OccupancyBroadcaster(poll_interval=60, max_queue_size=2)
+        changes = [{"id": parking_lot_id} for parking_lot_id in range(3)]
+        queues = [broadcaster.subscribe(), broadcaster.subscribe()]
+        try:
+            self.assertEqual(broadcaster.subscribers, 2)
+            broadcaster.publish(changes)
+            # Subscribers that fall behind lose the oldest changes
+            for queue in queues:
+                self.assertEqual([queue.get_nowait(), queue.get_nowait()], changes[1:])
+        finally:
+            for queue in queues:
+                broadcaster.unsubscribe(queue)
+        self.assertEqual(broadcaster.subscribers, 0)
+
+    async def test_relay_changes(self) -> None:
+        broadcaster = OccupancyBroadcaster(poll_interval=0.01)
+        queue = broadcaster.subscribe()
+        try:
+            occupancy = await Occupancy.objects.acreate(
+                parking_lot=self.parking_lot, occupied_spots=fake.pyint(max_value=self.parking_lot.total_spots)
+            )
+            change = await asyncio.wait_for(queue.get(), 5)
+            self.assertEqual(change["id"], self.parking_lot.pk)
+            self.assertEqual(change["free_spots"], self.parking_lot.total_spots - occupancy.occupied_spots)
+            # The same change is published once
+            await asyncio.sleep(0.05)
+            self.assertTrue(queue.empty())
+        finally:
+            broadcaster.unsubscribe(queue)
+
+
+class OccupancyEventsTest(TestCaseWithData):
+    async def test_occupancy_events(self) -> None:
+        await cache.aclear()
+        await Occupancy.objects.acreate(parking_lot=self.parking_lot, occupied_spots=0)
+        last_event_id = (timezone.now() - timedelta(minutes=1)).isoformat()
+        response = await self.async_client.get(reverse("livemap:occupancy_events"), HTTP_LAST_EVENT_ID=last_event_id)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b"retry:"))
+
+        # The changes after the last received event are sent to a reconnecting client
+        event = (await anext(events)).decode()
+        self.assertIn("event: occupancy", event)
+        data = json.loads(event.split("data: ")[1])
+        self.assertEqual((data["id"], data["free_spots"]), (self.parking_lot.pk, self.parking_lot.total_spots))
+        await events.aclose()
+
+    def test_occupancy_events_under_wsgi(self) -> None:
+        response = self.client.get(reverse("livemap:occupancy_events"))
+        self.assertEqual(response.status_code, 501)
+        self.assertIn("error", response.json())
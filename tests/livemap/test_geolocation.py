@@ -0,0 +1,117 @@
+import ipaddress
+import time
+from threading import Event
+from unittest.mock import MagicMock, patch
+
+import requests  # type: ignore[import]
+from django.test import SimpleTestCase
+
+from livemap.geolocation import GeolocationResolver, IPRangeDatabase, RemoteGeolocation, TTLCache
+
+from .. import fake
+
+DATABASE_PATH = "tests/test_media/geolocation.csv"
+
+
+def wait_for_lookups(resolver: GeolocationResolver) -> None:
+    deadline = time.monotonic() + 5
+    while resolver._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TTLCacheTest(SimpleTestCase):
+    def test_max_size(self) -> None:
+        cache = TTLCache(max_size=2, ttl=60)
+        for key in range(3):
+            cache.set(key, fake.pyint())
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(0), (False, None))
+
+    def test_ttl(self) -> None:
+        cache = TTLCache(max_size=2, ttl=0)
+        cache.set("key", None)
+        time.sleep(0.001)
+        self.assertEqual(cache.get("key"), (False, None))
+
+
+class IPRangeDatabaseTest(SimpleTestCase):
+    def test_lookup(self) -> None:
+        database = IPRangeDatabase(DATABASE_PATH)
+        self.assertEqual(database.lookup(ipaddress.ip_address("1.0.0.0")), (49.9044, 16.4441))
+        self.assertEqual(database.lookup(ipaddress.ip_address("126.255.255.255")), (49.9044, 16.4441))
+        self.assertEqual(database.lookup(ipaddress.ip_address("2001:db8::1")), (52.5244, 13.4105))
+        self.assertIsNone(database.lookup(ipaddress.ip_address("127.0.0.1")))
+        self.assertIsNone(database.lookup(ipaddress.ip_address("2001:db9::")))
+
+
+class GeolocationResolverTest(SimpleTestCase):
+    def test_resolve(self) -> None:
+        resolver = GeolocationResolver(IPRangeDatabase(DATABASE_PATH))
+        self.assertEqual(resolver.resolve("200.1.2.3"), (-27.4767, 153.017))
+        self.assertIsNone(resolver.resolve(fake.pystr()))
+        self.assertIsNone(resolver.resolve("127.0.0.1"))
+
+    @patch("livemap.geolocation.requests.get")
+    def test_resolve_remotely(self, get: MagicMock) -> None:
+        get.return_value.status_code = 200
+        get.return_value.json.return_value = {"loc": "49.9,16.4"}
+        resolver = GeolocationResolver(remote=RemoteGeolocation("https://geolocation/{}", timeout=1))
+        # The remote lookup doesn't block the request
+        self.assertIsNone(resolver.resolve("8.8.8.8"))
+        resolver._remote_executor.shutdown()
+        self.assertEqual(resolver.resolve("8.8.8.8"), (49.9, 16.4))
+        get.assert_called_once_with("https://geolocation/8.8.8.8", timeout=1)
+        # Private addresses are never sent to the remote service
+        self.assertIsNone(resolver.resolve(fake.ipv4_private()))
+        get.assert_called_once()
+
+    @patch("livemap.geolocation.requests.get")
+    def test_remote_failure(self, get: MagicMock) -> None:
+        resolver = GeolocationResolver(remote=RemoteGeolocation("https://geolocation/{}", timeout=1))
+        for error in (requests.ConnectionError("Connection refused"), requests.HTTPError("429 Too Many Requests")):
+            get.reset_mock()
+            get.return_value.raise_for_status.side_effect = error
+            resolver.resolve("8.8.8.8")
+            wait_for_lookups(resolver)
+            # Failures of the remote service are not cached, so the address is looked up again
+            resolver.resolve("8.8.8.8")
+            wait_for_lookups(resolver)
+            self.assertEqual(get.call_count, 2)
+
+        get.return_value.raise_for_status.side_effect = None
+        get.return_value.json.return_value = {"loc": "49.9,16.4"}
+        resolver.resolve("8.8.8.8")
+        resolver._remote_executor.shutdown()
+        self.assertEqual(resolver.resolve("8.8.8.8"), (49.9, 16.4))
+
+    @patch("livemap.geolocation.requests.get")
+    def test_malformed_response(self, get: MagicMock) -> None:
+        resolver = GeolocationResolver(remote=RemoteGeolocation("https://geolocation/{}", timeout=1))
+        for address, response in (("8.8.8.8", ValueError("Expecting value")), ("8.8.4.4", {"loc": "north,east"})):
+            get.return_value.json.side_effect = [response]
+            with self.assertLogs("livemap.geolocation", "WARNING"):
+                resolver.resolve(address)
+                wait_for_lookups(resolver)
+            # A malformed response is cached as an unknown location rather than fetched on every request
+            self.assertIsNone(resolver.resolve(address))
+            wait_for_lookups(resolver)
+        self.assertEqual(get.call_count, 2)
+
+    def test_max_pending(self) -> None:
+        released = Event()
+        remote = MagicMock()
+        remote.lookup.side_effect = lambda address: released.wait(5) and None
+        resolver = GeolocationResolver(remote=remote, max_pending=10)
+        # Distinct addresses flood the resolver while the remote service is blocked
+        for _ in range(1000):
+            self.assertIsNone(resolver.resolve(fake.ipv4_public()))
+        self.assertLessEqual(len(resolver._pending), 10)
+        self.assertLessEqual(resolver._remote_executor._work_queue.qsize(), 10)
+        released.set()
+        wait_for_lookups(resolver)
+        self.assertEqual(len(resolver._pending), 0)
+        self.assertLessEqual(remote.lookup.call_count, 10)
+        # Lookups are accepted again once the pending ones have completed
+        resolver.resolve(address := fake.ipv4_public())
+        resolver._remote_executor.shutdown()
+        remote.lookup.assert_called_with(ipaddress.ip_address(address))
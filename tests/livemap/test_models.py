@@ -1,8 +1,9 @@
+from datetime import timedelta
 from typing import Any
 from django.forms import ValidationError
 from parameterized import parameterized
 
-from livemap.models import ParkingLot, VideoStreamSource, validate_geolocation
+from livemap.models import LatestOccupancy, Occupancy, ParkingLot, VideoStreamSource, validate_geolocation
 
 from .. import TestCaseWithData, fake
 
@@ -45,3 +46,35 @@ class VideoStreamSourceTest(TestCaseWithData):
             ValidationError, f"The processing rate for this parking lot should be {processing_rate} s!"
         ):
             VideoStreamSource.objects.create(**self.stream_source_data)
+
+
+class LatestOccupancyTest(TestCaseWithData):
+    def test_update_from(self) -> None:
+        occupancies = [Occupancy(parking_lot=self.parking_lot, occupied_spots=fake.pyint()) for _ in range(3)]
+        LatestOccupancy.objects.update_from(occupancies)
+        self.assertEqual(self.parking_lot.latest_occupancy.occupied_spots, occupancies[-1].occupied_spots)
+
+        # Older occupancies of the same batch don't overwrite newer ones
+        LatestOccupancy.objects.update_from(reversed(occupancies))
+        self.assertEqual(LatestOccupancy.objects.get().occupied_spots, occupancies[-1].occupied_spots)
+
+        # An older occupancy saved later doesn't overwrite a newer one either
+        latest_occupancy = LatestOccupancy.objects.get()
+        delayed_occupancy = Occupancy(
+            parking_lot=self.parking_lot,
+            occupied_spots=occupancies[-1].occupied_spots + 1,
+            timestamp=occupancies[-1].timestamp - timedelta(minutes=1),
+        )
+        LatestOccupancy.objects.update_from([delayed_occupancy])
+        self.assertEqual(
+            LatestOccupancy.objects.values_list("occupied_spots", "timestamp", "changed_at").get(),
+            (latest_occupancy.occupied_spots, latest_occupancy.timestamp, latest_occupancy.changed_at),
+        )
+
+    def test_saved_occupancy(self) -> None:
+        occupancy = Occupancy.objects.create(parking_lot=self.parking_lot, occupied_spots=fake.pyint())
+        latest_occupancy = LatestOccupancy.objects.get(parking_lot=self.parking_lot)
+        self.assertEqual(
+            (latest_occupancy.occupied_spots, latest_occupancy.timestamp),
+            (occupancy.occupied_spots, occupancy.timestamp),
+        )
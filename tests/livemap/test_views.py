@@ -1,12 +1,19 @@
+import gc
+import tracemalloc
+import weakref
 from http import HTTPStatus
 
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, override_settings
 from django.core.handlers.wsgi import WSGIRequest
 from io import StringIO
+from unittest.mock import patch
 from parameterized import parameterized
 from django.urls import reverse
+from django.core.cache import cache
 
-from livemap.views import _fetch_geolocation, _extract_client_ip_address, _compose_html_table
+from livemap.geolocation import get_geolocation_resolver
+from livemap.models import Occupancy, ParkingLot, VideoStreamSource
+from livemap.views import _fetch_geolocation, _extract_client_ip_address, _compose_html_table, index
 
 from .. import TestCaseWithData, fake
 
@@ -21,12 +28,19 @@ class HelperFunctionsTest(TestCase):
         ip_by_http_x_forwarded = _extract_client_ip_address(WSGIRequest(meta | {"HTTP_X_FORWARDED_FOR": fake_ip}))
         self.assertEqual(ip_by_http_x_forwarded, fake_ip)
 
-    @parameterized.expand([(fake.pystr(), type(None)), (fake.ipv4(), tuple)])
+    @parameterized.expand([(fake.pystr(), type(None)), (fake.ipv4_public(), tuple)])
+    @override_settings(GEOLOCATION_DATABASE="tests/test_media/geolocation.csv", GEOLOCATION_REMOTE_URL=None)
     def test__fetch_geolocation(self, ip_address: str, return_type: type(None) | tuple) -> None:
+        get_geolocation_resolver.cache_clear()
         self.assertIsInstance(_fetch_geolocation(ip_address), return_type)
+        get_geolocation_resolver.cache_clear()
 
 
 class ViewsTest(TestCaseWithData):
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
     def test__compose_html_table(self) -> None:
         html_table = _compose_html_table(self.parking_lot)
         for field in {"Address", "Private", "Free", "Total spots", "Spots for disables", "Free spots"}:
@@ -42,3 +56,59 @@ class ViewsTest(TestCaseWithData):
     def test_index(self) -> None:
         response = self.client.get(reverse("livemap:index"))
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @patch("livemap.views._fetch_geolocation", return_value=None)
+    def test_index_queries(self, _) -> None:
+        Occupancy.objects.create(parking_lot=self.parking_lot, occupied_spots=fake.pyint(max_value=10))
+        # The map is rendered in two queries (parking lots with their addresses and active stream sources),
+        # and free spots are read in one more
+        with self.assertNumQueries(3):
+            self.client.get(reverse("livemap:index"))
+
+        for _ in range(5):
+            parking_lot = ParkingLot.objects.create(
+                address=self.address, total_spots=fake.pyint(), geolocation=self.parking_lot.geolocation
+            )
+            Occupancy.objects.create(parking_lot=parking_lot, occupied_spots=fake.pyint(max_value=10))
+            self.stream_source_data["parking_lot"] = parking_lot
+            VideoStreamSource.objects.create(**self.stream_source_data)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("livemap:index"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @patch("livemap.views._fetch_geolocation", return_value=(49.5, 16.5))
+    def test_index_cache(self, _) -> None:
+        self.client.get(reverse("livemap:index"))
+        occupancy = Occupancy.objects.create(parking_lot=self.parking_lot, occupied_spots=fake.pyint(max_value=10))
+        # Only the free spots are read for the cached map
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("livemap:index"))
+        self.assertContains(response, f"<td>{self.parking_lot.total_spots - occupancy.occupied_spots}</td>")
+        self.assertContains(response, "[49.5, 16.5]")
+        self.assertNotContains(response, "__FREE_SPOTS_")
+
+        # Changes of parking lots invalidate the cached map
+        self.parking_lot.total_spots += 1
+        self.parking_lot.save()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("livemap:index"))
+        self.assertContains(response, f"<td>{self.parking_lot.total_spots}</td>")
+
+    @patch("livemap.views._fetch_geolocation", return_value=None)
+    def test_index_memory(self, _) -> None:
+        self.client.get(reverse("livemap:index"))  # Fill the caches
+        request_factory = RequestFactory()
+        requests = weakref.WeakSet()
+        tracemalloc.start()
+        memory_before, _ = tracemalloc.get_traced_memory()
+        for _ in range(2000):
+            request = request_factory.get(reverse("livemap:index"), REMOTE_ADDR=fake.ipv4_public())
+            requests.add(request)
+            index(request)
+        del request
+        gc.collect()
+        memory_after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # No request outlives its response
+        self.assertEqual(len(requests), 0)
+        self.assertLess(memory_after - memory_before, 2 * 1024 * 1024)
@@ -0,0 +1,58 @@
+from django.test import SimpleTestCase
+
+from spot_gazer_core.adaptive_sampling import AdaptiveSampler
+
+
+class AdaptiveSamplerTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.sampler = AdaptiveSampler(
+            min_factor=0.25,
+            max_factor=4,
+            backoff=2,
+            stable_change_rate=0.2,
+            busy_change_rate=2,
+            smoothing=1,
+            nearly_full_share=0.9,
+            quiet_hours=None,
+        )
+
+    def test_stable_occupancy(self) -> None:
+        self.assertEqual(self.sampler.interval(10), 10)
+        for now, factor in ((0, 2), (60, 4), (120, 4)):
+            self.sampler.record(20, 100, now)
+            self.assertEqual(self.sampler.factor, factor)
+        self.assertEqual(self.sampler.interval(10), 40)
+
+    def test_busy_occupancy(self) -> None:
+        self.sampler.record(20, 100, 0)
+        # 5 cars per minute
+        for now, occupied_spots, factor in ((60, 25, 1), (120, 30, 0.5), (180, 35, 0.25), (240, 40, 0.25)):
+            self.sampler.record(occupied_spots, 100, now)
+            self.assertEqual(self.sampler.factor, factor)
+        # 1 car per minute, back to the processing rate
+        for now, occupied_spots, factor in ((300, 41, 0.5), (360, 42, 1), (420, 43, 1)):
+            self.sampler.record(occupied_spots, 100, now)
+            self.assertEqual(self.sampler.factor, factor)
+
+    def test_nearly_full(self) -> None:
+        self.sampler.record(95, 100, 0)
+        self.assertEqual(self.sampler.factor, 0.5)
+        # The total spots are unknown
+        self.sampler.record(95, None, 60)
+        self.assertEqual(self.sampler.factor, 1)
+
+    def test_quiet_hours(self) -> None:
+        self.sampler.quiet_hours = (0, 24)
+        self.sampler.record(20, 100, 0)
+        self.assertEqual(self.sampler.factor, 4)
+        # Busy parking lots are sampled more often at quiet hours too
+        self.sampler.record(30, 100, 60)
+        self.assertEqual(self.sampler.factor, 2)
+
+    def test_is_quiet_hour(self) -> None:
+        self.assertFalse(self.sampler.is_quiet_hour())
+        self.sampler.quiet_hours = (0, 24)
+        self.assertTrue(self.sampler.is_quiet_hour())
+        # Spanning midnight
+        self.sampler.quiet_hours = (24, 0)
+        self.assertFalse(self.sampler.is_quiet_hour())
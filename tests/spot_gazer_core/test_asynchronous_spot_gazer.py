@@ -3,6 +3,8 @@ from unittest.mock import patch
 
 from livemap.models import Occupancy, VideoStreamSource
 from spot_gazer_core import SpotGazer
+from spot_gazer_core.model_backends import get_model_path
+from spot_gazer_core.stream_health import StreamHealth
 from run import select_grouped_stream_sources
 from .. import TestCaseWithData, fake
 
@@ -11,6 +13,14 @@ async def _detect_the_parking_lot_occupancy_patch(*args) -> None:
     await asyncio.sleep(1)
 
 
+async def _detect_forever_patch(*args) -> None:
+    await asyncio.Event().wait()
+
+
+async def _fail() -> None:
+    raise RuntimeError("The detection has failed.")
+
+
 class SpotGazerTest(TestCaseWithData):
     def setUp(self) -> None:
         super().setUp()
@@ -26,12 +36,55 @@ class SpotGazerTest(TestCaseWithData):
     async def test_start_stop_detection(self) -> None:
         spot_gazer = SpotGazer(self.stream_sources)
         await spot_gazer.start_detection()
-        spot_gazer.stop_detection()
+        await spot_gazer.stop_detection()
+
+    @patch.object(SpotGazer, "_detect_the_parking_lot_occupancy", _detect_forever_patch)
+    async def test_reconcile(self) -> None:
+        spot_gazer = SpotGazer([])
+        parking_lot = self.stream_sources[0]
+        await spot_gazer.reconcile([parking_lot])
+        self.assertEqual(spot_gazer.running_parking_lots, {self.parking_lot.pk})
+        task = spot_gazer._tasks[self.parking_lot.pk]
+
+        # A new parking zone is applied to the running stream
+        parking_zone = [[[[0, 0]], [[0, 100]], [[100, 100]]]]
+        await spot_gazer.reconcile([[stream | {"parking_zone": parking_zone} for stream in parking_lot]])
+        self.assertIs(spot_gazer._tasks[self.parking_lot.pk], task)
+        self.assertEqual(parking_lot[0]["parking_zone"], parking_zone)
+
+        # A removed stream is stopped without restarting the parking lot
+        for stream in parking_lot:
+            stream["health"] = StreamHealth()
+        await spot_gazer.reconcile([parking_lot[:1]])
+        self.assertIs(spot_gazer._tasks[self.parking_lot.pk], task)
+        self.assertTrue(parking_lot[1]["health"].is_deactivated)
+        self.assertEqual(spot_gazer.stream_health()[parking_lot[1]["id"]]["status"], "deactivated")
+
+        # A reactivated stream restarts the parking lot
+        await spot_gazer.reconcile([parking_lot])
+        self.assertTrue(task.cancelled())
+        self.assertIsNot(spot_gazer._tasks[self.parking_lot.pk], task)
+
+        # A failed detection is logged and restarted
+        spot_gazer._tasks[self.parking_lot.pk].cancel()
+        spot_gazer._tasks[self.parking_lot.pk] = asyncio.create_task(_fail())
+        await asyncio.gather(spot_gazer._tasks[self.parking_lot.pk], return_exceptions=True)
+        with self.assertLogs("spot_gazer_core.asynchronous_spot_gazer", "ERROR"):
+            await spot_gazer.reconcile([parking_lot[:1]])
+        self.assertFalse(spot_gazer._tasks[self.parking_lot.pk].done())
+
+        await spot_gazer.reconcile([])
+        self.assertEqual(spot_gazer.running_parking_lots, set())
+        await spot_gazer.stop_detection()
 
     async def test__detect_the_parking_lot_occupancy(self) -> None:
-        await SpotGazer(self.stream_sources)._detect_the_parking_lot_occupancy(
-            [self.parking_lot_with_broken_url.__dict__]
-        )
+        spot_gazer = SpotGazer(self.stream_sources)
+        spot_gazer.stream_failure_budget, spot_gazer.stream_reconnect_delay = 1, 0.01
+        with patch.object(SpotGazer, "_deactivate_stream", wraps=SpotGazer._deactivate_stream) as deactivate_stream:
+            await spot_gazer._detect_the_parking_lot_occupancy([self.parking_lot_with_broken_url.__dict__])
+        # The stream is reconnected once before it's deactivated
+        deactivate_stream.assert_called_once()
+        self.assertEqual(self.parking_lot_with_broken_url.__dict__["health"].total_failures, 2)
         self.assertFalse(
             (
                 await VideoStreamSource.objects.aget(stream_source=self.parking_lot_with_broken_url.stream_source)
@@ -51,3 +104,39 @@ class SpotGazerTest(TestCaseWithData):
         self.assertFalse(
             (await VideoStreamSource.objects.aget(stream_source=self.big_parking_lot.stream_source)).is_active
         )
+
+    async def test_adaptive_sampling(self) -> None:
+        # An image is a stream of a single sample
+        stream = self.stream_sources[0][0] | {"processing_rate": 0.01}
+        spot_gazer = SpotGazer(self.stream_sources)
+        await spot_gazer._detect_the_parking_lot_occupancy([dict(stream)])
+        # Without adaptive sampling, parking lots are sampled at their processing rates
+        self.assertEqual(spot_gazer._samplers, {})
+        self.assertNotIn("sample_interval_seconds", spot_gazer.metrics.render())
+
+        with patch("spot_gazer_core.asynchronous_spot_gazer.ADAPTIVE_SAMPLING", True):
+            spot_gazer = SpotGazer(self.stream_sources)
+        await spot_gazer._detect_the_parking_lot_occupancy([dict(stream)])
+        self.assertIn(self.parking_lot.pk, spot_gazer._samplers)
+        self.assertIn("sample_interval_seconds", spot_gazer.metrics.render())
+
+    async def test_cascade(self) -> None:
+        stream = self.stream_sources[0][0]
+        spot_gazer = SpotGazer(self.stream_sources)
+        await spot_gazer._detect_the_parking_lot_occupancy([dict(stream)])
+        # Without the cascade, frames are passed to the main model only
+        self.assertEqual(spot_gazer.cascade_statistics(), {})
+        self.assertNotIn("cascade_escalation_rate", spot_gazer.metrics.render())
+
+        # The main model serves as the small one
+        with patch("spot_gazer_core.asynchronous_spot_gazer.CASCADE_MODEL", get_model_path()):
+            spot_gazer = SpotGazer(self.stream_sources)
+        spot_gazer.add_parking_lot([dict(stream)])
+        await spot_gazer._tasks[self.parking_lot.pk]
+        # The first frame of a stream is always escalated
+        self.assertEqual(
+            spot_gazer.cascade_statistics(),
+            {self.parking_lot.pk: {"samples": 1, "escalations": 1, "escalation_rate": 1.0}},
+        )
+        self.assertIn(f'cascade_escalation_rate{{lot="{self.parking_lot.pk}"}} 1.0', spot_gazer.metrics.render())
+        await spot_gazer.stop_detection()
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from django.test import SimpleTestCase
+
+from spot_gazer_core.cascade import CascadeHistory
+from spot_gazer_core.predictor import FrameContext, detect_uncertain_cars
+
+
+class CascadeHistoryTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.history = CascadeHistory(history_size=5, count_tolerance=0.1, max_uncertain_share=0.2, refresh_samples=10)
+
+    def warm_up(self, cars: int = 20, escalated_cars: int = 22) -> None:
+        for _ in range(3):
+            self.assertTrue(self.history.should_escalate(cars, 0))
+            self.history.record(cars, escalated_cars)
+
+    def test_should_escalate(self) -> None:
+        self.warm_up()
+        # Stable counts of the small model are trusted
+        self.assertFalse(self.history.should_escalate(20, 0))
+        self.assertFalse(self.history.should_escalate(22, 4))
+        # but not deviating ones
+        self.assertTrue(self.history.should_escalate(23, 0))
+        self.assertTrue(self.history.should_escalate(17, 0))
+        # nor uncertain ones
+        self.assertTrue(self.history.should_escalate(20, 5))
+
+    def test_deviation_of_small_counts(self) -> None:
+        self.warm_up(cars=2, escalated_cars=2)
+        # At least one car of difference is tolerated
+        self.assertFalse(self.history.should_escalate(3, 0))
+        self.assertTrue(self.history.should_escalate(4, 0))
+        self.assertFalse(self.history.should_escalate(1, 0))
+        self.assertTrue(self.history.should_escalate(0, 0))
+
+    def test_refresh(self) -> None:
+        self.warm_up()
+        for _ in range(10):
+            self.assertFalse(self.history.should_escalate(20, 0))
+            self.history.record(20)
+        self.assertTrue(self.history.should_escalate(20, 0))
+        self.history.record(20, 21)
+        self.assertFalse(self.history.should_escalate(20, 0))
+
+    def test_estimate(self) -> None:
+        self.warm_up(cars=20, escalated_cars=22)
+        self.assertEqual(self.history.estimate(21), 23)
+        self.history.record(5, 3)
+        self.assertEqual(self.history.estimate(1), 0)
+
+    def test_escalation_rate(self) -> None:
+        self.assertEqual(self.history.escalation_rate, 0.0)
+        self.warm_up()
+        self.history.record(20)
+        self.assertEqual((self.history.samples, self.history.escalations), (4, 3))
+        self.assertEqual(self.history.escalation_rate, 0.75)
+
+
+class DetectUncertainCarsTest(SimpleTestCase):
+    def test_detect_uncertain_cars(self) -> None:
+        confidences = {1: [0.9, 0.3, 0.8], 2: [0.2, 0.1], 3: []}
+
+        def predictor(source: list[np.ndarray]) -> list[SimpleNamespace]:
+            return [
+                SimpleNamespace(boxes=SimpleNamespace(conf=torch.tensor(confidences[len(image)]))) for image in source
+            ]
+
+        predictor.mask_cache = None  # type: ignore[attr-defined]
+        frames = [np.zeros((size, 4, 3), np.uint8) for size in (1, 2, 3)]
+        self.assertEqual(
+            detect_uncertain_cars(predictor, frames, [FrameContext(i) for i in range(3)], uncertain_confidence=0.4),
+            [(3, 1), (2, 2), (0, 0)],
+        )
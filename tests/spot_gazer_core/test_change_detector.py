@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from spot_gazer_core.change_detector import ChangeDetector
+from spot_gazer_core.image_processing import create_zone_mask
+
+
+class ChangeDetectorTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.frame = cv2.imread("tests/test_media/small_parking.jpg")
+        height, width = self.frame.shape[:2]
+        # The left half of the frame
+        self.zone_mask = create_zone_mask(
+            self.frame.shape, [[[[0, 0]], [[width // 2, 0]], [[width // 2, height]], [[0, height]]]]
+        )
+        self.change_detector = ChangeDetector(threshold=0.01, pixel_threshold=25, refresh_interval=60)
+
+    def test_check(self) -> None:
+        # The cars of the first frame are always detected
+        self.assertIsNone(self.change_detector.check(self.frame, self.zone_mask))
+        self.change_detector.record(33)
+
+        # Camera noise is not a change
+        noisy_frame = np.clip(
+            self.frame.astype(np.int16) + np.random.randint(-10, 10, self.frame.shape), 0, 255
+        ).astype(np.uint8)
+        self.assertEqual(self.change_detector.check(noisy_frame, self.zone_mask), 33)
+
+        # A change outside the parking zone is ignored
+        changed_frame = self.frame.copy()
+        changed_frame[:, -changed_frame.shape[1] // 4 :] = 0
+        self.assertEqual(self.change_detector.check(changed_frame, self.zone_mask), 33)
+        # but not without a parking zone
+        self.assertIsNone(self.change_detector.check(changed_frame))
+
+        # A car that has arrived in the parking zone
+        changed_frame = self.frame.copy()
+        cv2.rectangle(changed_frame, (20, 20), (80, 60), (0, 0, 255), -1)
+        self.assertIsNone(self.change_detector.check(changed_frame, self.zone_mask))
+        self.change_detector.record(34)
+        # The frame of the last detection is the new reference
+        self.assertEqual(self.change_detector.check(changed_frame, self.zone_mask), 34)
+
+    def test_refresh(self) -> None:
+        self.change_detector.check(self.frame, self.zone_mask, "mask")
+        self.change_detector.record(33)
+        # A new context of the stream
+        self.assertIsNone(self.change_detector.check(self.frame, self.zone_mask, "crop"))
+        self.change_detector.record(33)
+        self.assertEqual(self.change_detector.check(self.frame, self.zone_mask, "crop"), 33)
+        # The forced refresh
+        with patch("spot_gazer_core.change_detector.time.monotonic", return_value=10**9):
+            self.assertIsNone(self.change_detector.check(self.frame, self.zone_mask, "crop"))
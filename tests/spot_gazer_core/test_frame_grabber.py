@@ -0,0 +1,144 @@
+import tempfile
+from pathlib import Path
+import time
+from threading import Event, Thread
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from spot_gazer_core.frame_grabber import FrameGrabber
+
+from .. import fake
+
+
+class ResizingCapture:
+    """A live stream whose resolution changes with every frame. Frames are filled with 1 or 2 by their sizes."""
+
+    shapes = ((480, 640, 3), (720, 1280, 3))
+
+    def __init__(self, source: str, frames: int = 200) -> None:
+        self.frames = frames
+        self.grabbed_frames = 0
+
+    def isOpened(self) -> bool:
+        return True
+
+    def read(self) -> tuple[bool, np.ndarray]:
+        return True, np.full(self.shapes[0], 1, np.uint8)
+
+    def grab(self) -> bool:
+        self.grabbed_frames += 1
+        return self.grabbed_frames <= self.frames
+
+    def retrieve(self, buffer: np.ndarray) -> tuple[bool, np.ndarray]:
+        value = self.grabbed_frames % 2 + 1
+        shape = self.shapes[value - 1]
+        if buffer.shape != shape:
+            return True, np.full(shape, value, np.uint8)
+        buffer[:] = value
+        return True, buffer
+
+    def release(self) -> None:
+        pass
+
+
+class HungCapture:
+    """A live stream whose connection hangs after the first frame until `resume` is set."""
+
+    def __init__(self, source: str) -> None:
+        self.resume = Event()
+        self.is_released = Event()
+
+    def isOpened(self) -> bool:
+        return True
+
+    def read(self) -> tuple[bool, np.ndarray]:
+        return True, np.zeros((48, 64, 3), np.uint8)
+
+    def grab(self) -> bool:
+        self.resume.wait()
+        return False
+
+    def release(self) -> None:
+        self.is_released.set()
+
+
+class FrameGrabberTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.video_path = str(Path(self.temp_dir.name) / "video.avi")
+        # Every frame of the video is filled with its own number
+        writer = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+        for frame_number in range(10):
+            writer.write(np.full((48, 64, 3), frame_number * 20, np.uint8))
+        writer.release()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_read_image(self) -> None:
+        grabber = FrameGrabber("tests/test_media/small_parking.jpg")
+        grabber.start()
+        frame = grabber.read()
+        self.assertTrue(np.array_equal(frame, cv2.imread("tests/test_media/small_parking.jpg")))
+        self.assertIsNone(grabber.read())
+        grabber.stop()
+
+    def test_read_video(self) -> None:
+        grabber = FrameGrabber(self.video_path, vid_stride=3)
+        grabber.start()
+        frame_numbers = []
+        while (frame := grabber.read()) is not None:
+            # The frame is a view on the ring buffer rather than a copy
+            self.assertIsNotNone(frame.base)
+            frame_numbers.append(round(frame.mean() / 20))
+        grabber.stop()
+        self.assertEqual(frame_numbers, [0, 3, 6, 9])
+
+    def test_broken_source(self) -> None:
+        with self.assertRaises(ConnectionError):
+            FrameGrabber(fake.file_path(extension="mp4"))
+
+    def test_resolution_change(self) -> None:
+        with patch("spot_gazer_core.frame_grabber.cv2.VideoCapture", ResizingCapture):
+            grabber = FrameGrabber("rtsp://camera")
+        frames = []
+
+        def read() -> None:
+            while (frame := grabber.read()) is not None:
+                frames.append((frame.shape, frame.min(), frame.max()))
+
+        reader = Thread(target=read)
+        reader.start()
+        grabber.start()
+        reader.join()
+        grabber.stop()
+        self.assertGreater(len(frames), 1)
+        # Every read frame is the whole frame of its resolution, never an uninitialized buffer
+        for shape, minimum, maximum in frames:
+            value = ResizingCapture.shapes.index(shape) + 1
+            self.assertEqual((minimum, maximum), (value, value))
+
+    def test_stop_hung_stream(self) -> None:
+        with patch("spot_gazer_core.frame_grabber.cv2.VideoCapture", HungCapture):
+            grabber = FrameGrabber("rtsp://camera", read_timeout=30)
+        capture = grabber._capture
+        grabber.start()
+        self.assertIsNotNone(grabber.read())
+        reader = Thread(target=grabber.read)
+        reader.start()
+
+        start = time.monotonic()
+        grabber.stop(timeout=0)
+        reader.join(5)
+        # Neither the stopping nor the waiting reader is blocked by the hung connection
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertFalse(reader.is_alive())
+        self.assertFalse(capture.is_released.is_set())
+
+        # The capture is released by the grabber thread once the connection gives up
+        capture.resume.set()
+        grabber.join(5)
+        self.assertTrue(capture.is_released.is_set())
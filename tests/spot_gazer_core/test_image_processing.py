@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from spot_gazer_core.image_processing import (
+    ZoneMaskCache,
+    apply_mask,
+    create_mask,
+    create_zone_mask,
+    find_zone_boxes,
+)
+
+from .. import fake
+
+
+class ImageProcessingTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.frame = cv2.imread("tests/test_media/small_parking.jpg")
+        self.parking_zone = [[[[10, 10]], [[300, 20]], [[250, 200]], [[30, 180]]]]
+
+    def test_create_zone_mask(self) -> None:
+        mask = create_zone_mask(self.frame.shape, self.parking_zone)
+        self.assertEqual(mask.shape, self.frame.shape[:2])
+        self.assertEqual(mask.dtype, np.uint8)
+        self.assertTrue(np.array_equal(mask, create_mask(self.frame, self.parking_zone)[..., 0]))
+
+    def test_find_zone_boxes(self) -> None:
+        parking_zone = [
+            [[[10, 10]], [[20, 10]], [[20, 20]]],
+            [[[15, 15]], [[30, 15]], [[30, 30]]],  # Overlaps the first part
+            [[[50, 50]], [[60, 50]], [[60, 200]]],  # Partly outside the frame
+            [[[300, 300]], [[310, 300]], [[310, 310]]],  # Outside the frame
+        ]
+        self.assertCountEqual(find_zone_boxes((100, 100, 3), parking_zone), [(10, 10, 31, 31), (50, 50, 61, 100)])
+
+    def test_apply_mask(self) -> None:
+        frame = self.frame.copy()
+        masked_frame = apply_mask(frame, create_zone_mask(frame.shape, self.parking_zone))
+        self.assertIs(masked_frame, frame)
+        self.assertTrue(np.array_equal(masked_frame, create_mask(self.frame, self.parking_zone, False)))
+
+
+class ZoneMaskCacheTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.cache = ZoneMaskCache(max_size=2)
+        self.stream_id = fake.pyint()
+        self.parking_zone = [[[[0, 0]], [[5, 0]], [[5, 5]]]]
+
+    def test_get(self) -> None:
+        mask = self.cache.get(self.stream_id, (10, 10, 3), self.parking_zone)
+        self.assertIs(self.cache.get(self.stream_id, (10, 10, 3), self.parking_zone), mask)
+        self.assertEqual(mask.bounding_box, (0, 0, 6, 6))
+
+        # The edited zone gets a new mask
+        edited_zone = [[[[0, 0]], [[9, 0]], [[9, 9]]]]
+        edited_mask = self.cache.get(self.stream_id, (10, 10, 3), edited_zone)
+        self.assertFalse(np.array_equal(edited_mask.mask, mask.mask))
+        self.assertIsNot(self.cache.get(self.stream_id, (10, 10, 3), self.parking_zone), mask)
+
+    def test_invalidate(self) -> None:
+        mask = self.cache.get(self.stream_id, (10, 10, 3), self.parking_zone)
+        self.cache.invalidate(self.stream_id)
+        self.assertIsNot(self.cache.get(self.stream_id, (10, 10, 3), self.parking_zone), mask)
+
+    def test_max_size(self) -> None:
+        masks = [self.cache.get(stream_id, (10, 10, 3), self.parking_zone) for stream_id in range(3)]
+        self.assertIs(self.cache.get(2, (10, 10, 3), self.parking_zone), masks[2])
+        self.assertIsNot(self.cache.get(0, (10, 10, 3), self.parking_zone), masks[0])
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from spot_gazer_core.inference_batcher import InferenceBatcher
+
+from .. import fake
+
+
+class InferenceBatcherTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.batches: list[int] = []
+
+    def _predict_batch(self, frames: list[np.ndarray], streams: list[dict[str, Any]]) -> list[int]:
+        self.batches.append(len(frames))
+        return [stream["parking_lot_id"] for stream in streams]
+
+    async def test_detect(self) -> None:
+        batcher = InferenceBatcher(self._predict_batch, max_batch_size=4, max_wait=0.5)
+        parking_lot_ids = [fake.pyint() for _ in range(10)]
+        detected_cars = await asyncio.gather(
+            *(batcher.detect(np.zeros((2, 2, 3)), {"parking_lot_id": lot_id}) for lot_id in parking_lot_ids)
+        )
+        await batcher.close()
+        # Every frame gets its own result back, while the frames are processed in full batches
+        self.assertEqual(detected_cars, parking_lot_ids)
+        self.assertEqual(self.batches, [4, 4, 2])
+
+    async def test_detect_error(self) -> None:
+        def broken_predict_batch(*args) -> list[int]:
+            raise RuntimeError("Inference failed")
+
+        batcher = InferenceBatcher(broken_predict_batch, max_wait=0)
+        with self.assertRaisesMessage(RuntimeError, "Inference failed"):
+            await batcher.detect(np.zeros((2, 2, 3)), {"parking_lot_id": fake.pyint()})
+        await batcher.close()
+
+    async def test_detect_by_deadline(self) -> None:
+        batches: list[list[int]] = []
+
+        def predict_batch(frames: list[np.ndarray], deadlines: list[int]) -> list[int]:
+            batches.append(deadlines)
+            return deadlines
+
+        batcher = InferenceBatcher(predict_batch, max_batch_size=2, max_wait=0.5)
+        deadlines = [3, 1, 2, 0]
+        await asyncio.gather(*(batcher.detect(np.zeros((2, 2, 3)), deadline, deadline) for deadline in deadlines))
+        await batcher.close()
+        # Frames that are due sooner are processed first
+        self.assertEqual(batches, [[0, 1], [2, 3]])
@@ -0,0 +1,62 @@
+import asyncio
+import socket
+
+from django.test import SimpleTestCase
+
+from spot_gazer_core.metrics import PipelineMetrics, serve_metrics
+
+
+class PipelineMetricsTest(SimpleTestCase):
+    def test_render(self) -> None:
+        metrics = PipelineMetrics()
+        metrics.observe("decode", 0.003, stream=1)
+        metrics.observe("decode", 0.2, stream=1)
+        with metrics.timer("forward"):
+            pass
+        metrics.describe("frames_processed", "Frames passed to the model by streams.")
+        metrics.increment("frames_processed", stream=1)
+        metrics.increment("frames_processed", 2, stream=1)
+        metrics.increment("frames_dropped", 0, stream=1)
+        metrics.gauge("streams", lambda: {(("status", "healthy"),): 3}, "Streams by status.")
+        metrics.gauge("broken", lambda: 1 / 0)
+
+        text = metrics.render()
+        # Buckets are cumulative
+        self.assertIn('spot_gazer_stage_seconds_bucket{stage="decode",stream="1",le="0.001"} 0', text)
+        self.assertIn('spot_gazer_stage_seconds_bucket{stage="decode",stream="1",le="0.005"} 1', text)
+        self.assertIn('spot_gazer_stage_seconds_bucket{stage="decode",stream="1",le="+Inf"} 2', text)
+        self.assertIn('spot_gazer_stage_seconds_count{stage="decode",stream="1"} 2', text)
+        self.assertIn('spot_gazer_stage_seconds_count{stage="forward"} 1', text)
+        self.assertIn("# TYPE spot_gazer_frames_processed_total counter", text)
+        self.assertIn('spot_gazer_frames_processed_total{stream="1"} 3', text)
+        self.assertNotIn("frames_dropped", text)
+        self.assertIn('spot_gazer_streams{status="healthy"} 3', text)
+        # A failed gauge doesn't break the rest of metrics
+        self.assertNotIn("broken", text)
+
+    def test_disabled(self) -> None:
+        metrics = PipelineMetrics(enabled=False)
+        metrics.observe("decode", 0.1)
+        metrics.increment("frames_processed")
+        with metrics.timer("forward"):
+            pass
+        self.assertNotIn("spot_gazer_stage_seconds_count", metrics.render())
+        self.assertNotIn("frames_processed", metrics.render())
+
+    async def test_serve_metrics(self) -> None:
+        metrics = PipelineMetrics()
+        metrics.increment("frames_processed")
+        with socket.socket() as free_socket:
+            free_socket.bind(("127.0.0.1", 0))
+            port = free_socket.getsockname()[1]
+        server = asyncio.create_task(serve_metrics(metrics, "127.0.0.1", port))
+        await asyncio.sleep(0.1)
+        try:
+            for path, expected_response in (("/metrics", b"spot_gazer_frames_processed_total 1"), ("/", b"404")):
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+                self.assertIn(expected_response, await reader.read())
+                writer.close()
+        finally:
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from spot_gazer_core.model_backends import (
+    MODEL_BACKENDS,
+    check_accuracy,
+    export_model,
+    get_model_path,
+    is_within_tolerance,
+)
+
+TEST_IMAGES = ("tests/test_media/small_parking.jpg", "tests/test_media/big_parking.jpg")
+
+
+class ModelBackendsTest(SimpleTestCase):
+    def test_get_model_path(self) -> None:
+        weights = "spot_gazer_core/yolov8m_spot_gazer.pt"
+        self.assertEqual(get_model_path("pytorch", weights), Path(weights))
+        self.assertEqual(get_model_path("onnx", weights), Path("spot_gazer_core/yolov8m_spot_gazer.onnx"))
+        self.assertEqual(get_model_path("onnx-int8", weights), Path("spot_gazer_core/yolov8m_spot_gazer_int8.onnx"))
+        self.assertEqual(get_model_path("openvino", weights), Path("spot_gazer_core/yolov8m_spot_gazer_openvino_model"))
+        with self.assertRaises(ValueError):
+            get_model_path("tensorrt", weights)
+
+    def test_export_model(self) -> None:
+        self.assertEqual(export_model("pytorch"), get_model_path("pytorch"))
+        # The ranges of activations are unknown without the calibration images
+        with self.assertRaises(ValueError):
+            export_model("onnx-int8")
+
+    def test_is_within_tolerance(self) -> None:
+        self.assertTrue(is_within_tolerance(33, 30, 0.1))
+        self.assertFalse(is_within_tolerance(33, 29, 0.1))
+        # At least one car may be missed
+        self.assertTrue(is_within_tolerance(2, 1, 0.1))
+        self.assertFalse(is_within_tolerance(2, 0, 0.1))
+
+    def test_accuracy(self) -> None:
+        exported_backends = [
+            backend for backend in MODEL_BACKENDS if backend != "pytorch" and get_model_path(backend).exists()
+        ]
+        if not exported_backends:
+            self.skipTest("No exported models, export them by `python manage.py export_model <backend>`.")
+        for backend in exported_backends:
+            with self.subTest(backend=backend):
+                report = check_accuracy(get_model_path(backend), TEST_IMAGES)
+                self.assertTrue(all(row["passed"] for row in report), report)
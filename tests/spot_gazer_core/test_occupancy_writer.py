@@ -0,0 +1,116 @@
+from unittest.mock import patch
+
+from django.db import DatabaseError
+from django.test import TransactionTestCase
+
+from livemap.models import Address, City, Country, LatestOccupancy, Occupancy, ParkingLot
+from spot_gazer_core.metrics import PipelineMetrics
+from spot_gazer_core.occupancy_writer import OccupancyWriter
+
+from .. import TestCaseWithData, fake
+
+
+class OccupancyWriterTest(TestCaseWithData):
+    async def test_add(self) -> None:
+        metrics = PipelineMetrics()
+        writer = OccupancyWriter(max_buffer_size=3, flush_interval=60, storage_mode="all", pipeline_metrics=metrics)
+        occupied_spots = [fake.pyint() for _ in range(4)]
+        for spots in occupied_spots[:2]:
+            await writer.add(self.parking_lot.pk, spots)
+        self.assertEqual(writer.queue_depth, 2)
+        self.assertFalse(await Occupancy.objects.aexists())
+
+        # The full buffer is saved at once
+        await writer.add(self.parking_lot.pk, occupied_spots[2])
+        self.assertEqual(writer.queue_depth, 0)
+        self.assertEqual(writer.metrics()["flushes"], 1)
+
+        await writer.add(self.parking_lot.pk, occupied_spots[3])
+        await writer.close()
+        saved_occupancies = [occupancy async for occupancy in Occupancy.objects.order_by("timestamp")]
+        self.assertEqual([occupancy.occupied_spots for occupancy in saved_occupancies], occupied_spots)
+        self.assertEqual(writer.metrics()["saved_occupancies"], 4)
+        latest_occupancy = await LatestOccupancy.objects.aget(parking_lot=self.parking_lot)
+        self.assertEqual(latest_occupancy.occupied_spots, occupied_spots[3])
+        self.assertEqual(latest_occupancy.timestamp, saved_occupancies[3].timestamp)
+        # The flushes are exported with the pipeline metrics
+        rendered_metrics = metrics.render()
+        self.assertIn('spot_gazer_stage_seconds_count{stage="flush"} 2', rendered_metrics)
+        self.assertIn("spot_gazer_flushed_occupancies_total 4", rendered_metrics)
+
+    async def test_flush_error(self) -> None:
+        writer = OccupancyWriter(max_buffer_size=1, flush_interval=60, storage_mode="all")
+        with patch.object(Occupancy.objects, "bulk_create", side_effect=DatabaseError("database is locked")):
+            for _ in range(12):
+                await writer.add(self.parking_lot.pk, fake.pyint())
+        # Unsaved occupancies are kept for the next flush within the limit
+        self.assertEqual(writer.queue_depth, 10)
+        self.assertEqual(writer.metrics()["dropped_occupancies"], 2)
+        await writer.close()
+        self.assertEqual(await Occupancy.objects.acount(), 10)
+        self.assertEqual(await LatestOccupancy.objects.acount(), 1)
+
+    async def test_add_changes(self) -> None:
+        writer = OccupancyWriter(flush_interval=60, storage_mode="changes", heartbeat=60)
+        for occupied_spots in (5, 5, 6, 6, 5):
+            await writer.add(self.parking_lot.pk, occupied_spots)
+        await writer.close()
+        self.assertEqual([occupancy.occupied_spots async for occupancy in Occupancy.objects.all()], [5, 6, 5])
+        self.assertEqual(writer.metrics()["skipped_occupancies"], 2)
+
+        # Unchanged occupancies are saved after the heartbeat interval
+        writer.heartbeat = 0
+        await writer.add(self.parking_lot.pk, 5)
+        await writer.close()
+        self.assertEqual(await Occupancy.objects.acount(), 4)
+
+    async def test_add_changes_after_dropped(self) -> None:
+        writer = OccupancyWriter(max_buffer_size=1, flush_interval=60, storage_mode="changes", heartbeat=60)
+        other_parking_lot = await ParkingLot.objects.acreate(
+            address=self.address, total_spots=fake.pyint(), geolocation=self.parking_lot.geolocation
+        )
+        with patch.object(Occupancy.objects, "bulk_create", side_effect=DatabaseError("database is locked")):
+            await writer.add(self.parking_lot.pk, 5)
+            for occupied_spots in range(10):
+                await writer.add(other_parking_lot.pk, occupied_spots)
+        self.assertEqual(writer.metrics()["dropped_occupancies"], 1)
+
+        # The dropped change isn't taken for a saved one
+        await writer.add(self.parking_lot.pk, 5)
+        await writer.close()
+        latest_occupancy = await LatestOccupancy.objects.aget(parking_lot=self.parking_lot)
+        self.assertEqual(latest_occupancy.occupied_spots, 5)
+        self.assertEqual(writer.metrics()["skipped_occupancies"], 0)
+
+
+class OccupancyWriterTransactionTest(TransactionTestCase):
+    """Foreign keys are checked on commit, so the transactions of the writer are really committed."""
+
+    def setUp(self) -> None:
+        country = Country.objects.create(country_name=fake.country())
+        city = City.objects.create(country=country, city_name=fake.city())
+        address = Address.objects.create(city=city, parking_lot_address=fake.street_address())
+        self.parking_lots = [
+            ParkingLot.objects.create(address=address, total_spots=fake.pyint(), geolocation=[49.5, 16.5])
+            for _ in range(2)
+        ]
+
+    async def test_flush_deleted_parking_lot(self) -> None:
+        writer = OccupancyWriter(flush_interval=60, storage_mode="all")
+        for parking_lot in self.parking_lots:
+            await writer.add(parking_lot.pk, 5)
+        await self.parking_lots[0].adelete()
+        await writer.flush()
+
+        # The occupancies of the deleted parking lot are dropped instead of blocking the others
+        self.assertEqual(writer.queue_depth, 0)
+        self.assertEqual(writer.metrics()["dropped_occupancies"], 1)
+        self.assertEqual(writer.metrics()["saved_occupancies"], 1)
+        self.assertEqual(
+            [occupancy.parking_lot_id async for occupancy in Occupancy.objects.all()], [self.parking_lots[1].pk]
+        )
+        self.assertTrue(await LatestOccupancy.objects.filter(parking_lot=self.parking_lots[1]).aexists())
+
+        await writer.add(self.parking_lots[1].pk, 6)
+        await writer.close()
+        self.assertEqual(await Occupancy.objects.acount(), 2)
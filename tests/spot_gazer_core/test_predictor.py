@@ -0,0 +1,73 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from spot_gazer_core.image_processing import ZoneMaskCache
+from spot_gazer_core.inference_batcher import InferenceBatcher
+from spot_gazer_core.predictor import FrameContext, detect_cars
+
+from .. import fake
+
+
+class PredictorStub:
+    """Detect a car on every image and remember the images."""
+
+    def __init__(self) -> None:
+        self.mask_cache = ZoneMaskCache()
+        self.images: list[np.ndarray] = []
+
+    def __call__(self, source: list[np.ndarray]) -> list[list[int]]:
+        self.images.extend(source)
+        return [[0] for _ in source]
+
+
+class DetectCarsTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.predictor = PredictorStub()
+        self.frame = np.full((100, 200, 3), 255, np.uint8)
+        self.parking_zone = [
+            [[[10, 10]], [[50, 10]], [[50, 30]], [[10, 30]]],
+            [[[100, 50]], [[150, 50]], [[150, 90]], [[100, 90]]],
+        ]
+
+    def test_detect_cars(self) -> None:
+        stream_id = fake.pyint()
+        detected_cars = detect_cars(
+            self.predictor,  # type: ignore[arg-type]
+            [self.frame.copy(), self.frame.copy(), self.frame.copy(), self.frame.copy()],
+            [
+                FrameContext(stream_id, self.parking_zone, "mask"),
+                FrameContext(stream_id, self.parking_zone, "crop"),
+                FrameContext(stream_id, self.parking_zone, "tiles"),
+                FrameContext(stream_id, None, "tiles"),
+            ],
+        )
+        # Every tile is a separate image, whose cars are added to the frame they are cropped from
+        self.assertEqual(detected_cars, [1, 1, 2, 1])
+        self.assertEqual(
+            [image.shape for image in self.predictor.images],
+            [(100, 200, 3), (81, 141, 3), (41, 51, 3), (21, 41, 3), (100, 200, 3)],
+        )
+        # The whole frame is masked around the parking zone, while the frame without a zone is not masked
+        self.assertEqual(self.predictor.images[0][0, 0].tolist(), [0, 0, 0])
+        self.assertEqual(self.predictor.images[0][20, 20].tolist(), [255, 255, 255])
+        self.assertTrue(np.all(self.predictor.images[-1] == 255))
+
+    async def test_concurrent_streams(self) -> None:
+        # Batches of different streams are processed by several threads at the same time
+        executor = ThreadPoolExecutor(4)
+        batcher = InferenceBatcher(partial(detect_cars, self.predictor), executor, 4, max_batch_size=1)
+        other_zone = [[[[0, 0]], [[5, 0]], [[5, 5]], [[0, 5]]]]
+        contexts = [FrameContext(index, (self.parking_zone, other_zone)[index % 2], "mask") for index in range(20)]
+        frames = [self.frame.copy() for _ in contexts]
+        await asyncio.gather(*(batcher.detect(frame, context) for frame, context in zip(frames, contexts)))
+        await batcher.close()
+        executor.shutdown()
+        # Every frame is masked with the zone of its own stream
+        for frame, context in zip(frames, contexts):
+            expected_frame = self.frame.copy()
+            zone_mask = self.predictor.mask_cache.get(context.stream_id, frame.shape, context.parking_zone)
+            self.assertTrue(np.array_equal(frame, expected_frame & zone_mask.mask[..., np.newaxis]))
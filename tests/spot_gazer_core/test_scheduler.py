@@ -0,0 +1,59 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from spot_gazer_core.scheduler import DeadlineScheduler
+
+
+class DeadlineSchedulerTest(SimpleTestCase):
+    async def test_wait(self) -> None:
+        scheduler = DeadlineScheduler()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = await scheduler.wait("lot", 0.05)
+        # The first slot is due at once
+        self.assertAlmostEqual(deadline, start + 0.05, delta=0.01)
+
+        # Slots follow each other at a fixed rate regardless of the time spent on the work
+        await asyncio.sleep(0.03)
+        deadline = await scheduler.wait("lot", 0.05)
+        self.assertAlmostEqual(loop.time(), start + 0.05, delta=0.02)
+        self.assertAlmostEqual(deadline, start + 0.1, delta=0.01)
+        self.assertEqual(scheduler.metrics()["missed_deadlines"], 0)
+        await scheduler.close()
+
+    async def test_missed_deadlines(self) -> None:
+        scheduler = DeadlineScheduler()
+        loop = asyncio.get_running_loop()
+        await scheduler.wait("lot", 0.02)
+        await asyncio.sleep(0.05)
+        # The missed slots are coalesced into one that is due at once
+        start = loop.time()
+        await scheduler.wait("lot", 0.02)
+        self.assertLess(loop.time() - start, 0.01)
+        self.assertEqual(scheduler.metrics()["missed_deadlines"], 1)
+        await scheduler.close()
+
+    async def test_changed_period(self) -> None:
+        scheduler = DeadlineScheduler()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await scheduler.wait("lot", 1)
+        # The new period applies to the awaited slot
+        deadline = await scheduler.wait("lot", 0.02)
+        self.assertAlmostEqual(loop.time(), start + 0.02, delta=0.01)
+        self.assertAlmostEqual(deadline, start + 0.04, delta=0.01)
+        await scheduler.close()
+
+    async def test_earliest_first(self) -> None:
+        scheduler = DeadlineScheduler()
+        await asyncio.gather(scheduler.wait("slow", 0.1), scheduler.wait("fast", 0.02))
+        woken_up = []
+
+        async def wait(key: str, period: float) -> None:
+            await scheduler.wait(key, period)
+            woken_up.append(key)
+
+        await asyncio.gather(wait("slow", 0.1), wait("fast", 0.02))
+        self.assertEqual(woken_up, ["fast", "slow"])
+        await scheduler.close()
@@ -0,0 +1,66 @@
+from collections import Counter
+from datetime import timedelta
+from typing import Any
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from livemap.models import DetectionWorker
+from run import select_grouped_stream_sources
+from spot_gazer_core.sharding import HashRing, ShardedRunner
+
+from .. import TestCaseWithData
+
+
+class DetectorStub:
+    def __init__(self) -> None:
+        self.running_parking_lots: set[int] = set()
+
+    async def reconcile(self, parking_lots: list[list[dict[str, Any]]]) -> None:
+        self.running_parking_lots = {parking_lot[0]["parking_lot_id"] for parking_lot in parking_lots}
+
+    async def stop_detection(self) -> None:
+        self.running_parking_lots.clear()
+
+
+class HashRingTest(SimpleTestCase):
+    def test_get_node(self) -> None:
+        self.assertIsNone(HashRing([]).get_node(1))
+        workers = [f"worker-{number}" for number in range(4)]
+        ring = HashRing(workers)
+        # The assignment doesn't depend on the order of nodes
+        self.assertEqual(
+            [ring.get_node(key) for key in range(100)], [HashRing(workers[::-1]).get_node(key) for key in range(100)]
+        )
+        shard_sizes = Counter(ring.get_node(key) for key in range(10_000))
+        self.assertEqual(shard_sizes.keys(), set(workers))
+        self.assertLess(max(shard_sizes.values()) / min(shard_sizes.values()), 1.5)
+
+    def test_remove_node(self) -> None:
+        ring, smaller_ring = HashRing(["a", "b", "c"]), HashRing(["a", "b"])
+        # Only the keys of the removed node move
+        for key in range(1000):
+            if (node := ring.get_node(key)) != "c":
+                self.assertEqual(smaller_ring.get_node(key), node)
+
+
+class ShardedRunnerTest(TestCaseWithData):
+    async def test_rebalance(self) -> None:
+        first_runner = ShardedRunner(DetectorStub(), select_grouped_stream_sources, name="first")
+        await first_runner.rebalance()
+        self.assertEqual(first_runner.spot_gazer.running_parking_lots, {self.parking_lot.pk})
+        self.assertTrue(await DetectionWorker.objects.filter(name="first").aexists())
+
+        # The parking lot moves to the second worker, if it owns it on the ring with both workers
+        second_runner = ShardedRunner(DetectorStub(), select_grouped_stream_sources, name="second")
+        await second_runner.rebalance()
+        await first_runner.rebalance()
+        owner = HashRing(["first", "second"]).get_node(self.parking_lot.pk)
+        for runner in (first_runner, second_runner):
+            self.assertEqual(runner.spot_gazer.running_parking_lots == {self.parking_lot.pk}, runner.name == owner)
+
+        # A dead worker loses its shard
+        await DetectionWorker.objects.filter(name=owner).aupdate(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        survivor = first_runner if owner == "second" else second_runner
+        await survivor.rebalance()
+        self.assertEqual(survivor.spot_gazer.running_parking_lots, {self.parking_lot.pk})
@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from spot_gazer_core.stream_health import StreamHealth
+
+
+class StreamHealthTest(SimpleTestCase):
+    def test_backoff(self) -> None:
+        health = StreamHealth(failure_budget=3, base_delay=10, max_delay=25)
+        delays = []
+        for _ in range(4):
+            health.record_failure(ConnectionError())
+            delays.append(health.retry_in)
+        # The delay doubles up to the maximum and is randomized between its half and its full value
+        for delay, (min_delay, max_delay) in zip(delays, [(5, 10), (10, 20), (12.5, 25), (12.5, 25)]):
+            self.assertTrue(min_delay - 0.1 <= delay <= max_delay, delay)
+        self.assertTrue(health.is_exhausted)
+        self.assertEqual(health.status, "reconnecting")
+
+    def test_recovery(self) -> None:
+        health = StreamHealth(failure_budget=1)
+        health.record_connection()
+        self.assertEqual(health.status, "healthy")
+        health.record_failure(ConnectionError("Timeout"))
+        health.record_connection()
+        health.record_success()
+        self.assertFalse(health.is_exhausted)
+        self.assertEqual(
+            {key: value for key, value in health.as_dict().items() if key != "retry_in"},
+            {"status": "healthy", "failures": 0, "total_failures": 1, "reconnections": 1, "last_error": "Timeout"},
+        )